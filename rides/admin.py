@@ -1,11 +1,26 @@
 from django.contrib import admin
 
-from rides.models import RideEvent, User
+from rides.models import ArchivedRideEvent, RideEvent, RideSummary, User
 
 admin.site.register(User)
 
 
 @admin.register(RideEvent)
 class RideEventAdmin(admin.ModelAdmin):
-    list_display = ('id_ride_event', 'id_ride', 'description', 'created_at')
+    list_display = ('id_ride_event', 'id_ride', 'event_type', 'description', 'created_at')
+    list_filter = ('event_type',)
     readonly_fields = ('created_at',)
+
+
+@admin.register(ArchivedRideEvent)
+class ArchivedRideEventAdmin(admin.ModelAdmin):
+    list_display = ('id_ride_event', 'id_ride', 'event_type', 'description', 'created_at', 'archived_at')
+    list_filter = ('event_type',)
+    # Filled by the archive_ride_events command only
+    readonly_fields = ('id_ride_event', 'id_ride', 'description', 'event_type', 'created_at', 'idempotency_key')
+
+
+@admin.register(RideSummary)
+class RideSummaryAdmin(admin.ModelAdmin):
+    list_display = ('id_ride', 'pickup_at', 'dropoff_at', 'duration', 'event_count', 'last_event_at')
+    readonly_fields = RideSummary.SUMMARY_FIELDS
@@ -0,0 +1,124 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from rides.cache import get_cache, get_etag, get_response_key, stats
+from rides.routers import reads_from_replica
+
+# Headers stored with the cached responses
+VALIDATORS = ('ETag', 'Last-Modified')
+
+
+def cache_response(namespace: str):
+    """
+    Caches the rendered responses of a viewset method, keyed on the normalized query params and on the versions of
+    the tables the responses are built from. Writes bump the versions (see rides.receivers), so entries are never
+    served stale after a write, they just stop being looked up and get evicted by the cache backend. Responses read
+    from a replica are served but not stored: the replica may not have applied the writes of the current versions yet.
+
+    Entries keep the ETag/Last-Modified of the response, which hits answer conditional GETs from: put it above
+    `conditional_response`, which then only computes the validators on misses.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not settings.RIDES_RESPONSE_CACHE or not isinstance(request.accepted_renderer, JSONRenderer):
+                return view_method(self, request, *args, **kwargs)
+
+            cache = get_cache()
+            key = get_response_key(
+                namespace,
+                request.build_absolute_uri(request.path),
+                dict(request.query_params.lists()),
+                request.accepted_media_type,
+            )
+
+            entry = cache.get(key)
+            if entry is not None:
+                stats['hits'] += 1
+                content, headers = entry
+                last_modified = headers.get('Last-Modified')
+                response = get_conditional_response(
+                    request,
+                    etag=headers.get('ETag'),
+                    last_modified=parse_http_date(last_modified) if last_modified is not None else None,
+                )
+                if response is None:
+                    response = HttpResponse(content, content_type=request.accepted_renderer.media_type)
+                for name, value in headers.items():
+                    response[name] = value
+                response['X-Cache'] = 'HIT'
+                return response
+
+            stats['misses'] += 1
+            from_replica = reads_from_replica()
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200 and not from_replica:
+                render_response(self, request, response)
+                cache.set(key, (response.content, {name: response[name] for name in VALIDATORS if name in response}))
+                stats['stores'] += 1
+
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def render_response(view, request, response: HttpResponse) -> None:
+    """Renders a DRF response now (finalize_response won't render it again), to read the exact bytes sent."""
+    if isinstance(response, Response):
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = view.get_renderer_context()
+        response.render()
+
+
+def conditional_response(view_method):
+    """
+    Answers the conditional GETs (If-None-Match, If-Modified-Since) of a viewset method with a 304 before running it,
+    from the validators returned by the `get_validators` method of the view: the last modification time of the data
+    of the response (None to only send an ETag) and a string of its state, computed with a single query. Views
+    without validators (None) are run and get the ETag of their rendered content, which only saves the transfer.
+    Responses carry ETag/Last-Modified.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return view_method(self, request, *args, **kwargs)
+
+        uri, params = request.build_absolute_uri(request.path), dict(request.query_params.lists())
+        validators = self.get_validators()
+        if validators is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            render_response(self, request, response)
+            etag = get_etag(uri, params, request.accepted_media_type, hashlib.sha256(response.content).hexdigest())
+            response['ETag'] = etag
+            return get_conditional_response(request, etag=etag, response=response)
+
+        last_modified, state = validators
+        etag = get_etag(uri, params, request.accepted_media_type, state)
+        # HTTP dates have a one second resolution, ETags catch the changes within the same second
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    return wrapper
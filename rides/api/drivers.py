@@ -0,0 +1,91 @@
+from datetime import UTC, datetime
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from rides.api.permissions import IsAdmin, IsDriverOrAdmin
+from rides.api.renderers import ORJSONRenderer
+from rides.locations import store
+from rides.models import Roles, User
+from rides.serializers.driver import DriverLocationSerializer, NearestDriversQuerySerializer
+
+
+class DriverLocationView(APIView):
+    """
+    Location updates of the drivers, at GPS ping rate: a location, or a list of them for batched updates.
+
+    Locations are written to the in-memory store of the process (see rides.locations) and persisted in batches, the
+    request makes no query once the driver is known. Drivers update their own location, admins any driver's.
+    """
+
+    permission_classes = [IsAuthenticated, IsDriverOrAdmin]
+    parser_classes = [JSONParser]
+    renderer_classes = [ORJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+    serializer_class = DriverLocationSerializer
+
+    def post(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        serializer = self.serializer_class(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        locations = serializer.validated_data if many else [serializer.validated_data]
+
+        for location in locations:
+            if request.user.role == Roles.DRIVER:
+                if location.get('driver_id', request.user.pk) != request.user.pk:
+                    raise PermissionDenied('Drivers can only update their own location.')
+                location['driver_id'] = request.user.pk
+            elif 'driver_id' not in location:
+                raise ValidationError({'driver_id': ['This field is required.']})
+
+        unknown = {location['driver_id'] for location in locations if not store.has_driver(location['driver_id'])}
+        if unknown and request.user.role != Roles.DRIVER:
+            drivers = User.objects.filter(pk__in=unknown, role=Roles.DRIVER).values_list('pk', flat=True)
+            if invalid := unknown - set(drivers):
+                raise ValidationError({'driver_id': [f'Not a driver: {", ".join(map(str, sorted(invalid)))}.']})
+
+        store.start_sync()
+        for location in locations:
+            store.update(location['driver_id'], location['latitude'], location['longitude'], location['available'])
+        return Response({'updated': len(locations)}, status=status.HTTP_202_ACCEPTED)
+
+
+class NearestDriversView(APIView):
+    """
+    The available drivers closest to a point (`lat`, `lon`), closest first, answered from the in-memory store.
+    Drivers without update for RIDES_DRIVER_LOCATION_MAX_AGE_SECONDS are left out.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    renderer_classes = [ORJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+
+    def get(self, request, *args, **kwargs):
+        query = NearestDriversQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        store.start_sync()
+        nearest = store.nearest(
+            params['lat'],
+            params['lon'],
+            params['k'],
+            params['radius_km'],
+            settings.RIDES_DRIVER_LOCATION_MAX_AGE_SECONDS,
+        )
+        return Response(
+            [
+                {
+                    'driver_id': position.id_driver,
+                    'latitude': position.latitude,
+                    'longitude': position.longitude,
+                    'distance_km': round(distance, 3),
+                    'updated_at': datetime.fromtimestamp(position.updated_at, tz=UTC),
+                }
+                for distance, position in nearest
+            ]
+        )
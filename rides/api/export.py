@@ -0,0 +1,110 @@
+import csv
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from enum import StrEnum
+from itertools import islice
+
+import orjson
+
+from rides.serializers.fast import FastSerializer
+
+
+class ExportFormat(StrEnum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+CONTENT_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv',
+}
+
+
+class Echo:
+    """File-like object returning what is written to it, lets csv.writer produce lines for a streaming response."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def achunked(iterable: AsyncIterable, size: int) -> AsyncIterator[list]:
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_csv_header(serializer: FastSerializer) -> list[str]:
+    # Nested objects are flattened to "<key>_<nested key>" columns, lists are written as JSON
+    header = []
+    for key, kind, details in serializer.plan:
+        if kind == 'one':
+            header.extend(f'{key}_{nested_key}' for nested_key, _, _ in details[1])
+        else:
+            header.append(key)
+    return header
+
+
+def to_csv_row(serializer: FastSerializer, item: dict) -> list:
+    row = []
+    for key, kind, details in serializer.plan:
+        if kind == 'one':
+            nested = item[key] or {}
+            row.extend(nested.get(nested_key) for nested_key, _, _ in details[1])
+        elif kind == 'many':
+            row.append(orjson.dumps(item[key]).decode())
+        else:
+            row.append(item[key])
+    return row
+
+
+def stream_export(
+    serializer: FastSerializer,
+    rows: Iterable[dict],
+    serialize_rows: Callable[[list[dict]], list[dict]],
+    export_format: ExportFormat,
+    chunk_size: int,
+) -> Iterator[bytes | str]:
+    """
+    Yields the export of `rows` (an iterator over `.values()` rows) chunk by chunk, `serialize_rows` being called
+    once per chunk so the related lookups are batched per chunk and nothing but the current chunk is held in memory.
+    """
+    if export_format == ExportFormat.CSV:
+        writer = csv.writer(Echo())
+        yield writer.writerow(get_csv_header(serializer))
+        for chunk in chunked(rows, chunk_size):
+            yield ''.join(writer.writerow(to_csv_row(serializer, item)) for item in serialize_rows(chunk))
+    else:
+        for chunk in chunked(rows, chunk_size):
+            yield b''.join(orjson.dumps(item) + b'\n' for item in serialize_rows(chunk))
+
+
+async def astream_export(
+    serializer: FastSerializer,
+    rows: AsyncIterable[dict],
+    serialize_rows: Callable[[list[dict]], Awaitable[list[dict]]],
+    export_format: ExportFormat,
+    chunk_size: int,
+) -> AsyncIterator[bytes | str]:
+    """
+    Async version of `stream_export`, for ASGI servers: `rows` come from `QuerySet.aiterator()`, so the export is
+    streamed chunk by chunk instead of being read in full in memory, as Django does with the synchronous iterators
+    of streaming responses under ASGI.
+    """
+    if export_format == ExportFormat.CSV:
+        writer = csv.writer(Echo())
+        yield writer.writerow(get_csv_header(serializer))
+        async for chunk in achunked(rows, chunk_size):
+            yield ''.join(writer.writerow(to_csv_row(serializer, item)) for item in await serialize_rows(chunk))
+    else:
+        async for chunk in achunked(rows, chunk_size):
+            yield b''.join(orjson.dumps(item) + b'\n' for item in await serialize_rows(chunk))
@@ -0,0 +1,16 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from rides.api.permissions import HasMetricsAccess
+from rides.api.renderers import PrometheusTextRenderer
+from rides.metrics import registry
+
+
+class MetricsView(APIView):
+    """Request metrics of this process (see `rides.middleware.MetricsMiddleware`) in the Prometheus text format."""
+
+    permission_classes = [HasMetricsAccess]
+    renderer_classes = [PrometheusTextRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return Response(registry.render())
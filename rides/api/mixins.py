@@ -0,0 +1,14 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from rides.routers import read_from_replica
+
+
+class ReplicaReadMixin:
+    """Serves the safe (read only) requests of the view from a read replica, see `rides.routers.ReplicaRouter`."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+
+        with read_from_replica():
+            return super().dispatch(request, *args, **kwargs)
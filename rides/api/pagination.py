@@ -1,7 +1,273 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from enum import StrEnum
+from typing import Any, NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
 
 class PageSizePagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 500
     page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None, count: int | None = None):
+        """Same as PageNumberPagination's, `count` (when the queryset was already counted) saves the count query."""
+        if count is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, setting it keeps the paginator from counting
+        paginator.count = count
+        self.set_page(paginator, request)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async version of `paginate_queryset`, counting and fetching the page with the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, setting it keeps the paginator from counting synchronously
+        paginator.count = await queryset.acount()
+        self.set_page(paginator, request)
+
+        self.page.object_list = [item async for item in self.page.object_list]
+        return self.page.object_list
+
+    def set_page(self, paginator, request) -> None:
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+
+class KeysetCursor(NamedTuple):
+    reverse: bool
+    position: list[Any]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks by the full ordering of the queryset, tie-broken on `tie_breaker`.
+
+    Unlike `CursorPagination` (which only looks at the first ordering field and skips duplicates with an offset)
+    the cursor holds the values of every ordering field, so every page is a single index seek + LIMIT regardless of
+    how deep it is. Annotated fields (e.g. distance) can be used as long as they are annotated before paginating.
+    No total count is computed.
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    page_size = 50
+    # Used when the queryset is not ordered
+    ordering = ('pickup_time',)
+    tie_breaker = 'pk'
+
+    def get_ordering(self, request, queryset, view) -> list[tuple[str, bool]]:
+        """Returns the ordering of the queryset as (field, descending) pairs, ending with the tie breaker."""
+        fields = [field for field in queryset.query.order_by if isinstance(field, str)] or list(self.ordering)
+        ordering = [(field.lstrip('-'), field.startswith('-')) for field in fields]
+
+        if self.tie_breaker not in [field for field, _ in ordering]:
+            ordering.append((self.tie_breaker, ordering[0][1]))
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([item async for item in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        ordering = self.get_page_ordering(queryset, request, view)
+        return self.limit_page(self.filter_page(queryset, ordering), ordering)
+
+    def get_page_ordering(self, queryset, request, view=None) -> list[tuple[str, bool]]:
+        """Reads the page size and the cursor of the request, returns the ordering of the page to fetch."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request, queryset)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        return [(field, descending != reverse) for field, descending in self.ordering]
+
+    def filter_page(self, queryset, ordering: list[tuple[str, bool]]):
+        if self.cursor is None:
+            return queryset
+        return queryset.filter(self.get_position_filter(ordering, self.cursor.position))
+
+    def limit_page(self, queryset, ordering: list[tuple[str, bool]]):
+        queryset = queryset.order_by(*[f'-{field}' if descending else field for field, descending in ordering])
+        # Always fetch an extra item to know if there is a page following this one
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results: list) -> list:
+        reverse = self.cursor is not None and self.cursor.reverse
+        has_following = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_position_filter(self, ordering: list[tuple[str, bool]], position: list[Any]) -> Q:
+        # Lexicographic "comes after" on the ordering fields:
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        position_filter = Q()
+        for index, (field, descending) in enumerate(ordering):
+            equal = {previous: value for (previous, _), value in zip(ordering[:index], position)}
+            position_filter |= Q(**equal, **{f'{field}__{"lt" if descending else "gt"}': position[index]})
+        return position_filter
+
+    def get_position(self, item) -> list[Any]:
+        position = []
+        for field, _ in self.ordering:
+            value = item[field] if isinstance(item, dict) else getattr(item, field)
+            position.append(value.isoformat() if isinstance(value, datetime) else value)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(KeysetCursor(reverse=False, position=self.get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(KeysetCursor(reverse=True, position=self.get_position(self.page[0])))
+
+    def decode_cursor(self, request, queryset) -> KeysetCursor | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            cursor = KeysetCursor(reverse=bool(tokens['r']), position=list(tokens['p']))
+            ordering = tokens['o']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only valid for the ordering it was created with
+        expected_ordering = [f'-{field}' if descending else field for field, descending in self.ordering]
+        if ordering != expected_ordering or len(cursor.position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Positions are compared to the ordering fields, they must be valid values of these fields
+        try:
+            position = [
+                self.get_output_field(queryset, field).to_python(value)
+                for (field, _), value in zip(self.ordering, cursor.position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor._replace(position=position)
+
+    def get_output_field(self, queryset, name: str):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, cursor: KeysetCursor) -> str:
+        tokens = {
+            'r': int(cursor.reverse),
+            'p': cursor.position,
+            'o': [f'-{field}' if descending else field for field, descending in self.ordering],
+        }
+        encoded = urlsafe_b64encode(json.dumps(tokens, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class RideCursorPagination(KeysetPagination):
+    ordering = ('pickup_time',)
+    tie_breaker = 'id_ride'
+
+
+class RideEventCursorPagination(KeysetPagination):
+    ordering = ('-created_at',)
+    tie_breaker = 'id_ride_event'
+
+
+class RideEventHistoryPagination(RideEventCursorPagination):
+    """
+    Keyset pagination of the union of the events and archived events of a ride (see RideViewSet.history), without
+    counting it. A union can't be filtered: the querysets are given separately, each filtered by the position of the
+    cursor before their union is ordered and limited.
+    """
+
+    def get_page_queryset(self, querysets, request, view=None):
+        first, *others = querysets
+        ordering = self.get_page_ordering(first, request, view)
+        union = self.filter_page(first, ordering).union(
+            *[self.filter_page(queryset, ordering) for queryset in others], all=True
+        )
+        return self.limit_page(union, ordering)
+
+
+class PaginationMode(StrEnum):
+    PAGE = 'page'
+    CURSOR = 'cursor'
+
+
+class SelectablePaginationMixin:
+    """
+    Lets clients pick the pagination style with the `pagination` query param (`page` or `cursor`),
+    falling back to the RIDES_PAGINATION_MODE setting.
+    """
+
+    pagination_mode_query_param = 'pagination'
+    pagination_classes: dict[PaginationMode, type[BasePagination]] = {
+        PaginationMode.PAGE: PageSizePagination,
+        PaginationMode.CURSOR: RideCursorPagination,
+    }
+
+    def get_pagination_mode(self) -> PaginationMode:
+        request = getattr(self, 'request', None)
+        mode = settings.RIDES_PAGINATION_MODE
+        if request is not None:
+            mode = request.query_params.get(self.pagination_mode_query_param) or mode
+
+        try:
+            return PaginationMode(mode)
+        except ValueError:
+            raise NotFound(
+                f'Pagination (key: {self.pagination_mode_query_param}) must be one of: {", ".join(PaginationMode)}.'
+            )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_classes[self.get_pagination_mode()]()
+        return self._paginator
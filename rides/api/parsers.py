@@ -0,0 +1,31 @@
+import json
+from collections.abc import Iterator
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON lazily: returns an iterator over the values of the lines of the body, read from the
+    stream as the iterator is consumed. Lines that aren't valid JSON are yielded as `ParseError` instances so the
+    caller can report them per item instead of failing the whole body.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None) -> Iterator:
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if stream is None:
+            return iter(())
+
+        def values():
+            for line in iter(stream.readline, b''):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line.decode(encoding))
+                except ValueError as exc:
+                    yield ParseError(f'NDJSON parse error - {exc}')
+
+        return values()
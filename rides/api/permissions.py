@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
 from rides.models import Roles
@@ -6,3 +9,23 @@ from rides.models import Roles
 class IsAdmin(BasePermission):
     def has_permission(self, request, view) -> bool:
         return bool(request.user and request.user.role == Roles.ADMIN)
+
+
+class IsDriverOrAdmin(BasePermission):
+    def has_permission(self, request, view) -> bool:
+        return bool(request.user and request.user.role in (Roles.DRIVER, Roles.ADMIN))
+
+
+class HasMetricsAccess(BasePermission):
+    """
+    Allows requests bearing the RIDES_METRICS_TOKEN (`Authorization: Bearer <token>`, as sent by Prometheus),
+    or admins when no token is configured.
+    """
+
+    def has_permission(self, request, view) -> bool:
+        token = settings.RIDES_METRICS_TOKEN
+        if not token:
+            return bool(request.user and request.user.is_authenticated and request.user.role == Roles.ADMIN)
+
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
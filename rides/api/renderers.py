@@ -0,0 +1,39 @@
+import time
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from rides.metrics import record_render_time
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Same output as `JSONRenderer` (compact, UTF-8) encoded with orjson. Falls back to `JSONRenderer` when an
+    indented response is requested, e.g. `Accept: application/json; indent=4`.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        try:
+            if data is None:
+                return b''
+
+            if self.get_indent(accepted_media_type, renderer_context or {}):
+                return super().render(data, accepted_media_type, renderer_context)
+
+            return orjson.dumps(data, default=self.encoder_class().default)
+        finally:
+            record_render_time(renderer_context, time.perf_counter() - start)
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    """Renders text in the Prometheus exposition format, other data (i.e. errors) as JSON."""
+
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return orjson.dumps(data)
@@ -0,0 +1,73 @@
+from django_filters import rest_framework as filters
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from rides.api.mixins import ReplicaReadMixin
+from rides.api.permissions import IsAdmin
+from rides.api.renderers import ORJSONRenderer
+from rides.heatmap import build_heatmap
+from rides.models import DriverMonthlyMetrics
+from rides.serializers.report import DriverMonthlyMetricsSerializer, HeatmapQuerySerializer
+
+
+class DriverMonthlyMetricsFilter(filters.FilterSet):
+    month = filters.DateFromToRangeFilter(label='Month', help_text='Range of months ("month_after", "month_before").')
+    driver = filters.NumberFilter(label='Driver', field_name='id_driver')
+    min_long_trips = filters.NumberFilter(label='Minimum long trips', field_name='long_trip_count', lookup_expr='gte')
+
+    class Meta:
+        model = DriverMonthlyMetrics
+        fields = ['month', 'driver', 'min_long_trips']
+
+
+class DriverMonthlyMetricsViewSet(ReplicaReadMixin, ReadOnlyModelViewSet):
+    """Trips per driver per month, served from the rollup refreshed by the refresh_driver_metrics command."""
+
+    queryset = DriverMonthlyMetrics.objects.select_related('id_driver').order_by('month', 'id_driver')
+    serializer_class = DriverMonthlyMetricsSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    filterset_class = DriverMonthlyMetricsFilter
+    ordering_fields = ['month', 'long_trip_count', 'trip_count']
+
+
+class HeatmapView(ReplicaReadMixin, APIView):
+    """
+    Number of rides per cell of a latitude/longitude grid (cells given by their south-west corner), over a pickup
+    time window. Counts are binned by the database, days that ended RIDES_HEATMAP_SETTLE_HOURS ago are cached per
+    day (see rides.heatmap), the X-Cached-Days header tells how many were.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    renderer_classes = [ORJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+
+    def get(self, request, *args, **kwargs):
+        query = HeatmapQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        resolution = params['resolution']
+
+        cells, cached_days = build_heatmap(
+            params['origin'], resolution, params['status'], params['pickup_time_after'], params['pickup_time_before']
+        )
+        response = Response(
+            {
+                'origin': params['origin'],
+                'resolution': resolution,
+                'pickup_time_after': params['pickup_time_after'],
+                'pickup_time_before': params['pickup_time_before'],
+                'total': sum(cells.values()),
+                'cells': [
+                    {
+                        'latitude': round(row * resolution - 90, 6),
+                        'longitude': round(column * resolution - 180, 6),
+                        'count': count,
+                    }
+                    for (row, column), count in sorted(cells.items())
+                ],
+            }
+        )
+        response['X-Cached-Days'] = str(cached_days)
+        return response
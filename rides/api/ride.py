@@ -1,32 +1,77 @@
 import logging
+import time
+from datetime import UTC, datetime
 from enum import StrEnum
+from functools import partial
 from typing import TYPE_CHECKING
 
-from django.db.models import ExpressionWrapper, F, FloatField, Prefetch
-from django.db.models.functions import ATan2, Cos, Radians, Sin, Sqrt
-from django.http import Http404
+from django import forms
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, Prefetch, Q, Value, Window
+from django.db.models.functions import ATan2, Cos, Radians, RowNumber, Sin, Sqrt
+from django.db.models.query import EmptyQuerySet
+from django.http import Http404, StreamingHttpResponse
 from django_filters import rest_framework as filters
+from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
 
+from rides.api.caching import cache_response, conditional_response
+from rides.api.export import CONTENT_TYPES, ExportFormat, astream_export, stream_export
+from rides.api.mixins import ReplicaReadMixin
+from rides.api.pagination import (
+    PageSizePagination,
+    PaginationMode,
+    RideEventCursorPagination,
+    RideEventHistoryPagination,
+    SelectablePaginationMixin,
+)
 from rides.api.permissions import IsAdmin
-from rides.models import Ride, RideEvent, RideStatus
-from rides.serializers.ride import RideSerializer
-from rides.utils import twenty_four_hours_ago
+from rides.api.renderers import ORJSONRenderer
+from rides.cache import get_versions, stats
+from rides.geo import EARTH_RADIUS_KM, bounding_box, grid_cell_ranges, longitude_ranges
+from rides.metrics import record_serialization
+from rides.models import ArchivedRideEvent, Ride, RideEvent, RideEventType, RideStatus
+from rides.search import filter_by_email
+from rides.serializers.fast import FastSerializer
+from rides.serializers.ride import RideEventHistorySerializer, RideEventSerializer, RideSerializer
+from rides.utils import get_time_before
 
 if TYPE_CHECKING:
+    from django.db.models import QuerySet
     from django_filters.rest_framework import FilterSet
     from rest_framework.filters import BaseFilterBackend
 
 logger = logging.getLogger('rides.api.ride')
 
 
+class IntegerFilter(filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
 class RideFilter(filters.FilterSet):
-    status = filters.MultipleChoiceFilter(label='Ride status', field_name='status', choices=RideStatus.choices)
+    # Not joined, so no DISTINCT needed (it would sort on every column instead of using the indexes)
+    status = filters.MultipleChoiceFilter(
+        label='Ride status', field_name='status', choices=RideStatus.choices, distinct=False
+    )
     rider_email = filters.CharFilter(
-        label="Rider's email address", field_name='id_rider__email', lookup_expr='icontains'
+        label="Rider's email address",
+        help_text=(
+            'Case-insensitive. A complete address is matched exactly, "user1*" matches by prefix and anything '
+            'else as a substring.'
+        ),
+        method='filter_rider_email',
+    )
+    driver_id = filters.NumberFilter(label='Driver ID', field_name='id_driver')
+    pickup_time = filters.IsoDateTimeFromToRangeFilter(
+        label='Pickup time',
+        help_text='Pickup time window, "pickup_time_after" and/or "pickup_time_before" (ISO 8601, inclusive).',
     )
     lat = filters.NumberFilter(
         label='Latitude',
@@ -38,6 +83,35 @@ class RideFilter(filters.FilterSet):
         help_text='Longitude. Used in conjunction with "lat" for distance ordering. Will <b>not</b> filter results.',
         method='set_longitude',
     )
+    origin = filters.ChoiceFilter(
+        label='Distance origin',
+        help_text='Ride coordinates to measure the distance from: "pickup" (default) or "dropoff". Will <b>not</b> filter results.',
+        choices=[('pickup', 'Pickup'), ('dropoff', 'Dropoff')],
+        method='set_origin',
+    )
+    event_type = filters.MultipleChoiceFilter(
+        label='Event type',
+        help_text='Only include these types of events in "todays_ride_events". Will <b>not</b> filter results.',
+        choices=RideEventType.choices,
+        method='set_event_type',
+    )
+    events_limit = IntegerFilter(
+        label='Events limit',
+        help_text=(
+            'Only include the N most recent events in "todays_ride_events", 0 to omit them. The full timeline of a '
+            'ride is served by rides/{id}/events/. Will <b>not</b> filter results.'
+        ),
+        min_value=0,
+        method='set_events_limit',
+    )
+    radius_km = filters.NumberFilter(
+        label='Radius (km)',
+        help_text='Only return rides whose origin is within this many kilometers of "lat" and "lon".',
+        method='set_radius',
+    )
+
+    def filter_rider_email(self, queryset, name, value):
+        return filter_by_email(queryset, 'id_rider', value)
 
     def set_latitude(self, queryset, name, value):
         # Do nothing, only used to display field in DRF browsable API
@@ -47,39 +121,91 @@ class RideFilter(filters.FilterSet):
         # Do nothing, only used to display field in DRF browsable API
         return queryset
 
+    def set_origin(self, queryset, name, value):
+        # Do nothing, only used to display field in DRF browsable API
+        return queryset
+
+    def set_radius(self, queryset, name, value):
+        # Do nothing, radius filtering is done by DistanceOrderingFilter alongside the distance annotation
+        return queryset
+
+    def set_event_type(self, queryset, name, value):
+        # Do nothing, applied to the events by RideViewSet.get_events_queryset
+        return queryset
+
+    def set_events_limit(self, queryset, name, value):
+        # Do nothing, applied to the events by RideViewSet.get_events_queryset
+        return queryset
+
     class Meta:
         model = Ride
-        fields = ['status', 'rider_email']
+        fields = ['status', 'rider_email', 'driver_id', 'pickup_time']
 
 
 class DistanceOrderingFilter(OrderingFilter):
     KEY = 'distance'
     LAT_PARAM = 'lat'
     LON_PARAM = 'lon'
+    ORIGIN_PARAM = 'origin'
+    RADIUS_PARAM = 'radius_km'
 
     class Origin(StrEnum):
         PICKUP_LATITUDE = 'pickup_latitude'
         PICKUP_LONGITUDE = 'pickup_longitude'
+        PICKUP_CELL = 'pickup_cell'
         DROPOFF_LATITUDE = 'dropoff_latitude'
         DROPOFF_LONGITUDE = 'dropoff_longitude'
+        DROPOFF_CELL = 'dropoff_cell'
 
-    def filter_queryset(self, request, queryset, view):
-        ordering: list[str] = self.get_ordering(request, queryset, view)
-
-        if not ordering:
-            return queryset
-
-        if self.KEY not in [field.lstrip('-') for field in ordering]:
-            return queryset.order_by(*ordering)
+    # Value of the "origin" param -> (latitude, longitude, grid cell) fields to measure the distance from
+    ORIGINS = {
+        'pickup': (Origin.PICKUP_LATITUDE, Origin.PICKUP_LONGITUDE, Origin.PICKUP_CELL),
+        'dropoff': (Origin.DROPOFF_LATITUDE, Origin.DROPOFF_LONGITUDE, Origin.DROPOFF_CELL),
+    }
+    DEFAULT_ORIGIN = 'pickup'
 
+    def get_coordinates(self, request) -> tuple[float, float]:
         try:
-            user_lat = float(request.query_params.get(self.LAT_PARAM))
-            user_lon = float(request.query_params.get(self.LON_PARAM))
+            return float(request.query_params.get(self.LAT_PARAM)), float(request.query_params.get(self.LON_PARAM))
         except (TypeError, ValueError):
-            error = f'Latitude (key: {self.LAT_PARAM}) and longitude (key: {self.LAT_PARAM}) must be provided as valid numbers when ordering by distance.'
+            error = f'Latitude (key: {self.LAT_PARAM}) and longitude (key: {self.LON_PARAM}) must be provided as valid numbers when ordering or filtering by distance.'
             logger.exception(error)
             raise Http404(error)
 
+    def get_origin(self, request) -> tuple[Origin, Origin, Origin]:
+        origin = request.query_params.get(self.ORIGIN_PARAM) or self.DEFAULT_ORIGIN
+        if origin not in self.ORIGINS:
+            error = f'Origin (key: {self.ORIGIN_PARAM}) must be one of: {", ".join(self.ORIGINS)}.'
+            logger.error(error)
+            raise Http404(error)
+        return self.ORIGINS[origin]
+
+    def get_radius(self, request) -> float | None:
+        radius = request.query_params.get(self.RADIUS_PARAM)
+        if radius in (None, ''):
+            return None
+
+        try:
+            radius = float(radius)
+        except ValueError:
+            radius = -1.0
+        if not radius > 0:
+            error = f'Radius (key: {self.RADIUS_PARAM}) must be a positive number of kilometers.'
+            logger.error(error)
+            raise Http404(error)
+        return radius
+
+    def filter_queryset(self, request, queryset, view):
+        ordering: list[str] = self.get_ordering(request, queryset, view)
+        radius_km = self.get_radius(request)
+        order_by_distance = bool(ordering) and self.KEY in [field.lstrip('-') for field in ordering]
+
+        if not order_by_distance and radius_km is None:
+            return queryset.order_by(*ordering) if ordering else queryset
+
+        user_lat, user_lon = self.get_coordinates(request)
+        origin_lat, origin_lon, origin_cell = self.get_origin(request)
+
         # Haversine forula (https://en.wikipedia.org/wiki/Haversine_formula)
         # Patterned from: https://www.movable-type.co.uk/scripts/latlong.html
         # 1. Convert degrees to radians
@@ -87,13 +213,7 @@ class DistanceOrderingFilter(OrderingFilter):
         # 3. Apply Haversine formula (atan^2 version for numerical stability according to internet)
         # 4. Multiply by Earth's radius (in kilometers)
         # Full Formula: radius * 2 * atan2( sqrt(Sin(lat/2)^2 + Cos(lat1)*Cos(lat2)*Sin(lon/2)^2), sqrt(1 - (Sin(lat/2)^2 + Cos(lat1)*Cos(lat2)*Sin(lon/2)^2)) )
-        def haversine_formula_expr(
-            *,
-            origin_lat: self.Origin = self.Origin.PICKUP_LATITUDE,
-            origin_lon: self.Origin = self.Origin.PICKUP_LONGITUDE,
-        ) -> ExpressionWrapper:
-            EARTH_RADIUS_KM: float = 6371.0
-
+        def haversine_formula_expr() -> ExpressionWrapper:
             lat_delta = Radians(F(origin_lat)) - Radians(user_lat)
             lon_delta = Radians(F(origin_lon)) - Radians(user_lon)
             a = (
@@ -106,8 +226,25 @@ class DistanceOrderingFilter(OrderingFilter):
                 output_field=FloatField(),
             )
 
+        if radius_km is not None:
+            # Narrow the candidates down with the indexed grid cells (and the exact bounding box) first, so the
+            # haversine is only computed for rides around the user instead of the whole table
+            cells = Q()
+            for first_cell, last_cell in grid_cell_ranges(user_lat, user_lon, radius_km):
+                cells |= Q(**{f'{origin_cell}__range': (first_cell, last_cell)})
+
+            min_lat, max_lat, min_lon, max_lon = bounding_box(user_lat, user_lon, radius_km)
+            longitudes = Q()
+            for start, end in longitude_ranges(min_lon, max_lon):
+                longitudes |= Q(**{f'{origin_lon}__range': (start, end)})
+
+            queryset = queryset.filter(cells, longitudes, **{f'{origin_lat}__range': (min_lat, max_lat)})
+
         queryset = queryset.annotate(distance=haversine_formula_expr())
-        return queryset.order_by(*ordering)
+        if radius_km is not None:
+            queryset = queryset.filter(distance__lte=radius_km)
+
+        return queryset.order_by(*ordering) if ordering else queryset
 
 
 def get_filter_backends() -> list['FilterSet | BaseFilterBackend']:
@@ -124,14 +261,225 @@ def get_filter_backends() -> list['FilterSet | BaseFilterBackend']:
     return filter_backends_without_ordering + filter_backends_for_this_api
 
 
-class RideViewSet(ModelViewSet):
-    queryset = (
-        Ride.objects.select_related('id_rider', 'id_driver')
-        .prefetch_related(Prefetch('events', RideEvent.objects.filter(created_at__gt=twenty_four_hours_ago())))
-        .all()
-    )
+def get_todays_events_queryset(
+    event_types: list[str] | None = None, per_ride: int | None = None
+) -> 'QuerySet[RideEvent]':
+    """Recent events embedded in rides, at most `per_ride` per ride (default: RIDES_TODAYS_EVENTS_PER_RIDE, 0 for all)."""
+    events = RideEvent.objects.filter(created_at__gt=get_time_before(hours=settings.RIDES_TODAYS_EVENTS_WINDOW_HOURS))
+    if event_types:
+        events = events.filter(event_type__in=event_types)
+
+    if per_ride is None:
+        per_ride = settings.RIDES_TODAYS_EVENTS_PER_RIDE
+    if per_ride:
+        # Keep only the N most recent events of each ride, so a single chatty ride can't inflate a page
+        events = events.annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=F('id_ride'),
+                order_by=[F('created_at').desc(), F('id_ride_event').desc()],
+            )
+        ).filter(recency__lte=per_ride)
+
+    return events.order_by('-created_at', '-id_ride_event')
+
+
+class RideViewSet(ReplicaReadMixin, SelectablePaginationMixin, ModelViewSet):
+    queryset = Ride.objects.select_related('id_rider', 'id_driver').all()
     serializer_class = RideSerializer
+    fast_serializer = FastSerializer(RideSerializer, pk='id_ride')
     permission_classes = [IsAuthenticated, IsAdmin]
     filterset_class = RideFilter
     ordering_fields = ['pickup_time', 'distance']
     filter_backends = get_filter_backends()
+    renderer_classes = [ORJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+    EXPORT_FORMAT_PARAM = 'export_format'
+    EVENT_TYPE_PARAM = 'event_type'
+    EVENTS_LIMIT_PARAM = 'events_limit'
+    # Rides of the list, counted along the validators of the response (see get_validators)
+    rides_count: int | None = None
+    # Cleaned filter params, see get_filter_values
+    filter_values: dict | None = None
+
+    def get_queryset(self):
+        if self.action in ('events', 'history'):
+            # Only the ride itself, its events are queried and paginated by the action
+            return super().get_queryset().select_related(None).only('pk')
+        # The events window is computed per request, not once when the module is imported
+        return super().get_queryset().prefetch_related(Prefetch('events', self.get_events_queryset()))
+
+    def get_filter_values(self) -> dict:
+        """Cleaned values of the RideFilter params, empty when invalid (the filter backend rejects the request)."""
+        if self.filter_values is None:
+            filterset = self.filterset_class(
+                self.request.query_params, queryset=Ride.objects.none(), request=self.request
+            )
+            self.filter_values = filterset.form.cleaned_data if filterset.is_valid() else {}
+        return self.filter_values
+
+    def get_events_queryset(self) -> 'QuerySet[RideEvent]':
+        # The limit can only lower RIDES_TODAYS_EVENTS_PER_RIDE
+        values = self.get_filter_values()
+        per_ride = settings.RIDES_TODAYS_EVENTS_PER_RIDE
+        events_limit = values.get(self.EVENTS_LIMIT_PARAM)
+        if events_limit is not None:
+            if events_limit <= 0:
+                # Not even queried
+                return RideEvent.objects.none()
+            per_ride = min(events_limit, per_ride) if per_ride else events_limit
+        return get_todays_events_queryset(values.get(self.EVENT_TYPE_PARAM), per_ride)
+
+    def serialize_rows(self, rows, using: str | None = None) -> list[dict]:
+        events_queryset = self.get_events_queryset()
+        if using is not None:
+            events_queryset = events_queryset.using(using)
+        events = self.fast_serializer.fill_nested('events', rows, events_queryset, 'id_ride')
+        return self.fast_serializer.to_representation(rows, {'events': events})
+
+    async def aserialize_rows(self, rows, using: str | None = None) -> list[dict]:
+        events_queryset = self.get_events_queryset()
+        if using is not None:
+            events_queryset = events_queryset.using(using)
+        events = await self.fast_serializer.afill_nested('events', rows, events_queryset, 'id_ride')
+        return self.fast_serializer.to_representation(rows, {'events': events})
+
+    def serialize(self, rides) -> list[dict]:
+        if settings.RIDES_FAST_SERIALIZATION:
+            return self.serialize_rows(list(rides))
+        return self.get_serializer(rides, many=True).data
+
+    def get_validators(self) -> tuple[datetime | None, str] | None:
+        """
+        Validators of the list/retrieve responses (see conditional_response), with one query: number and last change
+        of the filtered rides (only the requested one on retrieve). Lists only get an ETag, a ride deleted or moved
+        out of the filters doesn't raise the last change. Cursor pages have none: counting the filtered rides is what
+        keyset pagination avoids, their ETag is computed from the page. Embedded events also change as they get older
+        than the events window, so the validators of responses with events are renewed every
+        RIDES_EVENTS_VALIDATOR_SECONDS.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        detail = lookup_url_kwarg in self.kwargs
+        if not detail and self.get_pagination_mode() == PaginationMode.CURSOR:
+            return None
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if detail:
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError):
+                raise Http404
+        rides = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        self.rides_count = rides['count']
+
+        changed_at = rides['last_modified']
+        state = f'{rides["count"]}:{changed_at.isoformat() if changed_at is not None else ""}'
+        last_modified = changed_at if detail else None
+        if isinstance(self.get_events_queryset(), EmptyQuerySet):
+            return last_modified, state
+
+        period = settings.RIDES_EVENTS_VALIDATOR_SECONDS
+        renewed_at = datetime.fromtimestamp(time.time() // period * period, tz=UTC)
+        if last_modified is not None:
+            last_modified = max(last_modified, renewed_at)
+        return last_modified, f'{state}:{renewed_at.isoformat()}'
+
+    def paginate_queryset(self, queryset):
+        if self.rides_count is not None and isinstance(self.paginator, PageSizePagination):
+            return self.paginator.paginate_queryset(queryset, self.request, view=self, count=self.rides_count)
+        return super().paginate_queryset(queryset)
+
+    @cache_response('rides.list')
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if settings.RIDES_FAST_SERIALIZATION:
+            # Read-only fast path: same schema as RideSerializer, built from .values() rows
+            queryset = self.fast_serializer.values(queryset)
+
+        page = self.paginate_queryset(queryset)
+        with record_serialization(request):
+            data = self.serialize(page if page is not None else queryset)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RIDES_FAST_SERIALIZATION:
+            instance = self.get_object()
+            with record_serialization(request):
+                data = self.get_serializer(instance).data
+            return Response(data)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        rows = self.fast_serializer.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        with record_serialization(request):
+            data = self.serialize_rows([row])[0]
+        return Response(data)
+
+    @action(detail=False, url_path='cache-stats', pagination_class=None, filter_backends=[])
+    def cache_stats(self, request, *args, **kwargs):
+        return Response({**stats, 'versions': get_versions()})
+
+    @action(detail=True, url_path='events', filter_backends=[])
+    def events(self, request, *args, **kwargs):
+        """Timeline of the ride, most recent events first, keyset paginated on (created_at, id_ride_event)."""
+        ride = self.get_object()
+        events = RideEvent.objects.filter(id_ride=ride).order_by('-created_at', '-id_ride_event')
+        paginator = RideEventCursorPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response(RideEventSerializer(page, many=True).data)
+
+    @action(detail=True, url_path='history', filter_backends=[])
+    def history(self, request, *args, **kwargs):
+        """Every event of the ride, archived ones included (see archive_ride_events), most recent first."""
+        ride = self.get_object()
+        fields = ['id_ride_event', 'description', 'event_type', 'created_at']
+        events = [
+            RideEvent.objects.filter(id_ride=ride).values(*fields, archived=Value(False)),
+            ArchivedRideEvent.objects.filter(id_ride=ride).values(*fields, archived=Value(True)),
+        ]
+        paginator = RideEventHistoryPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response(RideEventHistorySerializer(page, many=True).data)
+
+    @action(detail=False, url_path='export', pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        """Streams every ride matching the filters as NDJSON (default) or CSV (`export_format=csv`)."""
+        try:
+            export_format = ExportFormat(request.query_params.get(self.EXPORT_FORMAT_PARAM) or ExportFormat.NDJSON)
+        except ValueError:
+            error = f'Export format (key: {self.EXPORT_FORMAT_PARAM}) must be one of: {", ".join(ExportFormat)}.'
+            logger.error(error)
+            raise Http404(error)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('id_ride')
+
+        # The rows are streamed after the view returns: stick to the database picked for this request
+        using = router.db_for_read(Ride)
+        chunk_size = settings.RIDES_EXPORT_CHUNK_SIZE
+        rows = self.fast_serializer.values(queryset.using(using))
+        if isinstance(request._request, ASGIRequest):
+            # Async iterator, Django would read a synchronous one in full before sending it
+            content = astream_export(
+                self.fast_serializer,
+                rows.aiterator(chunk_size=chunk_size),
+                partial(self.aserialize_rows, using=using),
+                export_format,
+                chunk_size,
+            )
+        else:
+            content = stream_export(
+                self.fast_serializer,
+                rows.iterator(chunk_size=chunk_size),
+                partial(self.serialize_rows, using=using),
+                export_format,
+                chunk_size,
+            )
+        response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="rides.{export_format}"'
+        return response
@@ -0,0 +1,90 @@
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from rides.api.renderers import ORJSONRenderer
+from rides.api.ride import RideViewSet
+from rides.metrics import record_serialization
+from rides.routers import read_from_replica
+
+
+class AsyncRideView(View):
+    """
+    Async variant of the RideViewSet list (no `pk`) and retrieve actions, for ASGI servers.
+
+    Reuses the configuration of RideViewSet (filters, ordering, pagination, permissions, fast serialization) but
+    authenticates with `request.auser()` and queries with the async ORM, so the request never leaves the event
+    loop except for the database calls themselves. Responses are always JSON and are not cached.
+    """
+
+    viewset_class = RideViewSet
+    http_method_names = ['get', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            with read_from_replica():
+                viewset = await self.initial(request, 'retrieve' if 'pk' in kwargs else 'list', args, kwargs)
+                if viewset.action == 'retrieve':
+                    data = await self.retrieve(viewset)
+                else:
+                    data = await self.list(viewset)
+        except (Http404, exceptions.APIException) as exc:
+            return self.handle_exception(request, exc)
+
+        renderer = ORJSONRenderer()
+        content = renderer.render(data, renderer.media_type, {'request': viewset.request})
+        return HttpResponse(content, content_type=renderer.media_type)
+
+    async def initial(self, request, action: str, args, kwargs) -> RideViewSet:
+        # Session authentication, as RideViewSet's SessionAuthentication does for safe methods
+        drf_request = Request(request, authenticators=())
+        drf_request.user = await request.auser()
+
+        viewset = self.viewset_class(
+            request=drf_request, args=args, kwargs=kwargs, format_kwarg=None, action=action, headers={}
+        )
+        for permission in viewset.get_permissions():
+            if not permission.has_permission(drf_request, viewset):
+                if not drf_request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        return viewset
+
+    async def list(self, viewset: RideViewSet):
+        rows = viewset.fast_serializer.values(viewset.filter_queryset(viewset.get_queryset()))
+        page = await viewset.paginator.apaginate_queryset(rows, viewset.request, view=viewset)
+        with record_serialization(viewset.request):
+            data = await viewset.aserialize_rows(page if page is not None else [row async for row in rows])
+        if page is None:
+            return data
+        return viewset.paginator.get_paginated_response(data).data
+
+    async def retrieve(self, viewset: RideViewSet):
+        rows = viewset.fast_serializer.values(viewset.filter_queryset(viewset.get_queryset()))
+        try:
+            row = await rows.aget(**{viewset.lookup_field: viewset.kwargs['pk']})
+        except rows.model.DoesNotExist:
+            raise Http404(f'No {rows.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError):
+            raise Http404
+
+        for permission in viewset.get_permissions():
+            if not permission.has_object_permission(viewset.request, viewset, row):
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        with record_serialization(viewset.request):
+            return (await viewset.aserialize_rows([row]))[0]
+
+    def handle_exception(self, request, exc: Exception) -> HttpResponse:
+        # Same responses as DRF's exception handler
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+
+        status_code = exc.status_code
+        if isinstance(exc, exceptions.NotAuthenticated):
+            # Session authentication has no WWW-Authenticate header, DRF answers 403 instead of 401
+            status_code = status.HTTP_403_FORBIDDEN
+
+        data = exc.detail if isinstance(exc.detail, list | dict) else {'detail': exc.detail}
+        renderer = ORJSONRenderer()
+        return HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
@@ -0,0 +1,124 @@
+import logging
+from collections.abc import Iterable
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from rides.api.parsers import NDJSONParser
+from rides.api.permissions import IsAdmin
+from rides.models import ArchivedRideEvent, Ride, RideEvent, RideEventType
+from rides.serializers.ride import RideEventIngestSerializer
+
+logger = logging.getLogger('rides.api.ride_event')
+
+
+class RideEventBulkCreateView(APIView):
+    """
+    Ingests ride events in bulk, from a JSON array or a (streamed) NDJSON body.
+
+    Events are validated and inserted in chunks, each chunk resolving its rides in a single query and being inserted
+    with one `bulk_create` in its own transaction. Returns one result per item, in the order they were received:
+    "created", "duplicate" (an event with the same idempotency key already exists) or "invalid" (with the errors).
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    parser_classes = [JSONParser, NDJSONParser]
+    serializer_class = RideEventIngestSerializer
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if isinstance(items, dict) or not isinstance(items, Iterable):
+            raise ParseError('Expected a JSON array or NDJSON lines of ride events.')
+
+        items, results = iter(items), []
+        while chunk := list(islice(items, settings.RIDES_INGEST_CHUNK_SIZE)):
+            results.extend(self.ingest_chunk(chunk, offset=len(results)))
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {
+                'created': created,
+                'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+                'invalid': sum(1 for result in results if result['status'] == 'invalid'),
+                'results': results,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def validate_chunk(self, chunk: list, offset: int) -> tuple[list[dict], dict[int, dict]]:
+        serializer, validated, results = self.serializer_class(), [], {}
+        for index, item in enumerate(chunk, start=offset):
+            try:
+                if isinstance(item, ParseError):
+                    raise ValidationError({'non_field_errors': [item.detail]})
+                validated.append({'index': index, **serializer.to_internal_value(item)})
+            except ValidationError as exc:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': exc.detail}
+
+        # Resolve every referenced ride at once
+        ride_ids = set(Ride.objects.filter(pk__in={item['id_ride'] for item in validated}).values_list('pk', flat=True))
+        for item in validated:
+            if item['id_ride'] not in ride_ids:
+                error = f'Invalid pk "{item["id_ride"]}" - object does not exist.'
+                results[item['index']] = {'index': item['index'], 'status': 'invalid', 'errors': {'id_ride': [error]}}
+
+        return [item for item in validated if item['index'] not in results], results
+
+    def ingest_chunk(self, chunk: list, offset: int) -> list[dict]:
+        validated, invalid = self.validate_chunk(chunk, offset)
+
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    results = {**invalid, **self.insert(validated)}
+                break
+            except IntegrityError:
+                # The same idempotency key was ingested concurrently, it is reported as a duplicate on the retry
+                if attempt:
+                    raise
+                logger.warning('Idempotency key conflict while ingesting ride events, retrying the chunk')
+
+        return [results[index] for index in range(offset, offset + len(chunk))]
+
+    def insert(self, validated: list[dict]) -> dict[int, dict]:
+        keys = {item['idempotency_key'] for item in validated if item.get('idempotency_key')}
+        # Archived events keep their key, a batch retried after they were archived must not insert them again
+        existing = {}
+        for model in (ArchivedRideEvent, RideEvent):
+            existing.update(model.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'pk'))
+
+        results, new_items, events, seen_keys = {}, [], [], {}
+        for item in validated:
+            key = item.get('idempotency_key')
+            if key in existing:
+                results[item['index']] = {'index': item['index'], 'status': 'duplicate', 'id_ride_event': existing[key]}
+            elif key in seen_keys:
+                # Duplicated within the same chunk, resolved once the first one is inserted
+                seen_keys[key].append(item['index'])
+            else:
+                if key:
+                    seen_keys[key] = []
+                new_items.append(item)
+                events.append(
+                    RideEvent(
+                        id_ride_id=item['id_ride'],
+                        description=item['description'],
+                        event_type=item.get('event_type', RideEventType.OTHER),
+                        idempotency_key=key,
+                    )
+                )
+
+        RideEvent.objects.bulk_create(events)
+
+        for item, event in zip(new_items, events):
+            results[item['index']] = {'index': item['index'], 'status': 'created', 'id_ride_event': event.pk}
+            for duplicate_index in seen_keys.get(event.idempotency_key, []):
+                results[duplicate_index] = {'index': duplicate_index, 'status': 'duplicate', 'id_ride_event': event.pk}
+        return results
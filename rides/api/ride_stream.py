@@ -0,0 +1,103 @@
+import asyncio
+
+import orjson
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import exceptions, status
+
+from rides.api.ride import RideViewSet
+from rides.api.ride_async import AsyncRideView
+from rides.models import Ride, User
+from rides.search import filter_by_email, get_email_match
+from rides.stream import Subscription, broker, build_reset_message
+
+
+class ASGIRequired(exceptions.APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Streams are only served by ASGI servers (SERVER=asgi).'
+
+
+def format_message(message: dict) -> str:
+    lines = [] if message['id'] is None else [f'id: {message["id"]}']
+    lines += [f'event: {message["type"]}', f'data: {orjson.dumps(message["data"], option=orjson.OPT_UTC_Z).decode()}']
+    return '\n'.join(lines) + '\n\n'
+
+
+class RideStreamView(AsyncRideView):
+    """
+    Server-sent events of ride updates, instead of polling the rides list: `ride` (new ride or status change) and
+    `event` (new ride event) messages, filtered like the rides list by `status`, `rider_email` and `driver_id`.
+
+    Clients resume with the `Last-Event-ID` header (sent by EventSource when reconnecting) or the `last_event_id`
+    param, and get a `reset` message when they missed messages and should reload the rides list. Idle streams are
+    suspended coroutines waiting on their queue (see rides.stream.Broker), so ASGI servers are required.
+    """
+
+    viewset_class = RideViewSet
+    LAST_EVENT_ID_PARAM = 'last_event_id'
+    # Reconnection delay of the clients
+    RETRY_MS = 3000
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            if not isinstance(request, ASGIRequest):
+                raise ASGIRequired()
+            viewset = await self.initial(request, 'list', args, kwargs)
+            subscription = await self.get_subscription(viewset)
+        except (Http404, exceptions.APIException) as exc:
+            return self.handle_exception(request, exc)
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get(self.LAST_EVENT_ID_PARAM)
+        response = StreamingHttpResponse(self.stream(subscription, last_event_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Don't let proxies (i.e. nginx) buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def get_subscription(self, viewset: RideViewSet) -> Subscription:
+        filterset = viewset.filterset_class(
+            viewset.request.query_params, queryset=Ride.objects.none(), request=viewset.request
+        )
+        if not filterset.is_valid():
+            raise exceptions.ValidationError(filterset.errors)
+        filters = filterset.form.cleaned_data
+
+        rider_ids = None
+        if filters.get('rider_email') and get_email_match(filters['rider_email'])[1]:
+            # Riders matching when the stream starts
+            riders = filter_by_email(User.objects.all(), 'pk', filters['rider_email']).values_list('pk', flat=True)
+            rider_ids = {pk async for pk in riders}
+
+        return Subscription(
+            loop=asyncio.get_running_loop(),
+            statuses=set(filters.get('status') or []),
+            rider_ids=rider_ids,
+            driver_id=None if filters.get('driver_id') is None else int(filters['driver_id']),
+        )
+
+    async def stream(self, subscription: Subscription, last_event_id: str | None):
+        # Subscribed once the response starts, so a client gone before that leaves nothing behind
+        backlog = broker.subscribe(subscription, last_event_id)
+        try:
+            yield f'retry: {self.RETRY_MS}\n\n'
+            for message in backlog:
+                yield format_message(message)
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.RIDES_STREAM_KEEPALIVE_SECONDS
+                    )
+                except TimeoutError:
+                    # Comment line, keeps proxies from closing idle streams
+                    yield ': keepalive\n\n'
+                    continue
+
+                if message is None:
+                    # Too far behind (see Subscription.put)
+                    yield format_message(build_reset_message(None))
+                    return
+                yield format_message(message)
+        finally:
+            broker.unsubscribe(subscription)
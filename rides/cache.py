@@ -0,0 +1,63 @@
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+# Tables whose writes invalidate cached API responses, see rides.receivers
+VERSIONED_TABLES = ('ride', 'rideevent', 'user')
+
+# Per process counters of the response cache
+stats: Counter = Counter()
+
+
+def get_cache() -> BaseCache:
+    return caches[settings.RIDES_CACHE_ALIAS]
+
+
+def get_version_key(table: str) -> str:
+    return f'rides:version:{table}'
+
+
+def get_versions(tables: tuple[str, ...] = VERSIONED_TABLES) -> tuple[int, ...]:
+    cache = get_cache()
+    keys = [get_version_key(table) for table in tables]
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            # Counters start (or restart, after an eviction) at a value that can't have been used before, so entries
+            # cached under an evicted counter are never served again
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key) or time.time_ns()
+
+    return tuple(versions[key] for key in keys)
+
+
+def bump_versions(*tables: str) -> None:
+    cache = get_cache()
+    for table in tables:
+        try:
+            cache.incr(get_version_key(table))
+        except ValueError:
+            cache.add(get_version_key(table), time.time_ns(), timeout=None)
+
+
+def get_request_digest(uri: str, params: dict[str, list[str]], media_type: str) -> str:
+    normalized = '&'.join(
+        f'{name}={",".join(sorted(values))}' for name, values in sorted(params.items()) if any(values)
+    )
+    return hashlib.sha256(f'{uri}?{normalized};{media_type}'.encode()).hexdigest()
+
+
+def get_response_key(namespace: str, uri: str, params: dict[str, list[str]], media_type: str) -> str:
+    """Builds the cache key of a response from its normalized parameters and the current table versions."""
+    versions = '.'.join(str(version) for version in get_versions())
+    return f'rides:response:{namespace}:{versions}:{get_request_digest(uri, params, media_type)}'
+
+
+def get_etag(uri: str, params: dict[str, list[str]], media_type: str, state: str) -> str:
+    """Builds the (quoted) ETag of a response from its normalized parameters and the state of its data."""
+    digest = hashlib.sha256(f'{get_request_digest(uri, params, media_type)};{state}'.encode()).hexdigest()
+    return f'"{digest[:32]}"'
@@ -0,0 +1,79 @@
+import math
+
+EARTH_RADIUS_KM: float = 6371.0
+KM_PER_DEGREE_LATITUDE: float = math.pi * EARTH_RADIUS_KM / 180
+
+# Fixed-size lat/lon grid used to index ride coordinates. A cell is ~1.1km tall, cells are numbered row-major
+# starting from (-90, -180) so a single row of cells is a contiguous integer range (index range scan friendly).
+GRID_CELL_DEGREES: float = 0.01
+GRID_ROWS: int = round(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS: int = round(360 / GRID_CELL_DEGREES)
+
+# Past this many rows a radius lookup uses a single (wider) cell range instead of one range per row
+MAX_GRID_ROW_RANGES: int = 32
+
+
+def grid_row(latitude: float) -> int:
+    return min(max(int((latitude + 90) // GRID_CELL_DEGREES), 0), GRID_ROWS - 1)
+
+
+def grid_column(longitude: float) -> int:
+    return min(max(int((longitude + 180) // GRID_CELL_DEGREES), 0), GRID_COLUMNS - 1)
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    return grid_row(latitude) * GRID_COLUMNS + grid_column(longitude)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float]:
+    """
+    Returns (min_lat, max_lat, min_lon, max_lon) enclosing a circle of `radius_km` around the point.
+    Longitudes are not wrapped, they may fall outside of [-180, 180] when the circle crosses the antimeridian.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+
+    # The widest part of the circle is on the parallel closest to a pole
+    widest_parallel = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest_parallel))
+    if widest_parallel >= 90 or radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+
+    lon_delta = radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat)
+    return min_lat, max_lat, longitude - lon_delta, longitude + lon_delta
+
+
+def longitude_ranges(min_lon: float, max_lon: float) -> list[tuple[float, float]]:
+    """Splits a longitude span that crosses the antimeridian into ranges within [-180, 180]."""
+    if min_lon < -180:
+        return [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return [(min_lon, max_lon)]
+
+
+def grid_cell_ranges(latitude: float, longitude: float, radius_km: float) -> list[tuple[int, int]]:
+    """Returns inclusive (first, last) cell ranges covering every cell within `radius_km` of the point."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    first_row, last_row = grid_row(min_lat), grid_row(max_lat)
+    columns = [(grid_column(start), grid_column(end)) for start, end in longitude_ranges(min_lon, max_lon)]
+
+    if last_row - first_row + 1 > MAX_GRID_ROW_RANGES:
+        return [(first_row * GRID_COLUMNS, last_row * GRID_COLUMNS + GRID_COLUMNS - 1)]
+
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+        for first_column, last_column in columns
+    ]
+
+
+def haversine_km(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """Great-circle distance between two points, same formula as DistanceOrderingFilter."""
+    dlat = math.radians(other_latitude - latitude)
+    dlon = math.radians(other_longitude - longitude)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(math.radians(latitude)) * math.cos(math.radians(other_latitude)) * math.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
@@ -0,0 +1,109 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.db.models.functions import Floor, TruncDate
+from django.utils import timezone
+
+from rides.cache import get_cache
+from rides.models import Ride
+
+# Grid resolutions (degrees) served, a fixed set so cached days are shared between requests
+RESOLUTIONS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+ORIGINS = ('pickup', 'dropoff')
+
+# Counts per (row, column) of the grid, rows from latitude -90 and columns from longitude -180
+Cells = dict[tuple[int, int], int]
+
+
+def get_day_key(origin: str, resolution: float, statuses: list[str], day: date) -> str:
+    return f'rides:heatmap:{origin}:{resolution}:{",".join(sorted(statuses)) or "all"}:{day.isoformat()}'
+
+
+def day_range(day: date) -> tuple[datetime, datetime]:
+    tz = timezone.get_current_timezone()
+    return datetime.combine(day, time.min, tzinfo=tz), datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+
+
+def get_closed_days(start: datetime, end: datetime) -> list[date]:
+    """
+    Days entirely within [start, end] that ended RIDES_HEATMAP_SETTLE_HOURS ago: their rides are not expected to
+    change anymore, so their counts are cached.
+    """
+    closed_before = timezone.now() - timedelta(hours=settings.RIDES_HEATMAP_SETTLE_HOURS)
+    day, days = timezone.localdate(start), []
+    while True:
+        day_start, day_end = day_range(day)
+        if day_end > end or day_end > closed_before:
+            return days
+        if day_start >= start:
+            days.append(day)
+        day += timedelta(days=1)
+
+
+def build_heatmap(
+    origin: str, resolution: float, statuses: list[str], start: datetime, end: datetime
+) -> tuple[Cells, int]:
+    """
+    Counts the rides picked up in [start, end] per cell of the grid of `resolution` degrees, on their `origin`
+    coordinates. Closed days are cached per day (see get_closed_days), the rest is counted with a single GROUP BY
+    query. Returns the cells and the number of days served from the cache.
+    """
+    cache = get_cache()
+    closed_days = get_closed_days(start, end)
+    keys = {day: get_day_key(origin, resolution, statuses, day) for day in closed_days}
+    cached = cache.get_many(keys.values())
+
+    cells: Counter = Counter()
+    missing_days = []
+    for day, key in keys.items():
+        if key in cached:
+            cells.update({(row, column): count for row, column, count in cached[key]})
+        else:
+            missing_days.append(day)
+
+    # Counted with one query: the window minus the cached days
+    uncached, range_start = Q(), start
+    for day in closed_days:
+        day_start, day_end = day_range(day)
+        if keys[day] in cached:
+            if range_start < day_start:
+                uncached |= Q(pickup_time__gte=range_start, pickup_time__lt=day_start)
+            range_start = day_end
+    uncached |= Q(pickup_time__gte=range_start, pickup_time__lte=end)
+
+    counted = count_cells(origin, resolution, statuses, uncached)
+    for day in missing_days:
+        # Empty days are cached too
+        cache.set(
+            keys[day],
+            [(*cell, count) for cell, count in counted[day].items()],
+            timeout=settings.RIDES_HEATMAP_CACHE_SECONDS,
+        )
+    for day_cells in counted.values():
+        cells.update(day_cells)
+
+    return dict(cells), len(closed_days) - len(missing_days)
+
+
+def count_cells(origin: str, resolution: float, statuses: list[str], window: Q) -> dict[date, Cells]:
+    """Counts the rides of `window` per day and cell, binned by the database."""
+    rides = Ride.objects.filter(window)
+    if statuses:
+        rides = rides.filter(status__in=statuses)
+
+    rows = (
+        rides.annotate(
+            day=TruncDate('pickup_time', tzinfo=timezone.get_current_timezone()),
+            row=Floor((F(f'{origin}_latitude') + 90) / resolution),
+            column=Floor((F(f'{origin}_longitude') + 180) / resolution),
+        )
+        .values_list('day', 'row', 'column')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    counted: dict[date, Cells] = defaultdict(dict)
+    for day, row, column, count in rows:
+        counted[day][int(row), int(column)] = count
+    return counted
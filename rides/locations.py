@@ -0,0 +1,294 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from rides.geo import (
+    GRID_CELL_DEGREES,
+    GRID_COLUMNS,
+    GRID_ROWS,
+    KM_PER_DEGREE_LATITUDE,
+    grid_cell,
+    grid_column,
+    grid_row,
+    haversine_km,
+)
+from rides.models import DriverLocation
+
+logger = logging.getLogger('rides.locations')
+
+# Floor of cos(latitude), so cells near the poles don't make the ring search unbounded
+MIN_LONGITUDE_SCALE: float = 0.01
+# Values per driver in GridCell.values: latitude, longitude, update time (epoch seconds)
+CELL_STRIDE: int = 3
+# Rows stored this long before the last sync are loaded again by the next one, as the writes of other processes
+# can commit out of order
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class DriverPosition:
+    __slots__ = ('available', 'cell', 'id_driver', 'index', 'latitude', 'longitude', 'updated_at')
+
+    def __init__(self, id_driver: int, latitude: float, longitude: float, available: bool, updated_at: float):
+        self.id_driver = id_driver
+        self.latitude = latitude
+        self.longitude = longitude
+        self.available = available
+        self.updated_at = updated_at
+        # Grid cell (see rides.geo) and position in it, None while unavailable (not in the grid)
+        self.cell: int | None = None
+        self.index: int = -1
+
+
+class GridCell:
+    """Available drivers of a grid cell, as flat arrays so a query scans them without touching Python objects."""
+
+    __slots__ = ('ids', 'values')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.values = array('d')
+
+
+class LocationStore:
+    """
+    Last known location of the drivers, in memory: every driver has a `DriverPosition` record, available drivers
+    are also in the grid cell of their location (the fixed grid of rides.geo). Nearest driver queries scan the rings
+    of cells around the point, closest first, and stop as soon as no further cell can hold a closer driver.
+
+    Updates are marked dirty and persisted to DriverLocation in batches by `sync`, which also loads the updates of
+    the other processes, so every process converges within RIDES_DRIVER_LOCATION_SYNC_SECONDS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.positions: dict[int, DriverPosition] = {}
+        self.cells: dict[int, GridCell] = {}
+        self.dirty: set[int] = set()
+        self.synced_at: datetime | None = None
+        self.sync_thread: threading.Thread | None = None
+
+    def update(
+        self, id_driver: int, latitude: float, longitude: float, available: bool = True, updated_at: float | None = None
+    ) -> None:
+        updated_at = time.time() if updated_at is None else updated_at
+        with self.lock:
+            self.set_position(id_driver, latitude, longitude, available, updated_at)
+            self.dirty.add(id_driver)
+
+    def set_unavailable(self, id_drivers: Iterable[int]) -> None:
+        """Takes the drivers out of the grid (i.e. once given a ride), until their next location update."""
+        updated_at = time.time()
+        with self.lock:
+            for id_driver in id_drivers:
+                if (position := self.positions.get(id_driver)) is not None:
+                    self.set_position(id_driver, position.latitude, position.longitude, False, updated_at)
+
+    def has_driver(self, id_driver: int) -> bool:
+        return id_driver in self.positions
+
+    def set_position(self, id_driver: int, latitude: float, longitude: float, available: bool, updated_at: float):
+        position = self.positions.get(id_driver)
+        if position is None:
+            position = self.positions[id_driver] = DriverPosition(id_driver, latitude, longitude, available, updated_at)
+        else:
+            position.latitude, position.longitude = latitude, longitude
+            position.available, position.updated_at = available, updated_at
+
+        cell = grid_cell(latitude, longitude) if available else None
+        if position.cell is not None and position.cell == cell:
+            # Same cell, moved in place
+            offset = position.index * CELL_STRIDE
+            self.cells[cell].values[offset : offset + CELL_STRIDE] = array('d', (latitude, longitude, updated_at))
+            return
+
+        if position.cell is not None:
+            self.remove_from_cell(position)
+        if cell is not None:
+            cell_drivers = self.cells.get(cell)
+            if cell_drivers is None:
+                cell_drivers = self.cells[cell] = GridCell()
+            position.cell, position.index = cell, len(cell_drivers.ids)
+            cell_drivers.ids.append(id_driver)
+            cell_drivers.values.extend((latitude, longitude, updated_at))
+
+    def remove_from_cell(self, position: DriverPosition) -> None:
+        # Swap with the last driver of the cell, then truncate
+        cell_drivers = self.cells[position.cell]
+        last = len(cell_drivers.ids) - 1
+        if position.index != last:
+            moved_id = cell_drivers.ids[last]
+            cell_drivers.ids[position.index] = moved_id
+            offset = position.index * CELL_STRIDE
+            cell_drivers.values[offset : offset + CELL_STRIDE] = cell_drivers.values[last * CELL_STRIDE :]
+            self.positions[moved_id].index = position.index
+        del cell_drivers.ids[last]
+        del cell_drivers.values[last * CELL_STRIDE :]
+        if not cell_drivers.ids:
+            del self.cells[position.cell]
+        position.cell, position.index = None, -1
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int, radius_km: float, max_age_seconds: float
+    ) -> list[tuple[float, DriverPosition]]:
+        """
+        Returns up to `k` (distance in km, position) of the available drivers closest to the point, within
+        `radius_km` and updated in the last `max_age_seconds`, closest first.
+        """
+        # Equirectangular distances while scanning (exact enough to rank drivers at city scale, much cheaper),
+        # haversine for the results
+        scale = max(math.cos(math.radians(latitude)), MIN_LONGITUDE_SCALE)
+        row, column = grid_row(latitude), grid_column(longitude)
+        cell_km = GRID_CELL_DEGREES * KM_PER_DEGREE_LATITUDE * scale
+        # Distance from the point to the closest edge of its cell, the minimum distance of the cells of ring 1
+        row_offset = latitude + 90 - row * GRID_CELL_DEGREES
+        column_offset = longitude + 180 - column * GRID_CELL_DEGREES
+        edge_km = KM_PER_DEGREE_LATITUDE * min(
+            row_offset,
+            GRID_CELL_DEGREES - row_offset,
+            scale * column_offset,
+            scale * (GRID_CELL_DEGREES - column_offset),
+        )
+        max_ring = min(math.ceil(max(radius_km - edge_km, 0) / cell_km) + 1, GRID_COLUMNS // 2)
+        oldest = time.time() - max_age_seconds
+
+        # Max heap (negated distances) of the k closest drivers found so far
+        closest: list[tuple[float, int]] = []
+        with self.lock:
+            for ring in range(max_ring + 1):
+                for cell in ring_cells(row, column, ring):
+                    cell_drivers = self.cells.get(cell)
+                    if cell_drivers is None:
+                        continue
+                    values = cell_drivers.values
+                    for index, id_driver in enumerate(cell_drivers.ids):
+                        offset = index * CELL_STRIDE
+                        if values[offset + 2] < oldest:
+                            continue
+                        dlon = values[offset + 1] - longitude
+                        if dlon > 180:
+                            dlon -= 360
+                        elif dlon < -180:
+                            dlon += 360
+                        dlat = values[offset] - latitude
+                        distance = KM_PER_DEGREE_LATITUDE * math.sqrt(dlat * dlat + dlon * dlon * scale * scale)
+                        if distance > radius_km:
+                            continue
+                        if len(closest) < k:
+                            heapq.heappush(closest, (-distance, id_driver))
+                        elif distance < -closest[0][0]:
+                            heapq.heapreplace(closest, (-distance, id_driver))
+
+                # Drivers of the next rings are at least this far
+                if len(closest) == k and -closest[0][0] <= edge_km + ring * cell_km:
+                    break
+
+            positions = [self.positions[id_driver] for _, id_driver in closest]
+            results = [
+                (haversine_km(latitude, longitude, position.latitude, position.longitude), copy_position(position))
+                for position in positions
+            ]
+        return sorted(results, key=lambda result: result[0])
+
+    def expire(self, max_age_seconds: float) -> int:
+        """Takes the drivers without update in the last `max_age_seconds` out of the grid, returns how many."""
+        oldest, expired = time.time() - max_age_seconds, 0
+        with self.lock:
+            for position in self.positions.values():
+                if position.cell is not None and position.updated_at < oldest:
+                    self.remove_from_cell(position)
+                    expired += 1
+        return expired
+
+    def take_dirty(self) -> list[DriverPosition]:
+        with self.lock:
+            positions = [copy_position(self.positions[id_driver]) for id_driver in self.dirty]
+            self.dirty.clear()
+        return positions
+
+    def sync(self) -> None:
+        """Persists the dirty positions, then loads the ones updated by other processes since the last sync."""
+        positions = self.take_dirty()
+        try:
+            DriverLocation.objects.bulk_create(
+                [
+                    DriverLocation(
+                        id_driver_id=position.id_driver,
+                        latitude=position.latitude,
+                        longitude=position.longitude,
+                        available=position.available,
+                        updated_at=datetime.fromtimestamp(position.updated_at, tz=UTC),
+                    )
+                    for position in positions
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['id_driver'],
+                update_fields=['latitude', 'longitude', 'available', 'updated_at', 'stored_at'],
+            )
+        except Exception:
+            # Written on the next sync, unless updated since
+            with self.lock:
+                self.dirty.update(position.id_driver for position in positions if position.id_driver in self.positions)
+            raise
+
+        locations = DriverLocation.objects.all()
+        if self.synced_at is not None:
+            locations = locations.filter(stored_at__gte=self.synced_at)
+        self.synced_at = datetime.now(tz=UTC) - SYNC_OVERLAP
+        # Fetched before taking the lock, which the requests wait on
+        rows = list(locations.values_list('id_driver', 'latitude', 'longitude', 'available', 'updated_at'))
+        with self.lock:
+            for id_driver, latitude, longitude, available, updated_at in rows:
+                position = self.positions.get(id_driver)
+                if position is None or position.updated_at < updated_at.timestamp():
+                    self.set_position(id_driver, latitude, longitude, available, updated_at.timestamp())
+
+    def start_sync(self) -> None:
+        """Starts the background thread syncing with the database every RIDES_DRIVER_LOCATION_SYNC_SECONDS."""
+        with self.lock:
+            if self.sync_thread is not None:
+                return
+            self.sync_thread = threading.Thread(target=self.run_sync, name='rides-driver-locations', daemon=True)
+        self.sync_thread.start()
+
+    def run_sync(self) -> None:
+        while True:
+            close_old_connections()
+            try:
+                self.sync()
+                self.expire(settings.RIDES_DRIVER_LOCATION_MAX_AGE_SECONDS)
+            except Exception:
+                logger.exception('Driver locations sync failed')
+            time.sleep(settings.RIDES_DRIVER_LOCATION_SYNC_SECONDS)
+
+
+def copy_position(position: DriverPosition) -> DriverPosition:
+    return DriverPosition(
+        position.id_driver, position.latitude, position.longitude, position.available, position.updated_at
+    )
+
+
+def ring_cells(row: int, column: int, ring: int) -> list[int]:
+    """Cells at Chebyshev distance `ring` of (row, column), columns wrapping around the antimeridian."""
+    if ring == 0:
+        return [row * GRID_COLUMNS + column]
+
+    cells = []
+    for ring_row in range(max(row - ring, 0), min(row + ring, GRID_ROWS - 1) + 1):
+        if abs(ring_row - row) == ring:
+            columns = range(column - ring, column + ring + 1)
+        else:
+            columns = (column - ring, column + ring)
+        cells.extend(ring_row * GRID_COLUMNS + ring_column % GRID_COLUMNS for ring_column in columns)
+    return cells
+
+
+store = LocationStore()
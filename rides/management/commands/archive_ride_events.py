@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.models import RideEvent
+from rides.utils import get_time_before
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the ride events older than the retention period (RIDES_EVENT_RETENTION_DAYS) to the archive table, '
+        'oldest first, in batches each committed in its own short transaction. Interrupted runs resume where they '
+        'stopped. Archived events are served by the rides/{id}/history/ endpoint. Meant to run periodically, so the '
+        'events table only holds the retention period.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.RIDES_EVENT_RETENTION_DAYS,
+            help='Archive events created more than this many days ago (default: RIDES_EVENT_RETENTION_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of events moved per transaction.')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches, 0 for no limit.')
+        parser.add_argument(
+            '--sleep', type=float, default=0.0, help='Seconds to wait between batches, to leave room for other writes.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only count the events that would be archived.')
+
+    def handle(self, *args, older_than_days: int, batch_size: int, max_batches: int, sleep: float, **options):
+        if older_than_days * 24 < settings.RIDES_TODAYS_EVENTS_WINDOW_HOURS:
+            raise CommandError(
+                f'Events of the last {settings.RIDES_TODAYS_EVENTS_WINDOW_HOURS} hours are embedded in rides, '
+                f'--older-than-days must cover them.'
+            )
+        before = get_time_before(days=older_than_days)
+        if options['dry_run']:
+            count = RideEvent.objects.filter(created_at__lt=before).count()
+            self.stdout.write(f'{count} events created before {before.isoformat()} would be archived.')
+            return
+
+        archived, batches = 0, 0
+        while not max_batches or batches < max_batches:
+            if not (moved := RideEvent.objects.archive(before, batch_size)):
+                break
+            archived += moved
+            batches += 1
+            self.stdout.write(f'Archived {archived} events')
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {archived} events created before {before.isoformat()} archived.'))
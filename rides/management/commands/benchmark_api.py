@@ -0,0 +1,369 @@
+import asyncio
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from itertools import product
+from pathlib import Path
+from urllib.parse import urlencode
+
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rides.management.seeding import SeededDatabaseMixin
+from rides.models import Ride, RideEvent, Roles, User
+
+RIDES_URL = '/rides/'
+ASYNC_RIDES_URL = '/async/rides/'
+
+# Query params of the scenarios, combined with every page size and pagination mode
+FILTERS: dict[str, dict] = {
+    'all': {},
+    'status': {'status': 'pickup'},
+    'rider_email': {'rider_email': 'user1'},
+    'pickup_time': {'ordering': 'pickup_time'},
+    'pickup_time_desc': {'ordering': '-pickup_time'},
+    'distance': {'ordering': 'distance', 'lat': 37.72, 'lon': -122.38},
+    'distance_radius': {'ordering': 'distance', 'lat': 37.72, 'lon': -122.38, 'radius_km': 2},
+    'status_distance': {'status': 'dropoff', 'ordering': 'distance', 'lat': 37.72, 'lon': -122.38},
+}
+PAGE_SIZES = [50, 500]
+PAGINATION_MODES = ['page', 'cursor']
+
+# Query params of the throughput scenarios
+THROUGHPUT_QUERY = {'page_size': 50, 'ordering': 'pickup_time'}
+
+# Compared against the baseline with the tolerance, query counts and statuses must match exactly
+TOLERATED_METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'peak_memory_kib']
+# Same, but a decrease is a regression
+TOLERATED_MINIMUM_METRICS = ['requests_per_s']
+
+
+def percentile(samples: list[float], percent: int) -> float:
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1]
+
+
+class QueryCounter:
+    # CaptureQueriesContext can't be used: the queries log is reset when each request starts
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class DatabaseLatency:
+    """Execute wrapper sleeping before every query, emulates the round trip to a remote database."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        # Also connected to connection_created: the async ORM queries from other threads, with their own connections
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Command(SeededDatabaseMixin, BaseCommand):
+    help = (
+        'Benchmarks the rides API in-process with the Django test client on a seeded benchmark database: '
+        'p50/p95/p99 latency, SQL query count and peak (Python) memory per scenario, across a matrix of filters, '
+        'orderings, page sizes and pagination modes, plus the requests of an optional traffic file. Results are '
+        'written as JSON and compared to a baseline, any regression makes the command fail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=1000, help='Number of rides seeded (i.e. 1000, 100000).')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated dataset.')
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database (one per --rides) between runs instead of seeding it every time.',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario.')
+        parser.add_argument('--filter', action='append', choices=FILTERS, help='Only run these filters.')
+        parser.add_argument(
+            '--replay',
+            type=Path,
+            help=(
+                'JSONL traffic file to replay, one request per line: {"path": ..., "method": "GET", '
+                '"query": {...}, "body": ..., "name": ...}. Lines without a path are skipped.'
+            ),
+        )
+        parser.add_argument('--cache', action='store_true', help='Leave the response cache enabled.')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help=(
+                'Also compares the throughput of the sync list endpoint served one request at a time (as a sync '
+                'worker does) to the async one served this many requests at a time.'
+            ),
+        )
+        parser.add_argument(
+            '--db-latency-ms',
+            type=float,
+            default=0.0,
+            help='Latency added to every query of the throughput scenarios, to emulate a remote database.',
+        )
+        parser.add_argument('--output', type=Path, help='Writes the results to this JSON file.')
+        parser.add_argument('--baseline', type=Path, help='Compares the results to this JSON file.')
+        parser.add_argument('--update-baseline', action='store_true', help='Writes the results to --baseline.')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed relative increase of latency percentiles and memory over the baseline.',
+        )
+
+    def handle(self, *args, **options):
+        if options['update_baseline'] and not options['baseline']:
+            raise CommandError('--update-baseline requires --baseline.')
+
+        old_name = self.setup_database(options['rides'], options['seed'], options['keepdb'])
+        try:
+            results = self.run(options)
+        finally:
+            self.teardown_database(old_name, options['keepdb'])
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            options['output'].write_text(output)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['update_baseline']:
+            options['baseline'].write_text(output)
+            self.stdout.write(self.style.SUCCESS(f'Baseline updated ({options["baseline"]}).'))
+        elif options['baseline']:
+            self.compare(results, json.loads(options['baseline'].read_text()), options['tolerance'])
+
+    def get_scenarios(self, options) -> list[dict]:
+        scenarios = []
+        for (name, params), page_size, mode in product(FILTERS.items(), PAGE_SIZES, PAGINATION_MODES):
+            if options['filter'] and name not in options['filter']:
+                continue
+            scenarios.append(
+                {
+                    'name': f'{name}:{mode}:{page_size}',
+                    'method': 'GET',
+                    'path': RIDES_URL,
+                    'query': {**params, 'page_size': page_size, 'pagination': mode},
+                }
+            )
+
+        if options['replay']:
+            skipped = 0
+            for number, line in enumerate(options['replay'].read_text().splitlines(), start=1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if not isinstance(entry, dict) or 'path' not in entry:
+                    skipped += 1
+                    continue
+                scenarios.append(
+                    {
+                        'name': entry.get('name') or f'replay:{number}',
+                        'method': entry.get('method', 'GET').upper(),
+                        'path': entry['path'],
+                        'query': entry.get('query') or {},
+                        'body': entry.get('body'),
+                    }
+                )
+            if skipped:
+                self.stderr.write(f'Skipped {skipped} lines of {options["replay"]} without a request path.')
+
+        return scenarios
+
+    def run(self, options) -> dict:
+        setup_test_environment()
+        try:
+            user, _ = User.objects.get_or_create(
+                username='benchmark',
+                defaults={'email': 'benchmark@example.com', 'phone_number': '+10000000000', 'role': Roles.ADMIN},
+            )
+            client = Client()
+            client.force_login(user)
+
+            results = {}
+            with override_settings(RIDES_RESPONSE_CACHE=options['cache']):
+                for scenario in self.get_scenarios(options):
+                    result = self.measure(client, scenario, options['warmup'], options['repeat'])
+                    results[scenario['name']] = result
+                    self.stdout.write(
+                        f'{scenario["name"]:<36} {result["status"]} p50 {result["p50_ms"]:>8.2f}ms '
+                        f'p95 {result["p95_ms"]:>8.2f}ms p99 {result["p99_ms"]:>8.2f}ms '
+                        f'{result["queries"]:>3} queries {result["peak_memory_kib"]:>8} KiB'
+                    )
+
+                if options['concurrency']:
+                    results.update(self.measure_throughput(client, options))
+        finally:
+            teardown_test_environment()
+
+        return {
+            'meta': {
+                'rides': Ride.objects.count(),
+                'events': RideEvent.objects.count(),
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'cache': options['cache'],
+                'db_latency_ms': options['db_latency_ms'],
+                'database': connections[DEFAULT_DB_ALIAS].vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'scenarios': results,
+        }
+
+    def measure(self, client: Client, scenario: dict, warmup: int, repeat: int) -> dict:
+        url = scenario['path']
+        if scenario['query']:
+            url = f'{url}?{urlencode(scenario["query"], doseq=True)}'
+        body = scenario.get('body')
+        data = '' if body is None else json.dumps(body)
+
+        def fetch():
+            response = client.generic(scenario['method'], url, data, content_type='application/json')
+            # Streaming responses are only produced when consumed
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            return response, content
+
+        for _ in range(warmup):
+            fetch()
+
+        # Queries and memory are measured on a separate request, both slow down the requests they observe
+        queries = QueryCounter()
+        tracemalloc.start()
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(queries):
+            response, content = fetch()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'method': scenario['method'],
+            'url': url,
+            'status': response.status_code,
+            'bytes': len(content),
+            'queries': queries.count,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'peak_memory_kib': peak_memory // 1024,
+        }
+
+    def measure_throughput(self, client: Client, options) -> dict:
+        requests = options['repeat'] * options['concurrency']
+        query = f'?{urlencode(THROUGHPUT_QUERY)}'
+        latency = DatabaseLatency(options['db_latency_ms'] / 1000)
+        connection = connections[DEFAULT_DB_ALIAS]
+        latency.install(connection=connection)
+        connection_created.connect(latency.install)
+        try:
+            # A sync (WSGI) worker handles one request at a time
+            timings, statuses = [], set()
+            start = time.perf_counter()
+            for _ in range(requests):
+                request_start = time.perf_counter()
+                statuses.add(client.get(RIDES_URL + query).status_code)
+                timings.append((time.perf_counter() - request_start) * 1000)
+            results = {'throughput:sync': self.get_throughput(RIDES_URL + query, 1, statuses, timings, start)}
+
+            results['throughput:async'] = asyncio.run(
+                self.measure_async_throughput(client, ASYNC_RIDES_URL + query, options['concurrency'], requests)
+            )
+        finally:
+            connection_created.disconnect(latency.install)
+            connection.execute_wrappers.remove(latency)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<36} {result["status"]} {result["requests_per_s"]:>8.1f} req/s '
+                f'(concurrency {result["concurrency"]}) p50 {result["p50_ms"]:>8.2f}ms p95 {result["p95_ms"]:>8.2f}ms'
+            )
+        return results
+
+    async def measure_async_throughput(self, client: Client, url: str, concurrency: int, requests: int) -> dict:
+        timings, statuses = [], set()
+
+        async def worker():
+            # Same session as the (logged in) sync client
+            async_client = AsyncClient()
+            async_client.cookies = client.cookies
+            for _ in range(requests // concurrency):
+                request_start = time.perf_counter()
+                # As ASGIHandler does, so the sync parts of each request (database calls) get their own thread
+                async with ThreadSensitiveContext():
+                    statuses.add((await async_client.get(url)).status_code)
+                    # Each request has its own thread, and connection: close it (or return it to the pool)
+                    await sync_to_async(connections.close_all)()
+                timings.append((time.perf_counter() - request_start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return self.get_throughput(url, concurrency, statuses, timings, start)
+
+    def get_throughput(self, url: str, concurrency: int, statuses: set, timings: list[float], start: float) -> dict:
+        return {
+            'method': 'GET',
+            'url': url,
+            'status': max(statuses),
+            'concurrency': concurrency,
+            'requests_per_s': round(len(timings) / (time.perf_counter() - start), 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+        }
+
+    def compare(self, results: dict, baseline: dict, tolerance: float):
+        if results['meta']['rides'] != baseline['meta']['rides']:
+            raise CommandError(
+                f'The baseline was recorded with {baseline["meta"]["rides"]} rides, '
+                f'not {results["meta"]["rides"]}: run with --rides {baseline["meta"]["rides"]}.'
+            )
+
+        regressions = []
+        for name, expected in baseline['scenarios'].items():
+            actual = results['scenarios'].get(name)
+            if actual is None:
+                continue
+            if actual['status'] != expected['status']:
+                regressions.append(f'{name}: status {expected["status"]} -> {actual["status"]}')
+            if actual.get('queries', 0) > expected.get('queries', 0):
+                regressions.append(f'{name}: queries {expected["queries"]} -> {actual["queries"]}')
+            for metric in TOLERATED_METRICS:
+                if metric in expected and actual[metric] > expected[metric] * (1 + tolerance):
+                    regressions.append(f'{name}: {metric} {expected[metric]} -> {actual[metric]}')
+            for metric in TOLERATED_MINIMUM_METRICS:
+                if metric in expected and actual[metric] < expected[metric] * (1 - tolerance):
+                    regressions.append(f'{name}: {metric} {expected[metric]} -> {actual[metric]}')
+
+        missing = sorted(set(baseline['scenarios']) - set(results['scenarios']))
+        if missing:
+            self.stderr.write(f'Scenarios of the baseline that were not run: {", ".join(missing)}')
+
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} regressions over the baseline (tolerance {tolerance:.0%}):\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regression over the baseline.'))
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.geo import haversine_km
+from rides.locations import LocationStore
+
+# Drivers are spread over a square of this many degrees around the center (about 33km at San Francisco)
+SPREAD_DEGREES = 0.3
+CENTER = (37.76, -122.43)
+# Max age of the positions in the queries, every position of the benchmark is fresh
+MAX_AGE_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the throughput of the in-memory driver location store (rides.locations): location updates per '
+        'second and nearest available drivers query latency, after checking the query results against a brute '
+        'force scan. Runs in memory only, nothing is written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=20000, help='Number of drivers.')
+        parser.add_argument('--updates', type=int, default=200000, help='Number of location updates measured.')
+        parser.add_argument('--queries', type=int, default=10000, help='Number of nearest drivers queries measured.')
+        parser.add_argument('--k', type=int, default=5, help='Number of drivers per query.')
+        parser.add_argument('--radius-km', type=float, default=5.0, help='Radius of the queries.')
+        parser.add_argument('--unavailable', type=float, default=0.3, help='Share of unavailable drivers.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated locations.')
+
+    def handle(self, *args, drivers: int, updates: int, queries: int, k: int, radius_km: float, **options):
+        rng = random.Random(options['seed'])
+        store = LocationStore()
+
+        def random_point() -> tuple[float, float]:
+            return (
+                CENTER[0] + (rng.random() - 0.5) * SPREAD_DEGREES,
+                CENTER[1] + (rng.random() - 0.5) * SPREAD_DEGREES,
+            )
+
+        for id_driver in range(1, drivers + 1):
+            store.update(id_driver, *random_point(), available=rng.random() >= options['unavailable'])
+
+        # Drivers moving a few meters per update, becoming (un)available now and then
+        moves = [
+            (
+                rng.randint(1, drivers),
+                (rng.random() - 0.5) * 0.001,
+                (rng.random() - 0.5) * 0.001,
+                rng.random() >= options['unavailable'],
+            )
+            for _ in range(updates)
+        ]
+        start = time.perf_counter()
+        for id_driver, dlat, dlon, available in moves:
+            position = store.positions[id_driver]
+            store.update(id_driver, position.latitude + dlat, position.longitude + dlon, available)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Updates: {updates / elapsed:,.0f}/s ({elapsed / updates * 1e6:.2f} µs per update)')
+
+        points = [random_point() for _ in range(queries)]
+        self.check_results(store, points[:100], k, radius_km)
+
+        durations = []
+        for latitude, longitude in points:
+            start = time.perf_counter()
+            store.nearest(latitude, longitude, k, radius_km, MAX_AGE_SECONDS)
+            durations.append(time.perf_counter() - start)
+        percentiles = statistics.quantiles(durations, n=100)
+        self.stdout.write(
+            f'Nearest {k} drivers within {radius_km}km: {queries / sum(durations):,.0f} queries/s, '
+            f'p50 {percentiles[49] * 1e6:.0f} µs, p99 {percentiles[98] * 1e6:.0f} µs, max {max(durations) * 1e6:.0f} µs'
+        )
+
+    def check_results(self, store: LocationStore, points: list[tuple[float, float]], k: int, radius_km: float):
+        for latitude, longitude in points:
+            nearest = store.nearest(latitude, longitude, k, radius_km, MAX_AGE_SECONDS)
+            expected = sorted(
+                haversine_km(latitude, longitude, position.latitude, position.longitude)
+                for position in store.positions.values()
+                if position.available
+            )
+            expected = [distance for distance in expected if distance <= radius_km][:k]
+            actual = [distance for distance, _ in nearest]
+            # The store ranks with an equirectangular approximation, drivers at the same meter may be swapped
+            if len(actual) != len(expected) or any(abs(a - b) > 0.001 for a, b in zip(actual, expected)):
+                raise CommandError(f'Nearest drivers of {latitude}, {longitude} at {actual}km instead of {expected}km')
+        self.stdout.write(self.style.SUCCESS(f'Results match a brute force scan ({len(points)} queries).'))
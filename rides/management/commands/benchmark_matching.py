@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.geo import haversine_km
+from rides.matching import match
+
+# Rides and drivers are spread over a square of this many degrees around the center (about 33km at San Francisco)
+SPREAD_DEGREES = 0.3
+CENTER = (37.76, -122.43)
+# Size of the problem checked against a brute force greedy
+CHECKED_RIDES, CHECKED_DRIVERS = 400, 250
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the batch ride to driver matching engine (rides.matching) on generated rides and drivers, after '
+        'checking its results against a brute force greedy over every pair. Runs in memory only, nothing is written '
+        'to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=10000, help='Number of rides without driver.')
+        parser.add_argument('--drivers', type=int, default=5000, help='Number of available drivers.')
+        parser.add_argument('--max-distance-km', type=float, default=10.0, help='Max distance to a pickup.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of measured runs.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated locations.')
+
+    def handle(self, *args, rides: int, drivers: int, max_distance_km: float, repeat: int, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        def random_points(count: int) -> np.ndarray:
+            return np.column_stack(
+                (
+                    CENTER[0] + (rng.random(count) - 0.5) * SPREAD_DEGREES,
+                    CENTER[1] + (rng.random(count) - 0.5) * SPREAD_DEGREES,
+                )
+            )
+
+        # Short range, so some rides are left without driver
+        self.check_results(random_points(CHECKED_RIDES), random_points(CHECKED_DRIVERS), max_distance_km / 5)
+
+        ride_points, driver_points = random_points(rides), random_points(drivers)
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = match(ride_points, driver_points, max_distance_km)
+            durations.append(time.perf_counter() - start)
+        average = sum(distance for _, _, distance in matches) / len(matches) if matches else 0
+        self.stdout.write(
+            f'{rides} rides x {drivers} drivers: {len(matches)} matches (average distance {average:.2f}km), '
+            f'best {min(durations):.2f}s, worst {max(durations):.2f}s'
+        )
+
+    def check_results(self, rides: np.ndarray, drivers: np.ndarray, max_distance_km: float):
+        pairs = sorted(
+            (haversine_km(*ride, *driver), ride_index, driver_index)
+            for ride_index, ride in enumerate(rides.tolist())
+            for driver_index, driver in enumerate(drivers.tolist())
+        )
+        matched_rides, matched_drivers, expected = set(), set(), set()
+        for distance, ride, driver in pairs:
+            if distance > max_distance_km:
+                break
+            if ride not in matched_rides and driver not in matched_drivers:
+                matched_rides.add(ride)
+                matched_drivers.add(driver)
+                expected.add((ride, driver))
+
+        # A single candidate per ride at first, so the check goes through several rounds
+        actual = {(ride, driver) for ride, driver, _ in match(rides, drivers, max_distance_km, candidates=1)}
+        if actual != expected:
+            raise CommandError(f'{len(actual ^ expected)} matches differ from a brute force greedy.')
+        self.stdout.write(self.style.SUCCESS(f'Matches of a brute force greedy found ({len(expected)} matches).'))
@@ -0,0 +1,57 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from rides.api.renderers import ORJSONRenderer
+from rides.api.ride import RideViewSet, get_todays_events_queryset
+from rides.models import Ride
+from rides.serializers.ride import RideSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that the fast serialization path of the rides API outputs the same JSON as RideSerializer, '
+        'then measures the throughput (rows/s) of both, queries included.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Number of rides serialized per run.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of runs per serializer.')
+
+    def handle(self, *args, rows: int, repeat: int, **options):
+        queryset = Ride.objects.select_related('id_rider', 'id_driver').order_by('pickup_time', 'id_ride')
+        viewset = RideViewSet(request=Request(APIRequestFactory().get('/rides/')))
+
+        def serialize_drf() -> bytes:
+            rides = queryset.prefetch_related(Prefetch('events', get_todays_events_queryset()))[:rows]
+            return JSONRenderer().render(RideSerializer(rides, many=True).data)
+
+        def serialize_fast() -> bytes:
+            ride_rows = list(RideViewSet.fast_serializer.values(queryset)[:rows])
+            return ORJSONRenderer().render(viewset.serialize_rows(ride_rows))
+
+        expected, actual = json.loads(serialize_drf()), json.loads(serialize_fast())
+        if expected != actual:
+            mismatch = next((index for index, (a, b) in enumerate(zip(expected, actual)) if a != b), None)
+            raise CommandError(
+                f'Fast serialization differs from RideSerializer (first mismatch at row {mismatch}): '
+                f'{expected[mismatch] if mismatch is not None else len(expected)} != '
+                f'{actual[mismatch] if mismatch is not None else len(actual)}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Outputs are equivalent ({len(expected)} rides).'))
+
+        results = {}
+        for name, serialize in [('RideSerializer', serialize_drf), ('FastSerializer', serialize_fast)]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                serialize()
+            elapsed = time.perf_counter() - start
+            results[name] = len(expected) * repeat / elapsed
+            self.stdout.write(f'{name}: {results[name]:,.0f} rows/s ({elapsed / repeat * 1000:.1f} ms per run)')
+
+        self.stdout.write(f'Speedup: {results["FastSerializer"] / results["RideSerializer"]:.1f}x')
@@ -0,0 +1,285 @@
+import json
+import re
+from dataclasses import dataclass, field
+from itertools import combinations, product
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rides.management.seeding import SeededDatabaseMixin
+from rides.models import Ride, Roles, User
+from rides.search import EmailMatch, get_email_match
+
+RIDES_URL = '/rides/'
+PAGE_SIZE = 20
+
+# Tables that must never be read in full
+LARGE_TABLES = frozenset({'rides_ride', 'rides_rideevent', 'rides_user', 'rides_useremailtrigram'})
+
+# Filters matching several ranges of an index, which can't be read in pickup time order: the rides read from the
+# index led by the filtered column may be sorted
+RANGE_FILTER_COLUMNS = {'status': 'status', 'rider_email': 'id_rider_id', 'radius_km': 'pickup_cell'}
+
+# i.e. "SEARCH rides_ride USING INDEX rides_ride_status_pickup_idx (status=?)"
+SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\S+)')
+
+# Queries of a (non empty) list request: session, user, validators (max updated_at and count, reused by the page
+# pagination, none in cursor mode), rides, their events
+EXPECTED_QUERIES = {'page': 5, 'cursor': 4}
+
+ORDERINGS = [None, 'pickup_time', '-pickup_time', 'distance']
+PAGINATION_MODES = ['page', 'cursor']
+SERIALIZATIONS = {'fast': True, 'serializer': False}
+DISTANCE_ORIGIN = {'lat': 37.72, 'lon': -122.38}
+
+
+@dataclass
+class Scenario:
+    name: str
+    query: dict
+    # Plans allowed to read these tables in full / to sort the rides (instead of reading them in index order), either
+    # read from any index or from these ones
+    scannable_tables: set[str] = field(default_factory=set)
+    sorted_rides: bool = False
+    sorted_rides_indexes: set[str] = field(default_factory=set)
+    serialization: str = 'fast'
+    problems: list[str] = field(default_factory=list)
+
+
+class Command(SeededDatabaseMixin, BaseCommand):
+    help = (
+        'Checks the query plans of every filter, ordering and pagination combination of the rides list endpoint on '
+        'a seeded database: no large table may be read in full and rides ordered by pickup time must be read in '
+        'index order (no sort), unless the combination needs it. The number of queries per request is fixed, to '
+        'catch N+1 regressions. Plans are checked with EXPLAIN QUERY PLAN on SQLite and EXPLAIN on PostgreSQL, where '
+        'sequential scans and sorts are disabled so the check does not depend on the size of the dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=2000, help='Number of rides seeded.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated dataset.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded database between runs.')
+        parser.add_argument('--show-plans', action='store_true', help='Prints the plan of every query.')
+
+    def handle(self, *args, **options):
+        old_name = self.setup_database(options['rides'], options['seed'], options['keepdb'])
+        setup_test_environment()
+        try:
+            scenarios = self.run(options['show_plans'])
+        finally:
+            teardown_test_environment()
+            self.teardown_database(old_name, options['keepdb'])
+
+        failed = [scenario for scenario in scenarios if scenario.problems]
+        for scenario in failed:
+            self.stderr.write(f'{scenario.name}: {RIDES_URL}?{urlencode(scenario.query, doseq=True)}')
+            for problem in scenario.problems:
+                self.stderr.write(f'  {problem}')
+        if failed:
+            raise CommandError(f'{len(failed)} of {len(scenarios)} combinations have query plan problems.')
+        self.stdout.write(self.style.SUCCESS(f'{len(scenarios)} combinations checked, no problem found.'))
+
+    def get_filters(self) -> dict[str, list[dict]]:
+        """Values of every RideFilter field, the first one is used in combinations with the other fields."""
+        driver_id = Ride.objects.filter(id_driver__isnull=False).values_list('id_driver', flat=True).first()
+        rider = User.objects.filter(role=Roles.RIDER).order_by('pk').first()
+        first_pickup = Ride.objects.order_by('pickup_time').values_list('pickup_time', flat=True).first()
+        return {
+            'status': [{'status': 'pickup'}, {'status': ['pickup', 'dropoff']}],
+            'rider_email': [
+                {'rider_email': rider.email},
+                {'rider_email': f'{rider.email[:5]}*'},
+                {'rider_email': rider.email[1:6]},
+            ],
+            'driver_id': [{'driver_id': driver_id}],
+            'pickup_time': [
+                {'pickup_time_after': first_pickup.isoformat()},
+                {'pickup_time_before': first_pickup.isoformat()},
+            ],
+            'radius_km': [{**DISTANCE_ORIGIN, 'radius_km': 2}],
+        }
+
+    def get_range_indexes(self) -> dict[str, set[str]]:
+        """Names of the rides indexes led by the column of each RANGE_FILTER_COLUMNS filter."""
+        connection = connections[DEFAULT_DB_ALIAS]
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Ride._meta.db_table)
+        return {
+            key: {
+                name
+                for name, constraint in constraints.items()
+                if constraint['index'] and constraint['columns'][:1] == [column]
+            }
+            for key, column in RANGE_FILTER_COLUMNS.items()
+        }
+
+    def get_scenarios(self) -> list[Scenario]:
+        filters = self.get_filters()
+        range_indexes = self.get_range_indexes()
+        # Every combination of fields (with their first value), then the other values of each field alone
+        filter_sets = [
+            [values[0] for values in subset]
+            for size in range(len(filters) + 1)
+            for subset in combinations(filters.values(), size)
+        ]
+        filter_sets += [[value] for values in filters.values() for value in values[1:]]
+
+        scenarios = []
+        for filter_set, ordering, mode, serialization in product(
+            filter_sets, ORDERINGS, PAGINATION_MODES, SERIALIZATIONS
+        ):
+            query = {key: value for params in filter_set for key, value in params.items()}
+            if ordering:
+                query['ordering'] = ordering
+            if ordering == 'distance':
+                query.update(DISTANCE_ORIGIN)
+            query.update({'page_size': PAGE_SIZE, 'pagination': mode})
+            name = '+'.join(sorted(key for key in query if key not in ('page_size', 'pagination', 'lat', 'lon')))
+            scenarios.append(
+                Scenario(
+                    name=f'{name or "all"}:{mode}:{serialization}',
+                    query=query,
+                    scannable_tables=self.get_scannable_tables(query),
+                    sorted_rides=self.needs_sort(query),
+                    sorted_rides_indexes={
+                        name
+                        for key, names in range_indexes.items()
+                        if self.is_range_filter(query, key)
+                        for name in names
+                    },
+                    serialization=serialization,
+                )
+            )
+        return scenarios
+
+    def get_scannable_tables(self, query: dict) -> set[str]:
+        connection = connections[DEFAULT_DB_ALIAS]
+        tables = set()
+        if query.get('ordering') == 'distance' and 'radius_km' not in query:
+            # The distance to every ride is computed
+            tables.add('rides_ride')
+        filters = {key for key in query if key not in ('ordering', 'page_size', 'pagination', 'lat', 'lon')}
+        if not filters:
+            # Counting (page pagination) or reading all the rides
+            tables.add('rides_ride')
+        elif filters == {'status'} and self.is_range_filter(query, 'status') and connection.vendor == 'sqlite':
+            # Reading most of the rides, SQLite rather scans them
+            tables.add('rides_ride')
+        if 'rider_email' in query:
+            match, value = get_email_match(query['rider_email'])
+            if match == EmailMatch.SUBSTRING and not self.has_trigram_index(value):
+                tables.add('rides_user')
+        return tables
+
+    def has_trigram_index(self, value: str) -> bool:
+        if len(value) < 3:
+            return False
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'postgresql':
+            return True
+        # pg_trgm is optional, see migration 0008_user_email_search
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'rides_user_email_lower_trgm_idx'")
+            return cursor.fetchone() is not None
+
+    def is_range_filter(self, query: dict, key: str) -> bool:
+        # Several statuses, riders matching the email or grid cells around the origin
+        return key in query and (key != 'status' or isinstance(query['status'], list))
+
+    def needs_sort(self, query: dict) -> bool:
+        # Rides are read in (filter, pickup_time) index order, unless they come from several index ranges (see
+        # is_range_filter, checked by the indexes of the plan)
+        ordering = query.get('ordering') or ('pickup_time' if query['pagination'] == 'cursor' else None)
+        return ordering not in ('pickup_time', '-pickup_time')
+
+    def run(self, show_plans: bool = False) -> list[Scenario]:
+        """Checks every scenario on the current (seeded) database, in a test environment. Returns the scenarios."""
+        user, _ = User.objects.get_or_create(
+            username='benchmark',
+            defaults={'email': 'benchmark@example.com', 'phone_number': '+10000000000', 'role': Roles.ADMIN},
+        )
+        client = Client()
+        client.force_login(user)
+
+        scenarios = self.get_scenarios()
+        for scenario in scenarios:
+            with override_settings(
+                RIDES_RESPONSE_CACHE=False, RIDES_FAST_SERIALIZATION=SERIALIZATIONS[scenario.serialization]
+            ):
+                self.check_scenario(client, scenario, show_plans)
+        return scenarios
+
+    def check_scenario(self, client: Client, scenario: Scenario, show_plans: bool):
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        with connection.execute_wrapper(capture):
+            response = client.get(RIDES_URL, scenario.query)
+        if response.status_code != 200:
+            scenario.problems.append(f'status {response.status_code}: {response.content[:200]!r}')
+            return
+
+        expected_queries = EXPECTED_QUERIES[scenario.query['pagination']]
+        if not response.json()['results']:
+            # No events to fetch, nor rides when the count is already 0
+            expected_queries -= 2 if scenario.query['pagination'] == 'page' else 1
+        if len(queries) != expected_queries:
+            scenario.problems.append(f'{len(queries)} queries instead of {expected_queries}')
+
+        for sql, params in queries:
+            plan = self.explain(connection, sql, params)
+            if show_plans:
+                self.stdout.write(f'{scenario.name}: {sql}\n  ' + '\n  '.join(plan))
+            scans, sorts, indexes = self.get_scans_and_sorts(connection, plan)
+            for table in sorted(scans - scenario.scannable_tables):
+                scenario.problems.append(f'full scan of {table}: {sql}')
+            sorted_rides = sorts and 'FROM "rides_ride"' in sql and ' ORDER BY ' in sql
+            if sorted_rides and not scenario.sorted_rides and not indexes & scenario.sorted_rides_indexes:
+                scenario.problems.append(f'rides sorted instead of read in index order: {sql}')
+
+    def explain(self, connection, sql: str, params) -> list[str]:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+                cursor.execute('SET enable_sort = off')
+                try:
+                    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                    return [json.dumps(cursor.fetchone()[0][0]['Plan'])]
+                finally:
+                    cursor.execute('RESET enable_seqscan')
+                    cursor.execute('RESET enable_sort')
+
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def get_scans_and_sorts(self, connection, plan: list[str]) -> tuple[set[str], bool, set[str]]:
+        """Returns the large tables read in full, whether rows are sorted and the indexes read."""
+        scans, sorts, indexes = set(), False, set()
+        if connection.vendor == 'postgresql':
+            nodes = [json.loads(plan[0])]
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in LARGE_TABLES:
+                    scans.add(node['Relation Name'])
+                sorts |= node['Node Type'] in ('Sort', 'Incremental Sort')
+                if 'Index Name' in node:
+                    indexes.add(node['Index Name'])
+                nodes.extend(node.get('Plans', []))
+            return scans, sorts, indexes
+
+        for detail in plan:
+            # i.e. "SCAN rides_ride", unlike "SCAN rides_ride USING INDEX ..." (reads the rows in index order)
+            words = detail.split()
+            if words[0] == 'SCAN' and len(words) == 2 and words[1] in LARGE_TABLES:
+                scans.add(words[1])
+            sorts |= detail.startswith('USE TEMP B-TREE FOR ORDER BY')
+            if match := SQLITE_INDEX.search(detail):
+                indexes.add(match[1])
+        return scans, sorts, indexes
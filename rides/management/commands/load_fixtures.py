@@ -0,0 +1,145 @@
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+import orjson
+from django.apps import apps
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import QuerySet
+
+from rides.models import User
+from rides.search import index_emails
+
+# Models are loaded in this order when loading in parallel (one pass per model)
+MODEL_ORDER = ['rides.user', 'rides.ride', 'rides.rideevent']
+
+
+def read_objects(path: str) -> Iterator[dict]:
+    """Yields the objects of a fixture written one object per line (JSON array or NDJSON)."""
+    with open(path, 'rb') as file:
+        for number, line in enumerate(file, start=1):
+            line = line.strip().rstrip(b',')
+            if line in (b'', b'[', b']'):
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                raise CommandError(
+                    f'{path}:{number} is not a fixture object. Only fixtures with one object per line (as written '
+                    f'by scripts/generate_fixtures.py) can be bulk loaded, use loaddata for other files.'
+                )
+
+
+def chunked(objects: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    while chunk := list(islice(objects, size)):
+        yield chunk
+
+
+def bulk_create(model, objs: list, using: str) -> None:
+    """
+    bulk_create() runs the pre_save() of auto_now/auto_now_add fields, which replaces their values by the current
+    time: the timestamps of the fixture are written back by a bulk_update() (which doesn't), missing ones keep the
+    current time.
+    """
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    timestamps = {field: [getattr(obj, field.attname) for obj in objs] for field in fields}
+    # Ride.objects.bulk_create() computes the grid cells
+    model._default_manager.db_manager(using).bulk_create(objs)
+
+    fields = [field for field in fields if any(value is not None for value in timestamps[field])]
+    for field in fields:
+        for obj, value in zip(objs, timestamps[field]):
+            if value is not None:
+                setattr(obj, field.attname, value)
+    if fields:
+        # The plain QuerySet: Ride.objects.bulk_update() sets updated_at itself
+        QuerySet(model, using=using).bulk_update(objs, [field.name for field in fields], batch_size=1000)
+
+
+def save_chunk(objects: list[dict], using: str) -> Counter:
+    instances = defaultdict(list)
+    for deserialized in serializers.deserialize('python', objects, using=using):
+        instances[type(deserialized.object)].append(deserialized.object)
+
+    # Referenced rows come first in the file, foreign keys are also deferred until commit on SQLite and PostgreSQL
+    with transaction.atomic(using=using):
+        for model, objs in instances.items():
+            bulk_create(model, objs, using)
+            if model is User:
+                # bulk_create() skips the post_save receiver indexing the emails
+                index_emails(objs, using)
+
+    return Counter({model._meta.label_lower: len(objs) for model, objs in instances.items()})
+
+
+def load_worker(path: str, label: str, worker: int, workers: int, chunk_size: int, using: str) -> Counter:
+    # Every worker streams the whole file and only saves its share of the chunks of `label` objects
+    django.setup()
+    objects = (obj for obj in read_objects(path) if obj['model'] == label)
+    loaded = Counter()
+    for index, chunk in enumerate(chunked(objects, chunk_size)):
+        if index % workers == worker:
+            loaded += save_chunk(chunk, using)
+    connections.close_all()
+    return loaded
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk loads a fixture written one object per line by scripts/generate_fixtures.py, in chunks with '
+        'bulk_create() instead of saving objects one by one like loaddata. Memory does not grow with the file size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fixture file (JSON array or NDJSON, one object per line).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Number of objects inserted per transaction.')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Number of worker processes. Each model is loaded in its own pass, split between the workers. '
+                'Only useful with databases allowing concurrent writers (i.e. not SQLite).'
+            ),
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, path: str, chunk_size: int, workers: int, database: str, **options):
+        loaded = Counter()
+        if workers > 1:
+            # Forked workers must not share the connection of the parent
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for label in MODEL_ORDER:
+                    futures = [
+                        executor.submit(load_worker, path, label, worker, workers, chunk_size, database)
+                        for worker in range(workers)
+                    ]
+                    for future in futures:
+                        loaded += future.result()
+                    self.stdout.write(f'Loaded {loaded[label]} {label} objects')
+        else:
+            for chunk in chunked(read_objects(path), chunk_size):
+                loaded += save_chunk(chunk, database)
+                self.stdout.write(f'Loaded {loaded.total()} objects')
+
+        # Objects are inserted with their pk, move the sequences past them (as loaddata does)
+        connection = connections[database]
+        models = [apps.get_model(label) for label in loaded]
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        summary = ', '.join(f'{count} {label}' for label, count in sorted(loaded.items()))
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded.total()} objects ({summary or "none"}).'))
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rides.matching import assign_drivers, load_drivers, load_rides, match
+
+
+class Command(BaseCommand):
+    help = (
+        'Assigns drivers to the en-route rides without driver, in one batch: the closest ride/driver pairs first, '
+        'among the drivers reported available (POST /drivers/locations/) and without en-route or pickup ride. Rides '
+        'without available driver within --max-distance-km are left unassigned.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-distance-km', type=float, default=10.0, help='Max distance between a driver and a pickup.'
+        )
+        parser.add_argument(
+            '--candidates', type=int, default=8, help='Closest drivers of each ride sorted by the first round.'
+        )
+        parser.add_argument(
+            '--max-age-seconds',
+            type=float,
+            default=settings.RIDES_DRIVER_LOCATION_MAX_AGE_SECONDS,
+            help='Skip drivers whose location is older (default: RIDES_DRIVER_LOCATION_MAX_AGE_SECONDS).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report the matches, nothing is written.')
+
+    def handle(self, *args, max_distance_km: float, candidates: int, max_age_seconds: float, **options):
+        start = time.perf_counter()
+        ride_ids, rides = load_rides()
+        driver_ids, drivers = load_drivers(max_age_seconds)
+        self.stdout.write(
+            f'Loaded {len(ride_ids)} rides without driver and {len(driver_ids)} available drivers '
+            f'in {time.perf_counter() - start:.2f}s'
+        )
+
+        start = time.perf_counter()
+        matches = match(rides, drivers, max_distance_km, candidates)
+        average = sum(distance for _, _, distance in matches) / len(matches) if matches else 0
+        self.stdout.write(
+            f'Matched {len(matches)} rides in {time.perf_counter() - start:.2f}s (average distance {average:.2f}km)'
+        )
+        if options['dry_run'] or not matches:
+            return
+
+        start = time.perf_counter()
+        assigned = assign_drivers({ride_ids[ride]: driver_ids[driver] for ride, driver, _ in matches})
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Done, {assigned} rides assigned in {time.perf_counter() - start:.2f}s '
+                f'({len(matches) - assigned} assigned or changed meanwhile).'
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from rides.models import Ride, RideSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the lifecycle summary of every ride from its events, in chunks of rides.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rides rebuilt per transaction.')
+
+    def handle(self, *args, chunk_size: int, **options):
+        rides = Ride.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk, rebuilt = 0, 0
+
+        while ride_ids := list(rides.filter(pk__gt=last_pk)[:chunk_size]):
+            RideSummary.objects.rebuild(ride_ids)
+            last_pk = ride_ids[-1]
+            rebuilt += len(ride_ids)
+            self.stdout.write(f'Rebuilt summaries of {rebuilt} rides (up to id_ride {last_pk})')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {RideSummary.objects.count()} rides have a summary.'))
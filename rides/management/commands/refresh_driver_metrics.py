@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from rides.reports import refresh_driver_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Refreshes the monthly driver metrics rollup (trips and trips longer than one hour per driver per month). '
+        'Only the months of rides that changed since the last refresh are reprocessed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reprocess every month, e.g. after rides were deleted or summaries were rebuilt.',
+        )
+
+    def handle(self, *args, full: bool, **options):
+        months = refresh_driver_metrics(full=full)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {len(months)} month(s).'))
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rides.models import Ride
+
+GENERATOR_PATH = Path(settings.BASE_DIR) / 'scripts' / 'generate_fixtures.py'
+
+
+class SeededDatabaseMixin:
+    """Runs a management command on a test database seeded with generated fixtures (one database per size)."""
+
+    def setup_database(self, rides: int, seed: int, keepdb: bool) -> str:
+        """Switches the default connection to the seeded database, returns the name to pass to `teardown_database`."""
+        connection = connections[DEFAULT_DB_ALIAS]
+        old_name = connection.settings_dict['NAME']
+        # One database per size, so kept databases of different sizes can coexist
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = str(Path(tempfile.gettempdir()) / f'ridez_benchmark_{rides}.sqlite3')
+        else:
+            test_settings['NAME'] = f'{connection.settings_dict["NAME"]}_benchmark_{rides}'
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+
+        try:
+            if Ride.objects.count() != rides:
+                self.seed(rides, seed)
+        except BaseException:
+            self.teardown_database(old_name, keepdb)
+            raise
+        return old_name
+
+    def teardown_database(self, old_name: str, keepdb: bool):
+        # Pooled connections (DATABASE_POOL) would keep the seeded database busy
+        for pooled_connection in connections.all():
+            if getattr(pooled_connection, 'pool', None) is not None:
+                pooled_connection.close_pool()
+        connections[DEFAULT_DB_ALIAS].creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+    def seed(self, rides: int, seed: int):
+        self.stdout.write(f'Seeding {rides} rides...')
+        call_command('flush', interactive=False, verbosity=0)
+        seed_database(rides, seed)
+
+
+def seed_database(rides: int, seed: int = 0) -> None:
+    """Loads generated fixtures of `rides` rides into the default database, then updates its planner statistics."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'fixtures.ndjson'
+        # Same skewed event distribution as the default fixtures, users scale with the number of rides
+        command = [
+            sys.executable,
+            str(GENERATOR_PATH),
+            f'--out={path}',
+            '--format=ndjson',
+            f'--seed={seed}',
+            f'--rides={rides}',
+            f'--riders={max(100, rides // 10)}',
+            f'--drivers={max(40, rides // 25)}',
+        ]
+        subprocess.run(command, check=True, capture_output=True)
+        call_command('load_fixtures', str(path), stdout=StringIO())
+
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('ANALYZE')
@@ -0,0 +1,211 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from rides.geo import EARTH_RADIUS_KM
+from rides.locations import store
+from rides.models import DriverLocation, Ride, RideStatus, Roles
+
+# Cells of a matrix chunk (rides x drivers), bounds the memory of a chunk to a couple of these float64 arrays
+MAX_MATRIX_CELLS: int = 2**21
+# Statuses of the rides keeping their driver busy
+ACTIVE_STATUSES = (RideStatus.ENROUTE, RideStatus.PICKUP)
+# Rides (and drivers) locked per query when writing the assignments, below the query parameters limit of SQLite
+LOCK_BATCH_SIZE = 500
+
+
+@dataclass
+class Candidates:
+    """(ride, driver, distance) pairs of a round, `truncated` rides may have closer pairs than their last candidate."""
+
+    rides: np.ndarray
+    drivers: np.ndarray
+    distances: np.ndarray
+    truncated: np.ndarray
+
+
+def unit_vectors(coordinates: np.ndarray) -> np.ndarray:
+    """Points of the unit sphere of (latitude, longitude) radians, their dot product is the cosine of their angle."""
+    latitudes, longitudes = coordinates[:, 0], coordinates[:, 1]
+    return np.column_stack(
+        (np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes), np.sin(latitudes))
+    )
+
+
+def haversine(latitudes: np.ndarray, longitudes: np.ndarray, latitudes2: np.ndarray, longitudes2: np.ndarray):
+    """Element-wise great-circle distances (km) of radians coordinates, same formula as rides.geo.haversine_km."""
+    a = (
+        np.sin((latitudes2 - latitudes) / 2) ** 2
+        + np.cos(latitudes) * np.cos(latitudes2) * np.sin((longitudes2 - longitudes) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def find_candidates(
+    rides: np.ndarray, drivers: np.ndarray, count: int, max_distance_km: float, max_cells: int
+) -> Candidates:
+    """
+    The `count` closest drivers of every ride within `max_distance_km`, from the (radians) coordinates. Drivers are
+    ranked by the cosine of their angle with the ride, a matrix product computed in chunks of rides, only the
+    distances of the candidates are computed.
+    """
+    count = min(count, len(drivers))
+    chunk_size = max(max_cells // len(drivers), 1)
+    ride_vectors, driver_vectors = unit_vectors(rides), unit_vectors(drivers).T
+    pair_rides, pair_drivers, pair_distances, truncated = [], [], [], []
+    for start in range(0, len(rides), chunk_size):
+        cosines = ride_vectors[start : start + chunk_size] @ driver_vectors
+        if count < len(drivers):
+            closest = np.argpartition(cosines, len(drivers) - count, axis=1)[:, -count:]
+        else:
+            closest = np.broadcast_to(np.arange(len(drivers)), cosines.shape)
+
+        chunk_rides = np.arange(start, start + len(cosines))[:, np.newaxis]
+        distances = haversine(rides[chunk_rides, 0], rides[chunk_rides, 1], drivers[closest, 0], drivers[closest, 1])
+        within = distances <= max_distance_km
+        pair_rides.append(np.broadcast_to(chunk_rides, closest.shape)[within])
+        pair_drivers.append(closest[within])
+        pair_distances.append(distances[within])
+        # Rides with a candidate out of range already have all their drivers in range
+        truncated.append(within.all(axis=1) & (count < len(drivers)))
+
+    return Candidates(
+        rides=np.concatenate(pair_rides),
+        drivers=np.concatenate(pair_drivers),
+        distances=np.concatenate(pair_distances),
+        truncated=np.concatenate(truncated),
+    )
+
+
+def match(
+    rides: np.ndarray,
+    drivers: np.ndarray,
+    max_distance_km: float,
+    candidates: int = 8,
+    max_cells: int = MAX_MATRIX_CELLS,
+) -> list[tuple[int, int, float]]:
+    """
+    Greedy assignment of drivers to rides, closest pair first, from their (latitude, longitude) arrays in degrees.
+    Returns (ride index, driver index, distance in km) matches, a driver gets one ride at most.
+
+    Only the `candidates` closest drivers of each ride are sorted. A round stops when a ride has lost all its
+    candidates to other rides (its next driver is unknown), the next rounds match the rest with twice as many
+    candidates, so the result is the one of a greedy over the whole distance matrix.
+    """
+    ride_coordinates, driver_coordinates = np.radians(rides), np.radians(drivers)
+    ride_indexes, driver_indexes = np.arange(len(rides)), np.arange(len(drivers))
+    matches = []
+    while len(ride_indexes) and len(driver_indexes):
+        found = find_candidates(
+            ride_coordinates[ride_indexes], driver_coordinates[driver_indexes], candidates, max_distance_km, max_cells
+        )
+        order = np.argsort(found.distances, kind='stable')
+        pair_rides, pair_drivers = found.rides[order].tolist(), found.drivers[order].tolist()
+        distances = found.distances[order].tolist()
+        left = np.bincount(found.rides, minlength=len(ride_indexes)).tolist()
+        truncated = found.truncated.tolist()
+
+        matched_rides, matched_drivers = set(), set()
+        stop = None
+        for ride, driver, distance in zip(pair_rides, pair_drivers, distances, strict=True):
+            if stop is not None and distance > stop:
+                break
+            if ride in matched_rides:
+                continue
+            if driver in matched_drivers:
+                left[ride] -= 1
+                if not left[ride] and truncated[ride] and stop is None:
+                    # Pairs past this distance may be beaten by a pair of this ride out of its candidates
+                    stop = distance
+                continue
+            matched_rides.add(ride)
+            matched_drivers.add(driver)
+            matches.append((int(ride_indexes[ride]), int(driver_indexes[driver]), distance))
+
+        if stop is None:
+            # Every pair was processed, the unmatched rides have no driver left in range
+            break
+        remaining = [
+            ride for ride in range(len(ride_indexes)) if ride not in matched_rides and (left[ride] or truncated[ride])
+        ]
+        ride_indexes = ride_indexes[remaining]
+        driver_indexes = np.delete(driver_indexes, list(matched_drivers))
+        candidates *= 2
+
+    return matches
+
+
+def load_rides() -> tuple[list[int], np.ndarray]:
+    """Ids and pickup (latitude, longitude) of the en-route rides without driver."""
+    rows = list(
+        Ride.objects.filter(status=RideStatus.ENROUTE, id_driver__isnull=True).values_list(
+            'id_ride', 'pickup_latitude', 'pickup_longitude'
+        )
+    )
+    return [row[0] for row in rows], np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2)
+
+
+def load_drivers(max_age_seconds: float) -> tuple[list[int], np.ndarray]:
+    """
+    Ids and (latitude, longitude) of the drivers available for a ride: reported available in the last
+    `max_age_seconds` (see rides.locations) and without en-route or pickup ride.
+    """
+    busy = Ride.objects.filter(id_driver=OuterRef('id_driver'), status__in=ACTIVE_STATUSES)
+    rows = list(
+        DriverLocation.objects.filter(
+            ~Exists(busy),
+            available=True,
+            updated_at__gte=timezone.now() - timedelta(seconds=max_age_seconds),
+            id_driver__role=Roles.DRIVER,
+        ).values_list('id_driver', 'latitude', 'longitude')
+    )
+    return [row[0] for row in rows], np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2)
+
+
+def assign_drivers(assignments: dict[int, int]) -> int:
+    """
+    Writes the driver of the rides ({ride id: driver id}) with one bulk update, returns how many were assigned. The
+    assigned drivers are reported unavailable (see rides.locations) until their next location update.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Drivers are locked first (concurrent runs wait on each other), then checked again: they may have been given
+        # a ride or reported unavailable since they were loaded
+        driver_ids = sorted(set(assignments.values()))
+        available = {
+            id_driver
+            for start in range(0, len(driver_ids), LOCK_BATCH_SIZE)
+            for id_driver in DriverLocation.objects.select_for_update()
+            .filter(pk__in=driver_ids[start : start + LOCK_BATCH_SIZE], available=True)
+            .values_list('id_driver', flat=True)
+        }
+        busy = Ride.objects.filter(status__in=ACTIVE_STATUSES).values_list('id_driver', flat=True)
+        for start in range(0, len(driver_ids), LOCK_BATCH_SIZE):
+            available.difference_update(busy.filter(id_driver__in=driver_ids[start : start + LOCK_BATCH_SIZE]))
+
+        # Rides assigned or moved on since they were loaded keep their driver
+        ride_ids = [id_ride for id_ride, id_driver in assignments.items() if id_driver in available]
+        rides = [
+            ride
+            for start in range(0, len(ride_ids), LOCK_BATCH_SIZE)
+            for ride in Ride.objects.select_for_update()
+            .filter(pk__in=ride_ids[start : start + LOCK_BATCH_SIZE], status=RideStatus.ENROUTE, id_driver__isnull=True)
+            .only('id_ride', 'id_driver')
+        ]
+        for ride in rides:
+            ride.id_driver_id = assignments[ride.pk]
+        Ride.objects.bulk_update(rides, ['id_driver'])
+
+        # Loaded by the location stores of the other processes on their next sync
+        assigned = [ride.id_driver_id for ride in rides]
+        for start in range(0, len(assigned), LOCK_BATCH_SIZE):
+            DriverLocation.objects.filter(pk__in=assigned[start : start + LOCK_BATCH_SIZE]).update(
+                available=False, updated_at=now, stored_at=now
+            )
+        transaction.on_commit(partial(store.set_unavailable, assigned))
+    return len(rides)
@@ -0,0 +1,195 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('count', 'counts', 'sum')
+
+    def __init__(self):
+        # One count per bucket plus the +Inf one, not cumulative (summed when rendered)
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class EndpointMetrics:
+    __slots__ = (
+        'latency',
+        'queries',
+        'query_seconds',
+        'render_seconds',
+        'response_bytes',
+        'serialization_seconds',
+        'statuses',
+    )
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses: Counter = Counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """
+    Per process request metrics, keyed by endpoint (resolved view and action, i.e. `RideViewSet.list`).
+    Each process exposes its own metrics, Prometheus sums them across the scraped instances.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: defaultdict[str, EndpointMetrics] = defaultdict(EndpointMetrics)
+
+    def observe(
+        self,
+        endpoint: str,
+        status: int,
+        duration: float,
+        queries: int,
+        query_seconds: float,
+        serialization_seconds: float,
+        render_seconds: float,
+        response_bytes: int,
+    ) -> None:
+        with self.lock:
+            metrics = self.endpoints[endpoint]
+            metrics.latency.observe(duration)
+            metrics.statuses[status] += 1
+            metrics.queries += queries
+            metrics.query_seconds += query_seconds
+            metrics.serialization_seconds += serialization_seconds
+            metrics.render_seconds += render_seconds
+            metrics.response_bytes += response_bytes
+
+    def clear(self) -> None:
+        with self.lock:
+            self.endpoints.clear()
+
+    def render(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = [
+                '# HELP ridez_request_duration_seconds Request latency.',
+                '# TYPE ridez_request_duration_seconds histogram',
+            ]
+            for endpoint, metrics in endpoints:
+                label = f'endpoint="{escape_label(endpoint)}"'
+                cumulative = 0
+                for bound, count in zip([*LATENCY_BUCKETS, '+Inf'], metrics.latency.counts):
+                    cumulative += count
+                    lines.append(f'ridez_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'ridez_request_duration_seconds_sum{{{label}}} {metrics.latency.sum}')
+                lines.append(f'ridez_request_duration_seconds_count{{{label}}} {metrics.latency.count}')
+
+            lines += ['# HELP ridez_requests_total Requests by response status.', '# TYPE ridez_requests_total counter']
+            for endpoint, metrics in endpoints:
+                label = f'endpoint="{escape_label(endpoint)}"'
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'ridez_requests_total{{{label},status="{status}"}} {count}')
+
+            for name, attribute, help_text in [
+                ('ridez_db_queries_total', 'queries', 'SQL queries executed.'),
+                ('ridez_db_query_duration_seconds_total', 'query_seconds', 'Time spent executing SQL queries.'),
+                (
+                    'ridez_serialization_duration_seconds_total',
+                    'serialization_seconds',
+                    'Time spent serializing response data, SQL queries excluded.',
+                ),
+                ('ridez_render_duration_seconds_total', 'render_seconds', 'Time spent rendering responses.'),
+                ('ridez_response_bytes_total', 'response_bytes', 'Size of the (non streaming) response bodies.'),
+            ]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, metrics in endpoints:
+                    lines.append(f'{name}{{endpoint="{escape_label(endpoint)}"}} {getattr(metrics, attribute)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper()` counting the queries of a request and keeping the slowest ones."""
+
+    TOP_QUERIES = 5
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest: list[tuple[float, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.seconds += duration
+            if len(self.slowest) < self.TOP_QUERIES:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+
+# Recorder of the request being handled. Context variables follow the request into the threads running its
+# database calls (sync_to_async), unlike execute_wrapper() whose connections are thread local
+current_query_recorder: ContextVar[QueryRecorder | None] = ContextVar('current_query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection (see `rides.receivers`), recording into the current request."""
+    recorder = current_query_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@contextmanager
+def record_serialization(request) -> Iterator[None]:
+    """
+    Adds the time spent in the block to the serialization time of the request (see MetricsMiddleware), minus the
+    time of its SQL queries: querysets evaluated by serializers are counted as queries.
+    """
+    django_request = getattr(request, '_request', request)
+    recorder = current_query_recorder.get()
+    if recorder is None or not hasattr(django_request, '_metrics_serialization_seconds'):
+        yield
+        return
+
+    query_seconds, start = recorder.seconds, time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (recorder.seconds - query_seconds)
+        django_request._metrics_serialization_seconds += elapsed
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def record_render_time(renderer_context: dict | None, seconds: float) -> None:
+    """Adds the time spent by a renderer to the metrics of the request being rendered."""
+    request = (renderer_context or {}).get('request')
+    django_request = getattr(request, '_request', None)
+    if django_request is not None and hasattr(django_request, '_metrics_render_seconds'):
+        django_request._metrics_render_seconds += seconds
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,159 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from rides.metrics import QueryRecorder, current_query_recorder, registry
+from rides.routers import pin_to_primary
+
+logger = logging.getLogger('rides.middleware')
+PRIMARY_PIN_COOKIE = 'rides_primary_until'
+
+
+def get_endpoint(request) -> str:
+    """Returns the resolved view and action of the request, i.e. `RideViewSet.list`."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    if view_class is None:
+        return match.view_name or match._func_path
+
+    method = request.method.lower()
+    # Viewsets map HTTP methods to actions, other class based views handle them directly
+    action = (getattr(match.func, 'actions', None) or {}).get(method, method)
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count and time, serialization time (see `record_serialization`), rendering time (see
+    `record_render_time`) and response size of every request per endpoint, served by
+    `rides.api.metrics.MetricsView`. Requests slower than RIDES_SLOW_REQUEST_MS log their slowest queries. Supports
+    both sync (WSGI) and async (ASGI) request handling.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder, start = self.start(request)
+        with self.record_queries(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        recorder, start = self.start(request)
+        with self.record_queries(recorder):
+            response = await self.get_response(request)
+        self.finish(request, response, recorder, start)
+        return response
+
+    def start(self, request) -> tuple[QueryRecorder, float]:
+        request._metrics_serialization_seconds = 0.0
+        request._metrics_render_seconds = 0.0
+        return QueryRecorder(), time.perf_counter()
+
+    @contextmanager
+    def record_queries(self, recorder: QueryRecorder):
+        token = current_query_recorder.set(recorder)
+        try:
+            yield
+        finally:
+            current_query_recorder.reset(token)
+
+    def finish(self, request, response, recorder: QueryRecorder, start: float) -> None:
+        duration = time.perf_counter() - start
+        endpoint = get_endpoint(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(
+            endpoint,
+            response.status_code,
+            duration,
+            recorder.count,
+            recorder.seconds,
+            request._metrics_serialization_seconds,
+            request._metrics_render_seconds,
+            size,
+        )
+
+        if duration * 1000 >= settings.RIDES_SLOW_REQUEST_MS:
+            top_queries = ''.join(
+                f'\n  {query_duration * 1000:.1f}ms: {sql}'
+                for query_duration, sql in sorted(recorder.slowest, reverse=True)
+            )
+            logger.warning(
+                'Slow request %s %s (%s): %.0fms, %s queries (%.0fms), slowest queries:%s',
+                request.method,
+                request.get_full_path(),
+                endpoint,
+                duration * 1000,
+                recorder.count,
+                recorder.seconds * 1000,
+                top_queries,
+            )
+
+
+class PrimaryPinMiddleware:
+    """
+    Read-your-writes with read replicas: requests writing (unsafe methods) are pinned to the primary, and so are the
+    following requests of the same client for RIDES_REPLICA_PIN_SECONDS, through a cookie holding the pin expiry.
+    Does nothing without replicas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        with pin_to_primary(self.is_pinned(request)):
+            response = self.get_response(request)
+        self.set_pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        with pin_to_primary(self.is_pinned(request)):
+            response = await self.get_response(request)
+        self.set_pin(request, response)
+        return response
+
+    def is_pinned(self, request) -> bool:
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            return float(request.COOKIES.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def set_pin(self, request, response) -> None:
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        pin_seconds = settings.RIDES_REPLICA_PIN_SECONDS
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE, str(int(time.time() + pin_seconds)), max_age=pin_seconds, httponly=True, samesite='Lax'
+        )
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+from rides.geo import grid_cell
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_grid_cells(apps, schema_editor):
+    Ride = apps.get_model('rides', 'Ride')
+    rides = Ride.objects.using(schema_editor.connection.alias)
+
+    last_pk = 0
+    while chunk := list(rides.filter(pk__gt=last_pk).order_by('pk')[:BACKFILL_CHUNK_SIZE]):
+        for ride in chunk:
+            ride.pickup_cell = grid_cell(ride.pickup_latitude, ride.pickup_longitude)
+            ride.dropoff_cell = grid_cell(ride.dropoff_latitude, ride.dropoff_longitude)
+
+        rides.bulk_update(chunk, ['pickup_cell', 'dropoff_cell'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0002_alter_rideevent_id_ride'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_cell',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_cell',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0003_ride_grid_cells'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rideevent',
+            index=models.Index(fields=['id_ride', 'created_at'], name='rides_event_ride_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0004_rideevent_ride_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideSummary',
+            fields=[
+                (
+                    'id_ride',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='summary',
+                        serialize=False,
+                        to='rides.ride',
+                    ),
+                ),
+                ('pickup_at', models.DateTimeField(db_index=True, null=True)),
+                ('dropoff_at', models.DateTimeField(db_index=True, null=True)),
+                ('duration', models.DurationField(db_index=True, null=True)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('last_event_at', models.DateTimeField(db_index=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0006_driver_monthly_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rideevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
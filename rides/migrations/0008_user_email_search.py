@@ -0,0 +1,105 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:19
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+from rides.search import get_trigrams
+
+BACKFILL_CHUNK_SIZE = 2000
+
+# Prefix (LIKE 'x%') and substring (LIKE '%x%') searches on the lowercased emails, see rides.search
+POSTGRESQL_INDEXES = [
+    (
+        'rides_user_email_lower_like_idx',
+        'CREATE INDEX IF NOT EXISTS rides_user_email_lower_like_idx ON rides_user (LOWER(email) text_pattern_ops)',
+    ),
+    (
+        'rides_user_email_lower_trgm_idx',
+        'CREATE INDEX IF NOT EXISTS rides_user_email_lower_trgm_idx ON rides_user USING gin (LOWER(email) gin_trgm_ops)',
+    ),
+]
+
+
+def create_email_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            has_trigrams = cursor.fetchone() is not None
+        if has_trigrams:
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # Without pg_trgm (a contrib extension some builds don't ship) substring searches scan the users
+        for _, sql in POSTGRESQL_INDEXES[: None if has_trigrams else 1]:
+            schema_editor.execute(sql)
+        return
+
+    # Other databases search the trigram side table instead
+    User = apps.get_model('rides', 'User')
+    UserEmailTrigram = apps.get_model('rides', 'UserEmailTrigram')
+    alias = schema_editor.connection.alias
+    users = User.objects.using(alias).only('email')
+
+    last_pk = 0
+    while chunk := list(users.filter(pk__gt=last_pk).order_by('pk')[:BACKFILL_CHUNK_SIZE]):
+        UserEmailTrigram.objects.using(alias).bulk_create(
+            UserEmailTrigram(id_user_id=user.pk, trigram=trigram)
+            for user in chunk
+            for trigram in get_trigrams(user.email)
+        )
+        last_pk = chunk[-1].pk
+
+
+def drop_email_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, _ in POSTGRESQL_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('rides', '0007_rideevent_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserEmailTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['id_rider', 'pickup_time'], name='rides_ride_rider_pickup_idx'),
+        ),
+        # The composite index above replaces the foreign key one
+        migrations.AlterField(
+            model_name='ride',
+            name='id_rider',
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='rider',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='rides_user_email_lower_idx'),
+        ),
+        migrations.AddField(
+            model_name='useremailtrigram',
+            name='id_user',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name='email_trigrams', to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='useremailtrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'id_user'), name='rides_email_trigram_uniq'),
+        ),
+        migrations.RunPython(create_email_search_indexes, drop_email_search_indexes),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from rides.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0008_user_email_search'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(fields=['pickup_time', 'id_ride'], name='rides_ride_pickup_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(fields=['status', 'pickup_time', 'id_ride'], name='rides_ride_status_pickup_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ride',
+            index=models.Index(fields=['id_driver', 'pickup_time', 'id_ride'], name='rides_ride_driver_pickup_idx'),
+        ),
+        # rides_ride_driver_pickup_idx replaces the foreign key index
+        migrations.AlterField(
+            model_name='ride',
+            name='id_driver',
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='driver',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:26
+
+from django.db import migrations, models, transaction
+
+from rides.operations import AddIndexConcurrently
+
+BACKFILL_CHUNK_SIZE = 10000
+
+# Lowest precedence first, so later updates win for descriptions mentioning several types (see RideEventType)
+CLASSIFIED_EVENT_TYPES = ['en-route', 'dropoff', 'pickup']
+
+
+def backfill_event_types(apps, schema_editor):
+    RideEvent = apps.get_model('rides', 'RideEvent')
+    alias = schema_editor.connection.alias
+    events = RideEvent.objects.using(alias)
+    last_pk = events.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    # Classified in the database, a few UPDATEs per range of primary keys each in its own transaction
+    for start in range(0, last_pk, BACKFILL_CHUNK_SIZE):
+        chunk = events.filter(pk__gt=start, pk__lte=start + BACKFILL_CHUNK_SIZE)
+        with transaction.atomic(using=alias):
+            for event_type in CLASSIFIED_EVENT_TYPES:
+                chunk.filter(description__icontains=event_type).update(event_type=event_type)
+
+
+class Migration(migrations.Migration):
+    # Chunks of the backfill are committed as they go, CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0009_ride_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rideevent',
+            name='event_type',
+            field=models.CharField(
+                choices=[('en-route', 'En-route'), ('pickup', 'Pickup'), ('dropoff', 'Dropoff'), ('other', 'Other')],
+                default='other',
+                max_length=8,
+            ),
+        ),
+        migrations.RunPython(backfill_event_types, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='rideevent',
+            index=models.Index(fields=['event_type', 'created_at'], name='rides_event_type_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='rideevent',
+            index=models.Index(fields=['id_ride', 'event_type'], name='rides_event_ride_type_idx'),
+        ),
+    ]
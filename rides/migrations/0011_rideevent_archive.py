@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+from rides.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0010_rideevent_event_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRideEvent',
+            fields=[
+                ('id_ride_event', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('description', models.CharField(max_length=255)),
+                (
+                    'event_type',
+                    models.CharField(
+                        choices=[
+                            ('en-route', 'En-route'),
+                            ('pickup', 'Pickup'),
+                            ('dropoff', 'Dropoff'),
+                            ('other', 'Other'),
+                        ],
+                        default='other',
+                        max_length=8,
+                    ),
+                ),
+                ('created_at', models.DateTimeField()),
+                ('idempotency_key', models.CharField(blank=True, max_length=64, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedrideevent',
+            name='id_ride',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='archived_events',
+                to='rides.ride',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrideevent',
+            index=models.Index(fields=['id_ride', 'created_at'], name='rides_archive_ride_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='rideevent',
+            index=models.Index(fields=['created_at', 'id_ride_event'], name='rides_event_created_idx'),
+        ),
+    ]
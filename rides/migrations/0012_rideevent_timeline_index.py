@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from rides.operations import AddIndexConcurrently, RemoveFieldIndexConcurrently, RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0011_rideevent_archive'),
+    ]
+
+    operations = [
+        # Built before dropping the index it replaces, so the recent events prefetch always has one
+        AddIndexConcurrently(
+            model_name='rideevent',
+            index=models.Index(fields=['id_ride', 'created_at', 'id_ride_event'], name='rides_event_timeline_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='rideevent',
+            name='rides_event_ride_created_idx',
+        ),
+        # rides_event_timeline_idx replaces the foreign key index, dropped concurrently too
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                RemoveFieldIndexConcurrently(model_name='rideevent', name='id_ride'),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='rideevent',
+                    name='id_ride',
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='events',
+                        to='rides.ride',
+                    ),
+                ),
+            ],
+        ),
+    ]
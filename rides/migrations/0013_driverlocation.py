@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0012_rideevent_timeline_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverLocation',
+            fields=[
+                (
+                    'id_driver',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='location',
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('available', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField()),
+                ('stored_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rides', '0013_driverlocation'),
+    ]
+
+    operations = [
+        # Existing rides get the time of the migration, a constant default (no table rewrite on PostgreSQL)
+        migrations.AddField(
+            model_name='ride',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+from rides.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0014_ride_updated_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='archivedrideevent',
+            index=models.Index(
+                condition=models.Q(('idempotency_key__isnull', False)),
+                fields=['idempotency_key'],
+                name='rides_archive_idempotency_idx',
+            ),
+        ),
+    ]
@@ -1,5 +1,17 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from functools import partial
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from rides.cache import bump_versions
+from rides.geo import grid_cell
+from rides.signals import ride_events_created, rides_updated
 
 PHONE_NUMBER_GLOBAL_MAX_LENGTH = 16  # E.164 standard maximum length + the '+' sign
 
@@ -10,6 +22,27 @@ class RideStatus(models.TextChoices):
     DROPOFF = 'dropoff', 'Dropoff'
 
 
+class RideEventType(models.TextChoices):
+    # Same values as RideStatus
+    ENROUTE = 'en-route', 'En-route'
+    PICKUP = 'pickup', 'Pickup'
+    DROPOFF = 'dropoff', 'Dropoff'
+    OTHER = 'other', 'Other'
+
+    @classmethod
+    def classify(cls, description: str) -> 'RideEventType':
+        """Type of an event from its description, i.e. "Pickup at 5th street" -> pickup."""
+        description = description.lower()
+        for event_type in CLASSIFIED_EVENT_TYPES:
+            if event_type.value in description:
+                return event_type
+        return cls.OTHER
+
+
+# Event types found in descriptions, by precedence (see RideEventType.classify)
+CLASSIFIED_EVENT_TYPES = [RideEventType.PICKUP, RideEventType.DROPOFF, RideEventType.ENROUTE]
+
+
 class Roles(models.TextChoices):
     RIDER = 'rider', 'Rider'
     DRIVER = 'driver', 'Driver'
@@ -23,21 +56,363 @@ class User(AbstractUser):
 
     REQUIRED_FIELDS = ['email', 'phone_number', 'role']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Exact (and on SQLite prefix) email searches, see rides.search
+            models.Index(Lower('email'), name='rides_user_email_lower_idx'),
+        ]
+
+
+class UserEmailTrigram(models.Model):
+    """Trigrams of the lowercased user emails, serving substring searches where pg_trgm isn't available."""
+
+    id_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='email_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'id_user'], name='rides_email_trigram_uniq'),
+        ]
+
+
+class RideQuerySet(models.QuerySet):
+    # The bulk writes skip the pre_save receiver computing the grid cells, they compute them themselves
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for ride in objs:
+            ride.update_cells()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs, now = list(objs), timezone.now()
+        # bulk_update() doesn't apply auto_now
+        for ride in objs:
+            ride.updated_at = now
+        fields = [*fields, 'updated_at'] if 'updated_at' not in fields else list(fields)
+        if Ride.COORDINATE_FIELDS.intersection(fields):
+            for ride in objs:
+                ride.update_cells()
+            fields += [field for field in Ride.CELL_FIELDS if field not in fields]
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if objs:
+            rides_updated.send(sender=self.model, rides=objs, fields=list(fields), using=self.db)
+        return updated
+
+    def update(self, **kwargs):
+        if not Ride.COORDINATE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+
+        # The new coordinates may be expressions: the cells of the updated rides are computed once they are written
+        with transaction.atomic(using=self.db):
+            ride_ids = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            rides = list(
+                Ride.objects.using(self.db)
+                .filter(pk__in=ride_ids)
+                .only('pk', *Ride.COORDINATE_FIELDS, *Ride.CELL_FIELDS)
+            )
+            for ride in rides:
+                ride.update_cells()
+            models.QuerySet(Ride, using=self.db).bulk_update(rides, list(Ride.CELL_FIELDS), batch_size=1000)
+        return updated
+
 
 class Ride(models.Model):
+    COORDINATE_FIELDS = frozenset({'pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude'})
+    CELL_FIELDS = ('pickup_cell', 'dropoff_cell')
+
     id_ride = models.BigAutoField(primary_key=True)
     status = models.CharField(max_length=8, choices=RideStatus.choices, default=RideStatus.ENROUTE)
-    id_rider = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='rider', null=True)
-    id_driver = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='driver', null=True)
+    # Indexed by rides_ride_rider_pickup_idx / rides_ride_driver_pickup_idx
+    id_rider = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='rider', null=True, db_index=False)
+    id_driver = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='driver', null=True, db_index=False)
     pickup_latitude = models.FloatField()
     pickup_longitude = models.FloatField()
     dropoff_latitude = models.FloatField()
     dropoff_longitude = models.FloatField()
     pickup_time = models.DateTimeField()
+    # Spatial grid cells of the pickup/dropoff coordinates (see rides.geo), used to prefilter distance queries.
+    # Computed on save() and by the bulk_create()/bulk_update()/update() of RideQuerySet: rides written otherwise
+    # (raw SQL, historical models of migrations) must set them, or be missed by the radius_km filter
+    pickup_cell = models.BigIntegerField(null=True, editable=False, db_index=True)
+    dropoff_cell = models.BigIntegerField(null=True, editable=False, db_index=True)
+    # Changes with the ride, its events and its rider/driver (see rides.receivers), validates conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RideQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the rider filters joined on the rider and ordered by pickup time
+            models.Index(fields=['id_rider', 'pickup_time'], name='rides_ride_rider_pickup_idx'),
+            # Filter + pickup time ordering/window, ending with the tie breaker of the keyset pagination so a page
+            # is a single range scan
+            models.Index(fields=['pickup_time', 'id_ride'], name='rides_ride_pickup_idx'),
+            models.Index(fields=['status', 'pickup_time', 'id_ride'], name='rides_ride_status_pickup_idx'),
+            models.Index(fields=['id_driver', 'pickup_time', 'id_ride'], name='rides_ride_driver_pickup_idx'),
+        ]
+
+    def update_cells(self) -> None:
+        self.pickup_cell = grid_cell(self.pickup_latitude, self.pickup_longitude)
+        self.dropoff_cell = grid_cell(self.dropoff_latitude, self.dropoff_longitude)
+
+    def save(self, *args, **kwargs):
+        # Cells are computed in a pre_save receiver (so fixtures get them too), make sure they are written along,
+        # as well as updated_at (auto_now only applies to the saved fields)
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = {*update_fields, 'updated_at'}
+            if self.COORDINATE_FIELDS.intersection(update_fields):
+                update_fields |= set(self.CELL_FIELDS)
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+
+class RideEventQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        # bulk_create() skips the pre_save receiver classifying the events
+        for event in objs:
+            event.update_event_type()
+        events = super().bulk_create(objs, *args, **kwargs)
+        ride_events_created.send(sender=self.model, events=events, using=self.db)
+        return events
+
+    def archive(self, before: datetime, batch_size: int) -> int:
+        """
+        Moves the oldest `batch_size` events created before `before` to ArchivedRideEvent, in one short transaction.
+        Returns the number of events moved (0 once there is nothing left to archive).
+        """
+        with transaction.atomic(using=self.db):
+            events = list(
+                self.filter(created_at__lt=before)
+                .order_by('created_at', 'pk')
+                .values_list(*ARCHIVED_EVENT_FIELDS)[:batch_size]
+            )
+            if not events:
+                return 0
+            ArchivedRideEvent.objects.using(self.db).bulk_create(
+                # Retried batches (i.e. after a crash between the insert and the delete) skip the copied rows
+                [ArchivedRideEvent(**dict(zip(ARCHIVED_EVENT_FIELDS, event))) for event in events],
+                ignore_conflicts=True,
+            )
+            # Raw delete: no post_delete signal per event, summaries keep counting archived events. The rides (their
+            # validators) and the cached responses still change, with their history
+            self.filter(pk__in=[event[0] for event in events])._raw_delete(self.db)
+            Ride.objects.using(self.db).filter(pk__in={event[1] for event in events}).update(updated_at=timezone.now())
+            transaction.on_commit(partial(bump_versions, 'ride', 'rideevent'), using=self.db)
+        return len(events)
 
 
 class RideEvent(models.Model):
     id_ride_event = models.BigAutoField(primary_key=True)
-    id_ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='events')
+    id_ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='events', db_index=False)
     description = models.CharField(max_length=255)
+    # Derived from the description when not given (see update_event_type)
+    event_type = models.CharField(max_length=8, choices=RideEventType.choices, default=RideEventType.OTHER)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Optional client provided key, so retried ingestion batches don't duplicate events
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+
+    objects = RideEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the per-ride "recent events" prefetch (id_ride IN (...) AND created_at > ...) and the keyset
+            # paginated timeline of a ride (see RideViewSet.events)
+            models.Index(fields=['id_ride', 'created_at', 'id_ride_event'], name='rides_event_timeline_idx'),
+            # Lifecycle lookups: events of a type over time, and the pickup/dropoff events of rides
+            models.Index(fields=['event_type', 'created_at'], name='rides_event_type_created_idx'),
+            models.Index(fields=['id_ride', 'event_type'], name='rides_event_ride_type_idx'),
+            # Oldest events first, for the archival (see archive_ride_events)
+            models.Index(fields=['created_at', 'id_ride_event'], name='rides_event_created_idx'),
+        ]
+
+    def update_event_type(self) -> None:
+        if self.event_type == RideEventType.OTHER:
+            self.event_type = RideEventType.classify(self.description)
+
+    @property
+    def is_pickup(self) -> bool:
+        return self.event_type == RideEventType.PICKUP
+
+    @property
+    def is_dropoff(self) -> bool:
+        return self.event_type == RideEventType.DROPOFF
+
+
+# Columns copied from RideEvent to ArchivedRideEvent, the primary key first
+ARCHIVED_EVENT_FIELDS = ['id_ride_event', 'id_ride_id', 'description', 'event_type', 'created_at', 'idempotency_key']
+
+
+class ArchivedRideEvent(models.Model):
+    """Events moved out of RideEvent once older than RIDES_EVENT_RETENTION_DAYS, by the archive_ride_events command."""
+
+    id_ride_event = models.BigIntegerField(primary_key=True)  # Kept from RideEvent
+    id_ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='archived_events', db_index=False)
+    description = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=8, choices=RideEventType.choices, default=RideEventType.OTHER)
+    created_at = models.DateTimeField()
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Serves the history of a ride (see RideViewSet.history)
+            models.Index(fields=['id_ride', 'created_at'], name='rides_archive_ride_created_idx'),
+            # Idempotency keys of archived events still count as ingested (see RideEventBulkCreateView)
+            models.Index(
+                fields=['idempotency_key'],
+                name='rides_archive_idempotency_idx',
+                condition=Q(idempotency_key__isnull=False),
+            ),
+        ]
+
+
+class RideSummaryQuerySet(models.QuerySet):
+    def apply_events(self, events: Iterable[RideEvent]) -> None:
+        """Incrementally merges newly inserted events into the summaries of their rides."""
+        events_by_ride = defaultdict(list)
+        for event in events:
+            events_by_ride[event.id_ride_id].append(event)
+        if not events_by_ride:
+            return
+
+        for attempt in range(2):
+            try:
+                with transaction.atomic(using=self.db):
+                    summaries = self.select_for_update().in_bulk(events_by_ride.keys())
+                    new_summaries = []
+                    for id_ride, ride_events in events_by_ride.items():
+                        if id_ride not in summaries:
+                            new_summaries.append(summary := RideSummary(id_ride_id=id_ride))
+                        else:
+                            summary = summaries[id_ride]
+                        summary.add_events(ride_events)
+                        summary.updated_at = timezone.now()
+
+                    self.bulk_create(new_summaries)
+                    # Existing rows are locked, write them back with a multi-row upsert (much cheaper than bulk_update)
+                    self.bulk_create(
+                        summaries.values(),
+                        update_conflicts=True,
+                        unique_fields=['id_ride'],
+                        update_fields=[*RideSummary.SUMMARY_FIELDS, 'updated_at'],
+                    )
+                return
+            except IntegrityError:
+                # A summary was created concurrently, merge into it on the second attempt
+                if attempt:
+                    raise
+
+    def rebuild(self, ride_ids: Iterable[int]) -> None:
+        """Recomputes the summaries of `ride_ids` from their events (archived ones included), dropping the ones without events."""
+        ride_ids = list(ride_ids)
+        aggregates = {}
+        for model in (RideEvent, ArchivedRideEvent):
+            for aggregate in (
+                model.objects.using(self.db)
+                .filter(id_ride__in=ride_ids)
+                .values('id_ride')
+                .annotate(
+                    event_count=Count('pk'),
+                    last_event_at=Max('created_at'),
+                    pickup_at=Min('created_at', filter=Q(event_type=RideEventType.PICKUP)),
+                    dropoff_at=Max('created_at', filter=Q(event_type=RideEventType.DROPOFF)),
+                )
+            ):
+                if (merged := aggregates.setdefault(aggregate['id_ride'], aggregate)) is not aggregate:
+                    merged['event_count'] += aggregate['event_count']
+                    merged['last_event_at'] = max(merged['last_event_at'], aggregate['last_event_at'])
+                    merged['pickup_at'] = min(filter(None, [merged['pickup_at'], aggregate['pickup_at']]), default=None)
+                    merged['dropoff_at'] = max(
+                        filter(None, [merged['dropoff_at'], aggregate['dropoff_at']]), default=None
+                    )
+
+        summaries, now = [], timezone.now()
+        for aggregate in aggregates.values():
+            summary = RideSummary(
+                id_ride_id=aggregate['id_ride'],
+                event_count=aggregate['event_count'],
+                last_event_at=aggregate['last_event_at'],
+                pickup_at=aggregate['pickup_at'],
+                dropoff_at=aggregate['dropoff_at'],
+                updated_at=now,
+            )
+            summary.update_duration()
+            summaries.append(summary)
+
+        with transaction.atomic(using=self.db):
+            self.filter(id_ride__in=ride_ids).exclude(
+                id_ride__in=[summary.id_ride_id for summary in summaries]
+            ).delete()
+            self.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['id_ride'],
+                update_fields=[*RideSummary.SUMMARY_FIELDS, 'updated_at'],
+            )
+
+
+class RideSummary(models.Model):
+    """Lifecycle of a ride derived from its events, kept up to date as events are inserted (see rides.receivers)."""
+
+    SUMMARY_FIELDS = ['pickup_at', 'dropoff_at', 'duration', 'event_count', 'last_event_at']
+
+    id_ride = models.OneToOneField(Ride, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    pickup_at = models.DateTimeField(null=True, db_index=True)  # First pickup event
+    dropoff_at = models.DateTimeField(null=True, db_index=True)  # Last dropoff event
+    duration = models.DurationField(null=True, db_index=True)  # dropoff_at - pickup_at
+    event_count = models.PositiveIntegerField(default=0)
+    last_event_at = models.DateTimeField(null=True, db_index=True)
+    # Set on every change (bulk operations included), used as the watermark of the driver metrics rollup
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Month this ride was last counted in by the driver metrics rollup (see rides.reports)
+    rollup_month = models.DateField(null=True)
+
+    objects = RideSummaryQuerySet.as_manager()
+
+    def add_events(self, events: Iterable[RideEvent]) -> None:
+        for event in events:
+            self.event_count += 1
+            self.last_event_at = max(self.last_event_at or event.created_at, event.created_at)
+            if event.is_pickup:
+                self.pickup_at = min(self.pickup_at or event.created_at, event.created_at)
+            if event.is_dropoff:
+                self.dropoff_at = max(self.dropoff_at or event.created_at, event.created_at)
+        self.update_duration()
+
+    def update_duration(self) -> None:
+        self.duration = self.dropoff_at - self.pickup_at if self.pickup_at and self.dropoff_at else None
+
+
+class DriverLocation(models.Model):
+    """Last known location of the drivers, persisted in batches from the in-memory store (see rides.locations)."""
+
+    id_driver = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='location')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField()  # Time of the location update
+    stored_at = models.DateTimeField(auto_now=True, db_index=True)  # Time it was written, see LocationStore.sync
+
+
+class DriverMonthlyMetrics(models.Model):
+    """Monthly rollup of the trips of each driver, refreshed by the refresh_driver_metrics command."""
+
+    month = models.DateField()  # First day of the month the trips were dropped off in
+    id_driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_metrics')
+    trip_count = models.PositiveIntegerField(default=0)
+    long_trip_count = models.PositiveIntegerField(default=0)  # Trips longer than one hour (pickup to dropoff)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'id_driver'], name='rides_driver_metrics_month_uniq'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.DateTimeField()
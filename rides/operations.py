@@ -0,0 +1,93 @@
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    `AddIndex` building the index with CREATE INDEX CONCURRENTLY on PostgreSQL, so large tables keep taking writes
+    while it is built. Other databases add the index normally. Migrations using it must set `atomic = False`.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class RemoveIndexConcurrently(migrations.RemoveIndex):
+    """`RemoveIndex` dropping the index with DROP INDEX CONCURRENTLY on PostgreSQL, see `AddIndexConcurrently`."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.add_index(model, index, concurrently=True)
+
+
+class RemoveFieldIndexConcurrently(migrations.operations.base.Operation):
+    """
+    Drops the single column index of a field (i.e. of a foreign key) with DROP INDEX CONCURRENTLY on PostgreSQL, see
+    `AddIndexConcurrently`. Database only: meant for the `database_operations` of a `SeparateDatabaseAndState` whose
+    `state_operations` set `db_index=False` on the field, as `AlterField` would drop the index in a plain DROP INDEX.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name: str, name: str):
+        self.model_name = model_name
+        self.name = name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'model_name': self.model_name, 'name': self.name}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        column = model._meta.get_field(self.name).column
+        options = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+        for index_name in schema_editor._constraint_names(model, [column], index=True, type_=models.Index.suffix):
+            schema_editor.execute(schema_editor._delete_index_sql(model, index_name, **options))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        options = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+        field = model._meta.get_field(self.name)
+        schema_editor.execute(schema_editor._create_index_sql(model, fields=[field], **options))
+
+    def describe(self):
+        return f'Remove the index of {self.model_name}.{self.name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'remove_{self.model_name.lower()}_{self.name.lower()}_index'
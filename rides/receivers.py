@@ -0,0 +1,151 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from rides.cache import bump_versions
+from rides.metrics import record_query
+from rides.models import Ride, RideEvent, RideSummary, User
+from rides.search import index_emails
+from rides.serializers.user import UserSerializer
+from rides.signals import ride_events_created, rides_updated
+from rides.stream import publish_events, publish_rides
+
+# Fields of the riders/drivers embedded in rides: changing them changes the rides (see touch_user_rides)
+EMBEDDED_USER_FIELDS = frozenset(UserSerializer.Meta.fields)
+
+
+@receiver(pre_save, sender=Ride)
+def update_ride_cells(sender, instance: Ride, **kwargs):
+    instance.update_cells()
+
+
+@receiver(pre_save, sender=RideEvent)
+def update_event_type(sender, instance: RideEvent, **kwargs):
+    instance.update_event_type()
+
+
+@receiver(post_save, sender=Ride)
+@receiver(post_save, sender=RideEvent)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Ride)
+@receiver(post_delete, sender=RideEvent)
+@receiver(post_delete, sender=User)
+@receiver(ride_events_created, sender=RideEvent)
+@receiver(rides_updated, sender=Ride)
+def bump_cache_versions(sender, update_fields=None, using: str | None = None, **kwargs):
+    # Logging in only updates last_login, which is not part of any cached response
+    if sender is User and update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Once committed: bumped before, concurrent requests would cache the old rows under the new version
+    transaction.on_commit(partial(bump_versions, sender._meta.model_name), using=using)
+
+
+@receiver(post_save, sender=User)
+def index_user_email(sender, instance: User, created: bool, update_fields, using: str, **kwargs):
+    if created or update_fields is None or 'email' in update_fields:
+        index_emails([instance], using)
+
+
+@receiver(post_save, sender=RideEvent)
+def add_event_to_summary(sender, instance: RideEvent, created: bool, using: str, **kwargs):
+    if created:
+        RideSummary.objects.using(using).apply_events([instance])
+
+
+@receiver(ride_events_created, sender=RideEvent)
+def add_events_to_summaries(sender, events: list[RideEvent], using: str, **kwargs):
+    RideSummary.objects.using(using).apply_events(events)
+
+
+@receiver(post_delete, sender=RideEvent)
+def remove_event_from_summary(sender, instance: RideEvent, using: str, **kwargs):
+    # Rebuilt once committed, in one go for all the events deleted by the transaction (i.e. by a queryset delete)
+    vars(connections[using]).setdefault('summaries_to_rebuild', set()).add(instance.id_ride_id)
+    transaction.on_commit(partial(rebuild_summaries, using), using=using)
+
+
+def rebuild_summaries(using: str) -> None:
+    # The first callback of a transaction rebuilds everything, a rolled back one leaves ids that are just rebuilt again
+    ride_ids = vars(connections[using]).pop('summaries_to_rebuild', None)
+    if ride_ids:
+        # Summaries of deleted rides are deleted with them
+        RideSummary.objects.using(using).rebuild(
+            Ride.objects.using(using).filter(pk__in=ride_ids).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=Ride)
+def touch_summary(sender, instance: Ride, created: bool, raw: bool, using: str, **kwargs):
+    # A changed ride (e.g. a new driver) has to be reprocessed by the driver metrics rollup
+    if not created and not raw:
+        RideSummary.objects.using(using).filter(id_ride=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(rides_updated, sender=Ride)
+def touch_summaries(sender, rides: list[Ride], using: str, **kwargs):
+    RideSummary.objects.using(using).filter(id_ride__in=[ride.pk for ride in rides]).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=RideEvent)
+@receiver(post_delete, sender=RideEvent)
+def touch_event_ride(sender, instance: RideEvent, using: str, raw: bool = False, **kwargs):
+    # Rides embed their events, Ride.updated_at changes with them
+    if not raw:
+        Ride.objects.using(using).filter(pk=instance.id_ride_id).update(updated_at=timezone.now())
+
+
+@receiver(ride_events_created, sender=RideEvent)
+def touch_events_rides(sender, events: list[RideEvent], using: str, **kwargs):
+    ride_ids = {event.id_ride_id for event in events}
+    Ride.objects.using(using).filter(pk__in=ride_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_user_rides(sender, instance: User, created: bool, update_fields, raw: bool, using: str, **kwargs):
+    if created or raw or (update_fields is not None and not EMBEDDED_USER_FIELDS.intersection(update_fields)):
+        return
+    now = timezone.now()
+    Ride.objects.using(using).filter(id_rider=instance).update(updated_at=now)
+    Ride.objects.using(using).filter(id_driver=instance).update(updated_at=now)
+
+
+@receiver(pre_delete, sender=User)
+def touch_deleted_user_rides(sender, instance: User, using: str, **kwargs):
+    # Their rides lose their rider/driver (SET_NULL), without saving them
+    now = timezone.now()
+    Ride.objects.using(using).filter(id_rider=instance).update(updated_at=now)
+    Ride.objects.using(using).filter(id_driver=instance).update(updated_at=now)
+
+
+@receiver(post_save, sender=Ride)
+def stream_ride(sender, instance: Ride, created: bool, update_fields, raw: bool, using: str, **kwargs):
+    # New rides and status changes, once committed
+    if not raw and (created or update_fields is None or 'status' in update_fields):
+        transaction.on_commit(partial(publish_rides, [instance]), using=using)
+
+
+@receiver(rides_updated, sender=Ride)
+def stream_rides(sender, rides: list[Ride], fields: list[str], using: str, **kwargs):
+    if 'status' in fields:
+        transaction.on_commit(partial(publish_rides, rides), using=using)
+
+
+@receiver(post_save, sender=RideEvent)
+def stream_event(sender, instance: RideEvent, created: bool, raw: bool, using: str, **kwargs):
+    if created and not raw:
+        transaction.on_commit(partial(publish_events, [instance], using), using=using)
+
+
+@receiver(ride_events_created, sender=RideEvent)
+def stream_events(sender, events: list[RideEvent], using: str, **kwargs):
+    transaction.on_commit(partial(publish_events, events, using), using=using)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,90 @@
+import logging
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from rides.models import DriverMonthlyMetrics, RideSummary, RollupWatermark
+
+logger = logging.getLogger('rides.reports')
+
+DRIVER_METRICS_WATERMARK = 'driver_monthly_metrics'
+LONG_TRIP_DURATION = timedelta(hours=1)
+
+
+def month_range(month: date) -> tuple[datetime, datetime]:
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.get_current_timezone())
+    end = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=start.tzinfo)
+    return start, end
+
+
+def refresh_driver_month(month: date) -> int:
+    start, end = month_range(month)
+    in_month = RideSummary.objects.filter(dropoff_at__gte=start, dropoff_at__lt=end)
+
+    rows = (
+        in_month.filter(id_ride__id_driver__isnull=False)
+        .values('id_ride__id_driver')
+        .annotate(
+            trip_count=Count('pk'),
+            long_trip_count=Count('pk', filter=Q(duration__gt=LONG_TRIP_DURATION)),
+        )
+    )
+    metrics = [
+        DriverMonthlyMetrics(
+            month=month,
+            id_driver_id=row['id_ride__id_driver'],
+            trip_count=row['trip_count'],
+            long_trip_count=row['long_trip_count'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        DriverMonthlyMetrics.objects.filter(month=month).delete()
+        DriverMonthlyMetrics.objects.bulk_create(metrics)
+        in_month.update(rollup_month=month)
+
+    return len(metrics)
+
+
+def refresh_driver_metrics(full: bool = False) -> list[date]:
+    """
+    Refreshes the DriverMonthlyMetrics rollup, only reprocessing the months of the rides whose summary changed since
+    the last refresh: the month a changed ride was counted in before and the month it belongs to now. Returns the
+    refreshed months.
+    """
+    watermark = RollupWatermark.objects.filter(name=DRIVER_METRICS_WATERMARK).first()
+    # Anything changing while refreshing has a later updated_at and is picked up by the next refresh
+    refresh_started_at = timezone.now()
+
+    changed = RideSummary.objects.all()
+    if watermark is not None and not full:
+        # Summaries committed after the last refresh may carry an earlier updated_at (set before their commit):
+        # the months of the summaries changed shortly before the watermark are refreshed again
+        lag = timedelta(seconds=settings.RIDES_DRIVER_METRICS_LAG_SECONDS)
+        changed = changed.filter(updated_at__gt=watermark.value - lag)
+
+    months = {
+        value.date() if isinstance(value, datetime) else value
+        for value in [
+            *changed.annotate(month=TruncMonth('dropoff_at')).values_list('month', flat=True).distinct(),
+            *changed.values_list('rollup_month', flat=True).distinct(),
+        ]
+        if value is not None
+    }
+    if full:
+        months.update(DriverMonthlyMetrics.objects.values_list('month', flat=True).distinct())
+
+    for month in sorted(months):
+        count = refresh_driver_month(month)
+        logger.info('Refreshed driver metrics of %s (%s drivers)', month.strftime('%Y-%m'), count)
+
+    # Rides that lost their dropoff (or were never dropped off) aren't counted in any month anymore
+    changed.filter(dropoff_at__isnull=True, rollup_month__isnull=False).update(rollup_month=None)
+
+    RollupWatermark.objects.update_or_create(name=DRIVER_METRICS_WATERMARK, defaults={'value': refresh_started_at})
+    return sorted(months)
@@ -0,0 +1,65 @@
+import random
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Replica picked for the request (or the code) allowed to read from one, so all its queries see the same lag
+current_replica: ContextVar[str | None] = ContextVar('current_replica', default=None)
+# Set for clients that just wrote (see rides.middleware.PrimaryPinMiddleware) and once the current request writes
+pinned_to_primary: ContextVar[bool] = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def read_from_replica() -> Iterator[None]:
+    # Nested blocks keep the replica of the outer one
+    replica = current_replica.get()
+    if replica is None and settings.DATABASE_REPLICAS:
+        replica = random.choice(settings.DATABASE_REPLICAS)
+    token = current_replica.set(replica)
+    # Writes pin the rest of the block to the primary (see ReplicaRouter.db_for_write), not what follows it
+    pin_token = pinned_to_primary.set(pinned_to_primary.get())
+    try:
+        yield
+    finally:
+        pinned_to_primary.reset(pin_token)
+        current_replica.reset(token)
+
+
+def reads_from_replica() -> bool:
+    """Whether the reads of the current code go to a replica, whose data may lag behind the primary."""
+    return current_replica.get() is not None and not pinned_to_primary.get()
+
+
+@contextmanager
+def pin_to_primary(pinned: bool = True) -> Iterator[None]:
+    token = pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        pinned_to_primary.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica (one of settings.DATABASE_REPLICAS) picked by `read_from_replica()`, inside it only and
+    unless pinned to the primary. Everything else, writes and migrations included, goes to the primary (default
+    database).
+    """
+
+    def db_for_read(self, model, **hints) -> str | None:
+        return current_replica.get() if reads_from_replica() else None
+
+    def db_for_write(self, model, **hints) -> str | None:
+        # Read the rest of the request from the primary, the replicas may not have the write yet
+        if current_replica.get() is not None:
+            pinned_to_primary.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> bool | None:
+        return db not in settings.DATABASE_REPLICAS
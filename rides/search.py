@@ -0,0 +1,89 @@
+import re
+from collections.abc import Iterable
+from enum import StrEnum
+
+from django.db import connections
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+from rides.models import User, UserEmailTrigram
+
+# Emails are indexed lowercased, by LOWER(email) expression indexes and by trigrams for substring searches
+# (pg_trgm GIN index on PostgreSQL, UserEmailTrigram side table on the other databases)
+TRIGRAM_SIZE: int = 3
+PREFIX_WILDCARD = '*'
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class EmailMatch(StrEnum):
+    EXACT = 'exact'
+    PREFIX = 'prefix'
+    SUBSTRING = 'substring'
+
+
+def uses_trigram_table(using: str) -> bool:
+    return connections[using].vendor != 'postgresql'
+
+
+def get_trigrams(value: str) -> set[str]:
+    value = value.lower()
+    return {value[i : i + TRIGRAM_SIZE] for i in range(len(value) - TRIGRAM_SIZE + 1)}
+
+
+def get_email_match(value: str) -> tuple[EmailMatch, str]:
+    """
+    Picks the search strategy from the input: a complete address is matched exactly, `user1*` by prefix and
+    anything else as a substring (case-insensitive).
+    """
+    value = value.strip().lower()
+    if value.endswith(PREFIX_WILDCARD):
+        return EmailMatch.PREFIX, value.rstrip(PREFIX_WILDCARD)
+    if EMAIL_PATTERN.match(value):
+        return EmailMatch.EXACT, value
+    return EmailMatch.SUBSTRING, value
+
+
+def filter_by_email(queryset, field: str, value: str):
+    """Filters `queryset` on the email of the user `field` (a foreign key), i.e. `id_rider`."""
+    match, value = get_email_match(value)
+    if not value:
+        return queryset
+
+    # Matching users are looked up first (through the email indexes), then their rows (through the `field` index)
+    users = User.objects.alias(email_lower=Lower('email'))
+    if match == EmailMatch.EXACT:
+        users = users.filter(email_lower=value)
+    elif match == EmailMatch.PREFIX:
+        users = users.filter(email_lower__startswith=value)
+        if connections[queryset.db].vendor == 'sqlite':
+            # SQLite can't use an index for LIKE (case-insensitive), a range on the binary ordered index can
+            upper_bound = value[:-1] + chr(ord(value[-1]) + 1)
+            users = users.filter(email_lower__gte=value, email_lower__lt=upper_bound)
+    else:
+        users = users.filter(email_lower__contains=value)
+        trigrams = get_trigrams(value)
+        if trigrams and uses_trigram_table(queryset.db):
+            # Users having every trigram of the input, the LIKE then only checks these candidates
+            candidates = (
+                UserEmailTrigram.objects.filter(trigram__in=trigrams)
+                .values('id_user')
+                .annotate(matches=Count('trigram'))
+                .filter(matches=len(trigrams))
+                .values('id_user')
+            )
+            users = users.filter(pk__in=candidates)
+
+    return queryset.filter(**{f'{field}__in': users.values('pk')})
+
+
+def index_emails(users: Iterable, using: str) -> None:
+    """Replaces the trigrams of the emails of `users` (no-op on PostgreSQL, see `uses_trigram_table`)."""
+    if not uses_trigram_table(using):
+        return
+
+    users = list(users)
+    trigrams = UserEmailTrigram.objects.using(using)
+    trigrams.filter(id_user__in=[user.pk for user in users]).delete()
+    trigrams.bulk_create(
+        UserEmailTrigram(id_user_id=user.pk, trigram=trigram) for user in users for trigram in get_trigrams(user.email)
+    )
@@ -0,0 +1,30 @@
+from rest_framework import serializers
+
+# Nearest drivers queries scan the grid cells within the radius, keep it at dispatch scale
+MAX_NEAREST_RADIUS_KM = 50
+MAX_NEAREST_DRIVERS = 100
+
+
+class DriverLocationSerializer(serializers.Serializer):
+    driver_id = serializers.IntegerField(
+        required=False, help_text='Driver of the location (admins only), defaults to the authenticated driver.'
+    )
+    latitude = serializers.FloatField(min_value=-90, max_value=90, help_text='Latitude of the driver.')
+    longitude = serializers.FloatField(min_value=-180, max_value=180, help_text='Longitude of the driver.')
+    available = serializers.BooleanField(
+        default=True, help_text='Whether the driver can take a ride, only available drivers are returned as nearest.'
+    )
+
+
+class NearestDriversQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90, help_text='Latitude of the pickup.')
+    lon = serializers.FloatField(min_value=-180, max_value=180, help_text='Longitude of the pickup.')
+    k = serializers.IntegerField(
+        min_value=1, max_value=MAX_NEAREST_DRIVERS, default=5, help_text='Number of drivers returned.'
+    )
+    radius_km = serializers.FloatField(
+        min_value=0,
+        max_value=MAX_NEAREST_RADIUS_KM,
+        default=5,
+        help_text='Only return drivers within this many kilometers of the pickup.',
+    )
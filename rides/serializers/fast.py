@@ -0,0 +1,147 @@
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from functools import cached_property
+from typing import Any
+
+from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+Converter = Callable[[Any], Any]
+
+
+def get_converter(field: serializers.Field) -> Converter:
+    """Returns a function doing the same as `field.to_representation` for a non-null value, minus the overhead."""
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601:
+            return field.to_representation
+
+        enforce_timezone = field.enforce_timezone
+
+        def to_iso_8601(value) -> str:
+            value = enforce_timezone(value).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        return to_iso_8601
+
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.CharField):
+        return str
+    return field.to_representation
+
+
+class FastSerializer:
+    """
+    Read-only equivalent of `serializer_class(many=True).data` working on `.values()` rows instead of instances.
+
+    The output schema is derived from the fields of `serializer_class`: plain fields are read from their source
+    column and converted with precompiled converters, nested serializers are read from the joined columns of their
+    relation (`<source>__<column>`) and `many=True` nested serializers are filled with `fill_nested()` from a
+    separate query. Only simple field sources are supported (no dotted sources or SerializerMethodFields).
+    """
+
+    def __init__(self, serializer_class: type[serializers.Serializer], pk: str):
+        self.serializer_class = serializer_class
+        self.pk = pk
+
+    @cached_property
+    def plan(self) -> list[tuple[str, str, Any]]:
+        # (output key, kind, details) per readable field, in the same order as the serializer
+        plan = []
+        for key, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+
+            if isinstance(field, serializers.ListSerializer):
+                plan.append((key, 'many', field.source))
+            elif isinstance(field, serializers.Serializer):
+                nested = [
+                    (nested_key, f'{field.source}__{nested_field.source}', get_converter(nested_field))
+                    for nested_key, nested_field in field.fields.items()
+                    if not nested_field.write_only
+                ]
+                plan.append((key, 'one', (field.source, nested)))
+            else:
+                plan.append((key, 'field', (field.source, get_converter(field))))
+        return plan
+
+    @cached_property
+    def columns(self) -> list[str]:
+        columns = []
+        for _, kind, details in self.plan:
+            if kind == 'field':
+                columns.append(details[0])
+            elif kind == 'one':
+                source, nested = details
+                columns.append(source)
+                columns.extend(column for _, column, _ in nested)
+        return columns
+
+    @cached_property
+    def nested_many(self) -> dict[str, 'FastSerializer']:
+        fields = self.serializer_class().fields
+        return {
+            details: FastSerializer(type(fields[key].child), pk=fields[key].child.Meta.model._meta.pk.name)
+            for key, kind, details in self.plan
+            if kind == 'many'
+        }
+
+    def values(self, queryset):
+        """Turns a (filtered, ordered) model queryset into the `.values()` rows consumed by `to_representation`."""
+        return queryset.prefetch_related(None).values(*self.columns, *queryset.query.annotations)
+
+    def to_representation(self, rows: Iterable[dict], nested_many: dict[str, dict[Any, list]] | None = None) -> list:
+        nested_many = nested_many or {}
+        data = []
+        for row in rows:
+            item = {}
+            for key, kind, details in self.plan:
+                if kind == 'field':
+                    value = row[details[0]]
+                    item[key] = None if value is None else details[1](value)
+                elif kind == 'one':
+                    source, nested = details
+                    if row[source] is None:
+                        item[key] = None
+                        continue
+                    item[key] = {
+                        nested_key: None if row[column] is None else convert(row[column])
+                        for nested_key, column, convert in nested
+                    }
+                else:
+                    item[key] = nested_many.get(details, {}).get(row[self.pk], [])
+            data.append(item)
+        return data
+
+    def fill_nested(self, source: str, rows: Iterable[dict], queryset, related_column: str) -> dict[Any, list]:
+        """
+        Serializes the `many=True` field `source` of `rows` from `queryset` (the prefetch queryset of that relation),
+        grouped by `related_column`, the column of `queryset` pointing back to `rows`.
+        """
+        nested_rows = self.get_nested_rows(source, rows, queryset, related_column)
+        if nested_rows is None:
+            return {}
+        return self.group_nested(source, list(nested_rows), related_column)
+
+    async def afill_nested(self, source: str, rows: Iterable[dict], queryset, related_column: str) -> dict[Any, list]:
+        """Async version of `fill_nested`."""
+        nested_rows = self.get_nested_rows(source, rows, queryset, related_column)
+        if nested_rows is None:
+            return {}
+        return self.group_nested(source, [row async for row in nested_rows], related_column)
+
+    def get_nested_rows(self, source: str, rows: Iterable[dict], queryset, related_column: str):
+        pks = [row[self.pk] for row in rows]
+        if not pks:
+            return None
+        columns = self.nested_many[source].columns
+        return queryset.filter(**{f'{related_column}__in': pks}).values(*columns, related_column)
+
+    def group_nested(self, source: str, nested_rows: list[dict], related_column: str) -> dict[Any, list]:
+        grouped = defaultdict(list)
+        for nested_row, item in zip(nested_rows, self.nested_many[source].to_representation(nested_rows)):
+            grouped[nested_row[related_column]].append(item)
+        return grouped
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from rides.heatmap import ORIGINS, RESOLUTIONS
+from rides.models import DriverMonthlyMetrics, RideStatus
+
+
+class DriverMonthlyMetricsSerializer(serializers.ModelSerializer):
+    month = serializers.DateField(help_text='First day of the month the trips were dropped off in.')
+    id_driver = serializers.IntegerField(source='id_driver_id', help_text='Unique identifier of the driver.')
+    driver = serializers.CharField(source='id_driver.get_full_name', help_text='Full name of the driver.')
+    trip_count = serializers.IntegerField(help_text='Number of trips dropped off during the month.')
+    long_trip_count = serializers.IntegerField(help_text='Number of trips longer than one hour (pickup to dropoff).')
+    refreshed_at = serializers.DateTimeField(help_text='When the metrics were last refreshed.')
+
+    class Meta:
+        model = DriverMonthlyMetrics
+        fields = ('month', 'id_driver', 'driver', 'trip_count', 'long_trip_count', 'refreshed_at')
+
+
+class HeatmapQuerySerializer(serializers.Serializer):
+    origin = serializers.ChoiceField(
+        choices=ORIGINS, default='pickup', help_text='Ride coordinates counted: "pickup" (default) or "dropoff".'
+    )
+    resolution = serializers.ChoiceField(
+        choices=RESOLUTIONS, default=0.01, help_text='Size of the cells of the grid, in degrees.'
+    )
+    status = serializers.MultipleChoiceField(
+        choices=RideStatus.choices, required=False, help_text='Only count rides of these statuses.'
+    )
+    pickup_time_after = serializers.DateTimeField(
+        required=False,
+        help_text='Start of the pickup time window (inclusive), defaults to RIDES_HEATMAP_DEFAULT_DAYS ago.',
+    )
+    pickup_time_before = serializers.DateTimeField(
+        required=False, help_text='End of the pickup time window (inclusive), defaults to now.'
+    )
+
+    def validate(self, attrs):
+        end = attrs.get('pickup_time_before') or timezone.now()
+        start = attrs.get('pickup_time_after') or end - timedelta(days=settings.RIDES_HEATMAP_DEFAULT_DAYS)
+        if start > end:
+            raise serializers.ValidationError('"pickup_time_after" must not be later than "pickup_time_before".')
+        if end - start > timedelta(days=settings.RIDES_HEATMAP_MAX_DAYS):
+            raise serializers.ValidationError(
+                f'The pickup time window must not be longer than {settings.RIDES_HEATMAP_MAX_DAYS} days.'
+            )
+        return {
+            **attrs,
+            'status': sorted(attrs.get('status', [])),
+            'pickup_time_after': start,
+            'pickup_time_before': end,
+        }
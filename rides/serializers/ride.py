@@ -1,17 +1,26 @@
 from rest_framework import serializers
 
-from rides.models import Ride, RideEvent
+from rides.models import Ride, RideEvent, RideEventType
 from rides.serializers.user import UserSerializer
 
 
 class RideEventSerializer(serializers.ModelSerializer):
     id_ride_event = serializers.IntegerField(help_text='Unique identifier for the ride event.', read_only=True)
     description = serializers.CharField(help_text='Description of the ride event.')
+    event_type = serializers.ChoiceField(
+        choices=RideEventType.choices, help_text='Type of the ride event, derived from its description if not given.'
+    )
     created_at = serializers.DateTimeField(help_text='Timestamp of when the event occurred.', read_only=True)
 
     class Meta:
         model = RideEvent
-        exclude = ['id_ride']
+        exclude = ['id_ride', 'idempotency_key']
+
+
+class RideEventHistorySerializer(RideEventSerializer):
+    archived = serializers.BooleanField(
+        help_text='Whether the event was moved to the archive (older than the retention period).', read_only=True
+    )
 
 
 class RideSerializer(serializers.ModelSerializer):
@@ -34,4 +43,19 @@ class RideSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ride
-        exclude = ['id_driver', 'id_rider']
+        exclude = ['id_driver', 'id_rider', 'pickup_cell', 'dropoff_cell', 'updated_at']
+
+
+class RideEventIngestSerializer(serializers.Serializer):
+    id_ride = serializers.IntegerField(help_text='Ride the event belongs to.')
+    description = serializers.CharField(max_length=255, help_text='Description of the ride event.')
+    event_type = serializers.ChoiceField(
+        choices=RideEventType.choices,
+        required=False,
+        help_text='Type of the ride event, derived from its description if not given.',
+    )
+    idempotency_key = serializers.CharField(
+        max_length=64,
+        required=False,
+        help_text='Optional client key of the event. Events with an already ingested key are skipped.',
+    )
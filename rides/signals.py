@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent by RideEvent.objects.bulk_create() with the created `events`, as bulk_create() doesn't send post_save
+ride_events_created = Signal()
+
+# Sent by Ride.objects.bulk_update() with the updated `rides` and `fields`, as bulk_update() doesn't send post_save
+rides_updated = Signal()
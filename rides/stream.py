@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from enum import StrEnum
+
+import orjson
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from rides.models import Ride, RideEvent
+
+logger = logging.getLogger('rides.stream')
+
+# Columns of the ride sent along every message, used to match the filters of the subscribers
+RIDE_FIELDS = ('id_ride', 'status', 'id_rider_id', 'id_driver_id')
+
+
+class MessageType(StrEnum):
+    RIDE = 'ride'
+    EVENT = 'event'
+    # Sent to a subscriber that missed messages (too slow, or resuming from an id that is no longer buffered):
+    # clients should reload the rides list, then follow the stream again
+    RESET = 'reset'
+
+
+def new_message_id() -> str:
+    # Unique across processes, messages are ordered by their arrival in each process, not by id
+    return f'{time.time_ns():x}-{os.getpid():x}'
+
+
+def build_reset_message(message_id: str | None) -> dict:
+    # Without id (None) clients keep their last id, an empty one clears it
+    return {'id': message_id, 'type': MessageType.RESET, 'ride': None, 'data': {}}
+
+
+class StreamBackend:
+    """Carries the published messages to the broker of every process serving streams (`Broker.dispatch`)."""
+
+    def __init__(self, broker: 'Broker'):
+        self.broker = broker
+
+    def publish(self, message: dict) -> None:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        """Called before the first subscription of the process."""
+
+    def has_subscribers(self) -> bool:
+        """Whether published messages may reach a subscription, publishers skip their work otherwise."""
+        return True
+
+
+class LocalBackend(StreamBackend):
+    """Messages only reach the streams of the process publishing them, i.e. a single ASGI worker."""
+
+    def publish(self, message: dict) -> None:
+        self.broker.dispatch(message)
+
+    def has_subscribers(self) -> bool:
+        return bool(self.broker.subscriptions)
+
+
+class PostgresBackend(StreamBackend):
+    """
+    Messages go through PostgreSQL NOTIFY on RIDES_STREAM_CHANNEL, every process serving streams LISTENs with a
+    dedicated connection (from a daemon thread), so streams get the writes of every process.
+    """
+
+    RECONNECT_SECONDS = 5
+
+    def __init__(self, broker: 'Broker'):
+        super().__init__(broker)
+        self.listener = None
+
+    def has_subscribers(self) -> bool:
+        # Subscribers may be in any process, publishing is opted in instead
+        return settings.RIDES_STREAM_PUBLISH
+
+    def publish(self, message: dict) -> None:
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [settings.RIDES_STREAM_CHANNEL, orjson.dumps(message, option=orjson.OPT_UTC_Z).decode()],
+            )
+
+    def start(self) -> None:
+        if self.listener is None:
+            self.listener = threading.Thread(target=self.listen, name='rides-stream-listener', daemon=True)
+            self.listener.start()
+
+    def listen(self) -> None:
+        import psycopg
+
+        # Same parameters as the connections of Django, OPTIONS (i.e. sslmode) included
+        params = connections['default'].get_connection_params()
+        while True:
+            try:
+                with psycopg.connect(**params, autocommit=True) as connection:
+                    connection.execute(f'LISTEN "{settings.RIDES_STREAM_CHANNEL}"')
+                    for notify in connection.notifies():
+                        self.broker.dispatch(orjson.loads(notify.payload))
+            except Exception:
+                logger.exception('Stream listener disconnected, reconnecting in %ss', self.RECONNECT_SECONDS)
+                # Messages were possibly missed, subscribers have to reload
+                self.broker.dispatch(build_reset_message(new_message_id()))
+                time.sleep(self.RECONNECT_SECONDS)
+
+
+@dataclass(eq=False)
+class Subscription:
+    """A stream client: its filters and the queue of its pending messages, consumed from `loop`."""
+
+    loop: asyncio.AbstractEventLoop
+    statuses: set[str] = field(default_factory=set)
+    # None when not filtered on riders
+    rider_ids: set[int] | None = None
+    driver_id: int | None = None
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    overflowed: bool = False
+
+    def matches(self, message: dict) -> bool:
+        ride = message['ride']
+        if ride is None:
+            return True
+        return (
+            (not self.statuses or ride['status'] in self.statuses)
+            and (self.rider_ids is None or ride['id_rider_id'] in self.rider_ids)
+            and (self.driver_id is None or ride['id_driver_id'] == self.driver_id)
+        )
+
+    def put(self, message: dict) -> None:
+        # Backpressure: a client more than RIDES_STREAM_QUEUE_SIZE messages behind is not buffered any further, its
+        # stream ends (None) and it resumes from its last id, or reloads
+        if self.overflowed or not self.matches(message):
+            return
+        if self.queue.qsize() >= settings.RIDES_STREAM_QUEUE_SIZE:
+            self.overflowed = True
+            message = None
+        self.queue.put_nowait(message)
+
+
+class Broker:
+    """
+    In-process fan-out of the messages of the stream backend (RIDES_STREAM_BACKEND) to the subscriptions, which
+    are idle until a message matching their filters comes in. The last RIDES_STREAM_BUFFER_SIZE messages are kept
+    so clients can resume from their last message id.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions: dict[asyncio.AbstractEventLoop, set[Subscription]] = {}
+        self.buffer: deque[dict] = deque(maxlen=settings.RIDES_STREAM_BUFFER_SIZE)
+        self._backend: StreamBackend | None = None
+
+    @property
+    def backend(self) -> StreamBackend:
+        if self._backend is None:
+            self._backend = import_string(settings.RIDES_STREAM_BACKEND)(self)
+        return self._backend
+
+    def publish(self, message: dict) -> None:
+        self.backend.publish(message)
+
+    def should_publish(self) -> bool:
+        if self.backend.has_subscribers():
+            return True
+        # Messages are skipped from now on, clients resuming from a buffered id must reload instead
+        with self.lock:
+            self.buffer.clear()
+        return False
+
+    def dispatch(self, message: dict) -> None:
+        """Buffers a message of the backend and hands it to the subscriptions (from any thread)."""
+        with self.lock:
+            self.buffer.append(message)
+            # Subscriptions are snapshotted with the buffer, so new subscriptions get the message once
+            subscriptions = {loop: list(loop_subscriptions) for loop, loop_subscriptions in self.subscriptions.items()}
+
+        for loop, loop_subscriptions in subscriptions.items():
+            try:
+                loop.call_soon_threadsafe(self.deliver, loop_subscriptions, message)
+            except RuntimeError:
+                # Closed loop, its subscriptions are gone
+                pass
+
+    def deliver(self, subscriptions: Iterable[Subscription], message: dict) -> None:
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, subscription: Subscription, last_event_id: str | None = None) -> list[dict]:
+        """Registers `subscription`, returns the buffered messages following `last_event_id` it has to get first."""
+        self.backend.start()
+        with self.lock:
+            self.subscriptions.setdefault(subscription.loop, set()).add(subscription)
+            if not last_event_id:
+                return []
+
+            backlog = []
+            for message in reversed(self.buffer):
+                if message['id'] == last_event_id:
+                    break
+                backlog.append(message)
+            else:
+                # Not buffered (anymore), the client may have missed anything: it reloads and follows from now on
+                return [build_reset_message(self.buffer[-1]['id'] if self.buffer else '')]
+
+        backlog.reverse()
+        return [message for message in backlog if subscription.matches(message)]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            loop_subscriptions = self.subscriptions.get(subscription.loop, set())
+            loop_subscriptions.discard(subscription)
+            if not loop_subscriptions:
+                self.subscriptions.pop(subscription.loop, None)
+
+    @property
+    def subscription_count(self) -> int:
+        with self.lock:
+            return sum(len(loop_subscriptions) for loop_subscriptions in self.subscriptions.values())
+
+
+broker = Broker()
+
+
+def build_message(message_type: MessageType, ride: Ride, data: dict) -> dict:
+    return {
+        'id': new_message_id(),
+        'type': message_type,
+        'ride': {name: getattr(ride, name) for name in RIDE_FIELDS},
+        'data': data,
+    }
+
+
+def publish_rides(rides: Iterable[Ride]) -> None:
+    if not broker.should_publish():
+        return
+    for ride in rides:
+        data = {
+            'id_ride': ride.id_ride,
+            'status': ride.status,
+            'pickup_time': ride.pickup_time,
+            'driver_id': ride.id_driver_id,
+            'rider_id': ride.id_rider_id,
+        }
+        broker.publish(build_message(MessageType.RIDE, ride, data))
+
+
+def publish_events(events: Iterable[RideEvent], using: str) -> None:
+    if not broker.should_publish():
+        return
+    events = list(events)
+    # One query for the rides of the events, needed to match the filters of the subscribers
+    rides = Ride.objects.using(using).only(*RIDE_FIELDS).in_bulk({event.id_ride_id for event in events})
+    for event in events:
+        if (ride := rides.get(event.id_ride_id)) is None:
+            continue
+        data = {
+            'id_ride_event': event.id_ride_event,
+            'id_ride': event.id_ride_id,
+            'description': event.description,
+            'event_type': event.event_type,
+            'created_at': event.created_at,
+        }
+        broker.publish(build_message(MessageType.EVENT, ride, data))
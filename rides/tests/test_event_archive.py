@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rides.cache import get_versions
+from rides.models import ArchivedRideEvent, Ride, RideEvent, Roles, User
+
+
+@override_settings(RIDES_RESPONSE_CACHE=False)
+class EventArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', phone_number='+10000000000', role=Roles.ADMIN
+        )
+        cls.ride = Ride.objects.create(
+            pickup_latitude=37.7,
+            pickup_longitude=-122.4,
+            dropoff_latitude=37.8,
+            dropoff_longitude=-122.5,
+            pickup_time=timezone.now(),
+        )
+        events = RideEvent.objects.bulk_create(
+            RideEvent(id_ride=cls.ride, description=f'Event {index}', idempotency_key=f'key-{index}')
+            for index in range(7)
+        )
+        # The first 4 are old enough to be archived
+        for index, event in enumerate(events):
+            RideEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - timedelta(days=10 - index))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def archive(self) -> int:
+        with self.captureOnCommitCallbacks(execute=True):
+            return RideEvent.objects.archive(timezone.now() - timedelta(days=6, hours=12), batch_size=100)
+
+    def test_archive(self):
+        versions, updated_at = get_versions(), Ride.objects.get().updated_at
+        self.assertEqual(self.archive(), 4)
+        self.assertEqual(ArchivedRideEvent.objects.count(), 4)
+        self.assertEqual(RideEvent.objects.count(), 3)
+        # The history of the ride changed: so do its validators and the cached responses
+        self.assertGreater(Ride.objects.get().updated_at, updated_at)
+        self.assertNotEqual(get_versions(), versions)
+
+    def test_ingest_archived_key(self):
+        self.archive()
+        items = [
+            {'id_ride': self.ride.pk, 'description': 'Retried', 'idempotency_key': 'key-0'},
+            {'id_ride': self.ride.pk, 'description': 'Retried', 'idempotency_key': 'key-6'},
+        ]
+        response = self.client.post('/ride-events/bulk/', items, content_type='application/json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['duplicate', 'duplicate'])
+        self.assertEqual(RideEvent.objects.count() + ArchivedRideEvent.objects.count(), 7)
+
+    def test_history(self):
+        self.archive()
+        expected = list(RideEvent.objects.order_by('-created_at').values_list('pk', flat=True))
+        expected += list(ArchivedRideEvent.objects.order_by('-created_at').values_list('pk', flat=True))
+
+        response = self.client.get(f'/rides/{self.ride.pk}/history/', {'page_size': 2})
+        self.assertNotIn('count', response.json())
+        pages = [response.json()['results']]
+        while next_url := response.json()['next']:
+            response = self.client.get(next_url)
+            pages.append(response.json()['results'])
+        self.assertEqual([event['id_ride_event'] for page in pages for event in page], expected)
+        self.assertEqual([event['archived'] for page in pages for event in page], [False] * 3 + [True] * 4)
+
+        previous = self.client.get(response.json()['previous']).json()['results']
+        self.assertEqual(previous, pages[-2])
+
+    def test_history_not_found(self):
+        self.assertEqual(self.client.get('/rides/0/history/').status_code, 404)
@@ -0,0 +1,40 @@
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from rides.management.seeding import seed_database
+from rides.models import Ride, Roles, User
+
+
+@override_settings(RIDES_EXPORT_CHUNK_SIZE=7)
+class ExportTests(TestCase):
+    """Under ASGI the export is streamed from an async iterator, with the same content as under WSGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(50)
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', phone_number='+10000000000', role=Roles.ADMIN
+        )
+
+    def get(self, query: dict) -> bytes:
+        self.client.force_login(self.admin)
+        response = self.client.get('/rides/export/', query)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    async def aget(self, query: dict) -> bytes:
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/rides/export/', query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    def test_asgi(self):
+        for query in ({}, {'export_format': 'csv'}, {'status': 'pickup', 'events_limit': 1}):
+            with self.subTest(**query):
+                self.assertEqual(async_to_sync(self.aget)(query), self.get(query))
+
+    def test_wsgi(self):
+        lines = self.get({}).splitlines()
+        self.assertEqual(len(lines), Ride.objects.count())
@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from rides.management.seeding import seed_database
+from rides.models import Ride, Roles, User
+
+RIDES = 300
+
+# Query params of the compared list responses
+LIST_QUERIES = [
+    {'ordering': 'pickup_time'},
+    {'page_size': 200, 'status': 'pickup', 'ordering': 'pickup_time'},
+    {'page_size': 200, 'pagination': 'cursor', 'ordering': '-pickup_time'},
+    {'page_size': 50, 'ordering': 'distance', 'lat': 37.72, 'lon': -122.38, 'radius_km': 5},
+    {'page_size': 200, 'event_type': 'other', 'events_limit': 2},
+    {'page_size': 200, 'events_limit': 0},
+]
+
+
+@override_settings(RIDES_RESPONSE_CACHE=False)
+class FastSerializationTests(TestCase):
+    """The fast path (RIDES_FAST_SERIALIZATION) must output the same JSON as RideSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(RIDES)
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', phone_number='+10000000000', role=Roles.ADMIN
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, path: str, query: dict, fast: bool):
+        with override_settings(RIDES_FAST_SERIALIZATION=fast):
+            response = self.client.get(path, query)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response.json()
+
+    def test_serializers_output(self):
+        # Same check as the benchmark, on every seeded ride
+        call_command('benchmark_serializers', rows=RIDES, repeat=1, stdout=StringIO())
+
+    def test_list(self):
+        for query in LIST_QUERIES:
+            with self.subTest(**query):
+                expected = self.get('/rides/', query, fast=False)
+                self.assertTrue(expected['results'])
+                self.assertEqual(self.get('/rides/', query, fast=True), expected)
+
+    def test_list_embeds_events(self):
+        # Otherwise the comparisons above would not cover the events
+        rides = self.get('/rides/', {'page_size': 500}, fast=True)['results']
+        self.assertTrue(any(ride['todays_ride_events'] for ride in rides))
+
+    def test_retrieve(self):
+        for pk in list(Ride.objects.order_by('pk').values_list('pk', flat=True))[:: RIDES // 10]:
+            with self.subTest(pk=pk):
+                self.assertEqual(self.get(f'/rides/{pk}/', {}, fast=True), self.get(f'/rides/{pk}/', {}, fast=False))
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rides.management.commands.load_fixtures import read_objects
+from rides.models import RideEvent
+
+GENERATE_FIXTURES = Path(__file__).resolve().parents[2] / 'scripts' / 'generate_fixtures.py'
+
+
+class LoadFixturesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / 'fixtures.ndjson')
+        subprocess.run(
+            [
+                sys.executable,
+                str(GENERATE_FIXTURES),
+                '--out',
+                self.path,
+                '--format',
+                'ndjson',
+                '--riders',
+                '5',
+                '--drivers',
+                '3',
+                '--admins',
+                '1',
+                '--rides',
+                '30',
+                '--base-date',
+                '2024-01-01T00:00:00Z',
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+    def test_keeps_event_timestamps(self):
+        call_command('load_fixtures', self.path, chunk_size=20, stdout=StringIO())
+
+        expected = {
+            obj['pk']: datetime.fromisoformat(obj['fields']['created_at'])
+            for obj in read_objects(self.path)
+            if obj['model'] == 'rides.rideevent'
+        }
+        self.assertTrue(expected)
+        self.assertEqual(dict(RideEvent.objects.values_list('pk', 'created_at')), expected)
@@ -0,0 +1,142 @@
+import random
+import time
+from datetime import UTC, datetime
+from unittest import mock
+
+from django.test import TestCase
+
+from rides.geo import haversine_km
+from rides.locations import LocationStore
+from rides.models import DriverLocation, Roles, User
+
+
+def create_user(index: int, role: str = Roles.DRIVER) -> User:
+    return User.objects.create(
+        username=f'{role}{index}', email=f'{role}{index}@example.com', phone_number=f'+1000000{index:04}', role=role
+    )
+
+
+class LocationStoreTests(TestCase):
+    def setUp(self):
+        self.store = LocationStore()
+
+    def nearest_ids(self, latitude=37.77, longitude=-122.42, k=10, radius_km=50.0, max_age_seconds=60.0) -> list[int]:
+        return [
+            position.id_driver for _, position in self.store.nearest(latitude, longitude, k, radius_km, max_age_seconds)
+        ]
+
+    def test_nearest(self):
+        rng = random.Random(0)
+        drivers = {index: (37.77 + rng.uniform(-0.3, 0.3), -122.42 + rng.uniform(-0.3, 0.3)) for index in range(500)}
+        for index, (latitude, longitude) in drivers.items():
+            self.store.update(index, latitude, longitude)
+
+        for k, radius_km in ((1, 50.0), (10, 5.0), (25, 50.0), (600, 10.0)):
+            with self.subTest(k=k, radius_km=radius_km):
+                distances = sorted(
+                    (haversine_km(37.77, -122.42, latitude, longitude), index)
+                    for index, (latitude, longitude) in drivers.items()
+                )
+                expected = [index for distance, index in distances if distance <= radius_km][:k]
+                self.assertEqual(self.nearest_ids(k=k, radius_km=radius_km), expected)
+
+    def test_moves_and_availability(self):
+        for index in range(3):
+            self.store.update(index, 37.77, -122.42 + index * 0.001)
+        # Taken out of its cell (swapped with the last driver of the cell), then moved to another cell
+        self.store.update(0, 37.77, -122.42, available=False)
+        self.assertEqual(sorted(self.nearest_ids()), [1, 2])
+        self.store.update(1, 37.9, -122.42)
+        self.store.update(0, 37.771, -122.42)
+        self.assertEqual(self.nearest_ids(), [0, 2, 1])
+        self.assertEqual(sum(len(cell.ids) for cell in self.store.cells.values()), 3)
+
+    def test_max_age(self):
+        self.store.update(1, 37.77, -122.42, updated_at=time.time() - 120)
+        self.store.update(2, 37.78, -122.42)
+        self.assertEqual(self.nearest_ids(), [2])
+        self.assertEqual(self.store.expire(60), 1)
+        self.assertEqual(self.nearest_ids(max_age_seconds=600), [2])
+
+    def test_sync(self):
+        drivers = [create_user(index) for index in range(3)]
+        self.store.update(drivers[0].pk, 37.77, -122.42)
+        # Written by another process
+        DriverLocation.objects.create(
+            id_driver=drivers[1], latitude=37.78, longitude=-122.42, updated_at=datetime.now(tz=UTC)
+        )
+        self.store.sync()
+        self.assertEqual(self.nearest_ids(), [drivers[0].pk, drivers[1].pk])
+        self.assertEqual(DriverLocation.objects.get(pk=drivers[0].pk).latitude, 37.77)
+        self.assertFalse(self.store.dirty)
+
+        # Older rows don't override newer local updates
+        self.store.update(drivers[1].pk, 37.771, -122.42)
+        DriverLocation.objects.filter(pk=drivers[1].pk).update(
+            latitude=0.0, updated_at=datetime(2000, 1, 1, tzinfo=UTC)
+        )
+        self.store.synced_at = None
+        with mock.patch.object(LocationStore, 'take_dirty', return_value=[]):
+            self.store.sync()
+        self.assertEqual(self.nearest_ids(), [drivers[0].pk, drivers[1].pk])
+
+
+class DriverEndpointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user(0, Roles.ADMIN)
+        cls.drivers = [create_user(index) for index in range(1, 4)]
+        cls.rider = create_user(4, Roles.RIDER)
+
+    def setUp(self):
+        self.store = LocationStore()
+        for patch in (
+            mock.patch('rides.api.drivers.store', self.store),
+            mock.patch.object(LocationStore, 'start_sync'),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, data):
+        return self.client.post('/drivers/locations/', data, content_type='application/json')
+
+    def test_driver_update(self):
+        self.client.force_login(self.drivers[0])
+        response = self.post({'latitude': 37.77, 'longitude': -122.42, 'available': True})
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertTrue(self.store.has_driver(self.drivers[0].pk))
+
+        response = self.post({'latitude': 37.77, 'longitude': -122.42, 'driver_id': self.drivers[1].pk})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.rider)
+        self.assertEqual(self.post({'latitude': 37.77, 'longitude': -122.42}).status_code, 403)
+
+    def test_admin_updates(self):
+        self.client.force_login(self.admin)
+        locations = [
+            {'driver_id': driver.pk, 'latitude': 37.77 + index * 0.01, 'longitude': -122.42}
+            for index, driver in enumerate(self.drivers)
+        ]
+        response = self.post(locations)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json(), {'updated': 3})
+
+        self.assertEqual(self.post({'latitude': 37.77, 'longitude': -122.42}).status_code, 400)
+        response = self.post({'latitude': 37.77, 'longitude': -122.42, 'driver_id': self.rider.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_nearest(self):
+        for index, driver in enumerate(self.drivers):
+            self.store.update(driver.pk, 37.77 + index * 0.01, -122.42, available=index != 1)
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/drivers/nearest/', {'lat': 37.77, 'lon': -122.42, 'k': 5, 'radius_km': 10})
+        self.assertEqual(response.status_code, 200, response.content)
+        nearest = response.json()
+        self.assertEqual([driver['driver_id'] for driver in nearest], [self.drivers[0].pk, self.drivers[2].pk])
+        self.assertEqual(nearest[0]['distance_km'], 0)
+
+        self.assertEqual(self.client.get('/drivers/nearest/', {'lat': 37.77}).status_code, 400)
+        self.client.force_login(self.drivers[0])
+        self.assertEqual(self.client.get('/drivers/nearest/', {'lat': 37.77, 'lon': -122.42}).status_code, 403)
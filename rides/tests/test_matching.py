@@ -0,0 +1,88 @@
+from datetime import UTC, datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rides.locations import LocationStore
+from rides.matching import assign_drivers, load_drivers, load_rides
+from rides.models import DriverLocation, Ride, RideStatus, Roles, User
+
+
+class MatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.drivers = [
+            User.objects.create(
+                username=f'driver{index}',
+                email=f'driver{index}@example.com',
+                phone_number=f'+1000000{index:04}',
+                role=Roles.DRIVER,
+            )
+            for index in range(3)
+        ]
+        DriverLocation.objects.bulk_create(
+            DriverLocation(id_driver=driver, latitude=37.77, longitude=-122.42, updated_at=datetime.now(tz=UTC))
+            for driver in cls.drivers
+        )
+        cls.rides = Ride.objects.bulk_create(
+            Ride(
+                pickup_latitude=37.77,
+                pickup_longitude=-122.42,
+                dropoff_latitude=37.8,
+                dropoff_longitude=-122.5,
+                pickup_time=timezone.now(),
+            )
+            for _ in range(3)
+        )
+
+    def setUp(self):
+        self.store = LocationStore()
+        for driver in self.drivers:
+            self.store.update(driver.pk, 37.77, -122.42)
+        patch = mock.patch('rides.matching.store', self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def assign(self) -> int:
+        with self.captureOnCommitCallbacks(execute=True):
+            return assign_drivers({ride.pk: driver.pk for ride, driver in zip(self.rides, self.drivers)})
+
+    def test_match(self):
+        # Checks rides.matching.match against a brute force greedy
+        call_command('benchmark_matching', rides=100, drivers=50, repeat=1, stdout=StringIO())
+
+    def test_load(self):
+        ride_ids, rides = load_rides()
+        self.assertEqual(ride_ids, [ride.pk for ride in self.rides])
+        self.assertEqual(rides.shape, (3, 2))
+        driver_ids, _ = load_drivers(60)
+        self.assertEqual(sorted(driver_ids), [driver.pk for driver in self.drivers])
+
+    def test_assign(self):
+        self.assertEqual(self.assign(), 3)
+        self.assertEqual(
+            dict(Ride.objects.values_list('pk', 'id_driver')),
+            {ride.pk: driver.pk for ride, driver in zip(self.rides, self.drivers)},
+        )
+        # Out of the nearest drivers, here and in the other processes once they sync
+        self.assertFalse(DriverLocation.objects.filter(available=True).exists())
+        self.assertEqual(self.store.nearest(37.77, -122.42, 5, 1, 60), [])
+        self.assertEqual(load_drivers(60)[0], [])
+
+    def test_assign_busy_drivers(self):
+        # Given a ride since they were loaded
+        Ride.objects.filter(pk=self.rides[0].pk).update(id_driver=self.drivers[1], status=RideStatus.PICKUP)
+        # Reported unavailable since they were loaded
+        DriverLocation.objects.filter(pk=self.drivers[2].pk).update(available=False)
+
+        self.assertEqual(self.assign(), 0)
+        self.assertEqual(
+            list(Ride.objects.filter(id_driver__isnull=False).values_list('pk', flat=True)), [self.rides[0].pk]
+        )
+        self.assertEqual(
+            sorted(position.id_driver for _, position in self.store.nearest(37.77, -122.42, 5, 1, 60)),
+            [driver.pk for driver in self.drivers],
+        )
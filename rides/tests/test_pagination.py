@@ -0,0 +1,70 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rides.models import Ride, RideEvent, Roles, User
+
+
+def encode_cursor(position: list, ordering: list[str], reverse: bool = False) -> str:
+    tokens = {'r': int(reverse), 'p': position, 'o': ordering}
+    return urlsafe_b64encode(json.dumps(tokens).encode()).decode()
+
+
+@override_settings(RIDES_RESPONSE_CACHE=False)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', phone_number='+10000000000', role=Roles.ADMIN
+        )
+        now = timezone.now()
+        cls.rides = [
+            Ride.objects.create(
+                id_rider=cls.admin,
+                pickup_latitude=37.7,
+                pickup_longitude=-122.4,
+                dropoff_latitude=37.8,
+                dropoff_longitude=-122.5,
+                pickup_time=now + timedelta(minutes=index),
+            )
+            for index in range(5)
+        ]
+        for index in range(5):
+            RideEvent.objects.create(id_ride=cls.rides[0], description=f'Event {index}')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages(self):
+        response = self.client.get('/rides/', {'pagination': 'cursor', 'page_size': 2})
+        ids = [ride['id_ride'] for ride in response.json()['results']]
+        while next_url := response.json()['next']:
+            response = self.client.get(next_url)
+            ids += [ride['id_ride'] for ride in response.json()['results']]
+        self.assertEqual(ids, [ride.pk for ride in self.rides])
+
+    def test_invalid_ride_cursors(self):
+        ordering = ['pickup_time', 'id_ride']
+        for position in [['notadate', 1], [timezone.now().isoformat(), 'x'], [[1], 1], [None, 1], [1, {'a': 1}]]:
+            with self.subTest(position=position):
+                response = self.client.get(
+                    '/rides/', {'pagination': 'cursor', 'cursor': encode_cursor(position, ordering)}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_invalid_distance_cursor(self):
+        query = {'pagination': 'cursor', 'ordering': 'distance', 'lat': 37.7, 'lon': -122.4}
+        cursor = encode_cursor(['far', 1], ['distance', 'id_ride'])
+        self.assertEqual(self.client.get('/rides/', {**query, 'cursor': cursor}).status_code, 404)
+
+    def test_invalid_event_cursors(self):
+        url = f'/rides/{self.rides[0].pk}/events/'
+        ordering = ['-created_at', '-id_ride_event']
+        self.assertEqual(self.client.get(url, {'page_size': 2}).status_code, 200)
+        for position in [['notadate', 1], [timezone.now().isoformat(), [1]]]:
+            with self.subTest(position=position):
+                response = self.client.get(url, {'cursor': encode_cursor(position, ordering)})
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,22 @@
+from io import StringIO
+
+from django.test import TestCase
+
+from rides.management.commands.check_query_plans import Command
+from rides.management.seeding import seed_database
+
+RIDES = 500
+
+
+class QueryPlansTests(TestCase):
+    """Runs the checks of the check_query_plans command on a seeded test database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(RIDES)
+
+    def test_rides_list(self):
+        scenarios = Command(stdout=StringIO()).run()
+
+        problems = {scenario.name: scenario.problems for scenario in scenarios if scenario.problems}
+        self.assertEqual(problems, {})
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rides.cache import get_cache
+from rides.management.seeding import seed_database
+from rides.models import Ride, Roles, User
+
+
+@override_settings(RIDES_RESPONSE_CACHE=True)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(50)
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', phone_number='+10000000000', role=Roles.ADMIN
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client.force_login(self.admin)
+
+    def get(self, query: dict):
+        response = self.client.get('/rides/', query)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response
+
+    def test_hit(self):
+        self.assertEqual(self.get({'page_size': 10})['X-Cache'], 'MISS')
+        self.assertEqual(self.get({'page_size': 10})['X-Cache'], 'HIT')
+
+    def test_replica_reads_not_stored(self):
+        # The default database stands in for a replica, which could lag behind the writes of the cached versions
+        with override_settings(DATABASE_REPLICAS=['default']):
+            self.assertEqual(self.get({'page_size': 10})['X-Cache'], 'MISS')
+            self.assertEqual(self.get({'page_size': 10})['X-Cache'], 'MISS')
+
+    def test_hit_answers_conditional_get(self):
+        etag = self.get({'page_size': 10})['ETag']
+        # Hits reuse the stored ETag instead of aggregating the rides again
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/rides/', {'page_size': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse([query for query in queries if Ride._meta.db_table in query['sql']])
+
+        response = self.get({'page_size': 10})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], etag)
@@ -0,0 +1,45 @@
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from rides.geo import grid_cell
+from rides.models import Ride
+
+
+class RideCellsTests(TestCase):
+    def assertCells(self, ride: Ride):
+        ride.refresh_from_db()
+        self.assertEqual(ride.pickup_cell, grid_cell(ride.pickup_latitude, ride.pickup_longitude))
+        self.assertEqual(ride.dropoff_cell, grid_cell(ride.dropoff_latitude, ride.dropoff_longitude))
+
+    def create_rides(self) -> list[Ride]:
+        return Ride.objects.bulk_create(
+            Ride(
+                pickup_latitude=37.7 + index / 10,
+                pickup_longitude=-122.4,
+                dropoff_latitude=37.8,
+                dropoff_longitude=-122.5 + index / 10,
+                pickup_time=timezone.now(),
+            )
+            for index in range(3)
+        )
+
+    def test_bulk_create(self):
+        for ride in self.create_rides():
+            self.assertCells(ride)
+
+    def test_bulk_update(self):
+        rides = self.create_rides()
+        for ride in rides:
+            ride.pickup_latitude = -33.9
+        Ride.objects.bulk_update(rides, ['pickup_latitude'])
+        for ride in rides:
+            self.assertCells(ride)
+
+    def test_update(self):
+        rides = self.create_rides()
+        Ride.objects.filter(pk__in=[ride.pk for ride in rides[:2]]).update(
+            pickup_latitude=48.85, dropoff_longitude=F('dropoff_longitude') + 10
+        )
+        for ride in rides:
+            self.assertCells(ride)
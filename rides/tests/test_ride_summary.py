@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from rides.models import Ride, RideEvent, RideSummary, RideSummaryQuerySet
+
+
+class RideSummaryTests(TestCase):
+    def setUp(self):
+        self.rides = Ride.objects.bulk_create(
+            Ride(
+                pickup_latitude=37.7,
+                pickup_longitude=-122.4,
+                dropoff_latitude=37.8,
+                dropoff_longitude=-122.5,
+                pickup_time=timezone.now(),
+            )
+            for _ in range(2)
+        )
+        for ride in self.rides:
+            for description in ('Status changed to pickup', 'Status changed to dropoff', 'Note'):
+                RideEvent.objects.create(id_ride=ride, description=description)
+
+    def test_delete_events(self):
+        patch = mock.patch.object(
+            RideSummaryQuerySet, 'rebuild', autospec=True, side_effect=RideSummaryQuerySet.rebuild
+        )
+        with patch as rebuild, self.captureOnCommitCallbacks(execute=True):
+            RideEvent.objects.filter(description='Note').delete()
+            RideEvent.objects.filter(id_ride=self.rides[0], event_type='dropoff').delete()
+        # Once for the transaction, not per deleted event
+        self.assertEqual(rebuild.call_count, 1)
+
+        summary = RideSummary.objects.get(id_ride=self.rides[0])
+        self.assertEqual(summary.event_count, 1)
+        self.assertIsNone(summary.dropoff_at)
+        self.assertIsNone(summary.duration)
+        self.assertEqual(RideSummary.objects.get(id_ride=self.rides[1]).event_count, 2)
+
+    def test_delete_ride(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rides[0].delete()
+        self.assertFalse(RideSummary.objects.filter(id_ride=self.rides[0].pk).exists())
+        self.assertEqual(RideSummary.objects.get(id_ride=self.rides[1]).event_count, 3)
@@ -0,0 +1,105 @@
+import asyncio
+
+from django.test import SimpleTestCase, override_settings
+
+from rides.stream import Broker, MessageType, PostgresBackend, Subscription, new_message_id
+
+
+def build_message(status: str = 'pickup', rider_id: int = 1, driver_id: int | None = 2) -> dict:
+    ride = {'id_ride': 1, 'status': status, 'id_rider_id': rider_id, 'id_driver_id': driver_id}
+    return {'id': new_message_id(), 'type': MessageType.RIDE, 'ride': ride, 'data': {}}
+
+
+def drain(subscription: Subscription) -> list:
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(subscription.queue.get_nowait())
+    return messages
+
+
+@override_settings(RIDES_STREAM_BACKEND='rides.stream.LocalBackend', RIDES_STREAM_BUFFER_SIZE=3)
+class StreamTests(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.broker = Broker()
+
+    def test_matches(self):
+        cases = [
+            (Subscription(self.loop), build_message(), True),
+            (Subscription(self.loop, statuses={'pickup', 'dropoff'}), build_message(), True),
+            (Subscription(self.loop, statuses={'dropoff'}), build_message(), False),
+            (Subscription(self.loop, rider_ids={1, 3}), build_message(), True),
+            (Subscription(self.loop, rider_ids=set()), build_message(), False),
+            (Subscription(self.loop, driver_id=2), build_message(), True),
+            (Subscription(self.loop, driver_id=2), build_message(driver_id=None), False),
+            # Reset messages concern every subscription
+            (Subscription(self.loop, statuses={'dropoff'}, driver_id=5), {'ride': None}, True),
+        ]
+        for subscription, message, expected in cases:
+            with self.subTest(subscription=subscription, message=message):
+                self.assertEqual(subscription.matches(message), expected)
+
+    @override_settings(RIDES_STREAM_QUEUE_SIZE=2)
+    def test_put_overflow(self):
+        subscription = Subscription(self.loop, statuses={'pickup'})
+        messages = [build_message() for _ in range(4)]
+        subscription.put(build_message(status='dropoff'))
+        for message in messages:
+            subscription.put(message)
+        # The stream ends (None) once the queue is full, nothing is queued afterwards
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(drain(subscription), [*messages[:2], None])
+
+    def test_subscribe_resume(self):
+        messages = [build_message(status=status) for status in ('pickup', 'dropoff', 'pickup')]
+        for message in messages:
+            self.broker.dispatch(message)
+
+        subscription = Subscription(self.loop, statuses={'pickup'})
+        # Only the buffered messages following the last id, matching the filters
+        self.assertEqual(self.broker.subscribe(subscription, messages[0]['id']), [messages[2]])
+        self.assertEqual(self.broker.subscription_count, 1)
+        self.assertEqual(self.broker.subscribe(Subscription(self.loop), messages[2]['id']), [])
+        self.assertEqual(self.broker.subscribe(Subscription(self.loop)), [])
+
+        self.broker.unsubscribe(subscription)
+        self.assertEqual(self.broker.subscription_count, 2)
+
+    def test_subscribe_reset(self):
+        messages = [build_message() for _ in range(4)]
+        for message in messages:
+            self.broker.dispatch(message)
+
+        # The first message left the buffer (3 messages): the client missed it and reloads from the last message
+        [reset] = self.broker.subscribe(Subscription(self.loop), messages[0]['id'])
+        self.assertEqual(reset['type'], MessageType.RESET)
+        self.assertEqual(reset['id'], messages[-1]['id'])
+
+        # Nothing buffered: the id is cleared
+        [reset] = Broker().subscribe(Subscription(self.loop), 'unknown')
+        self.assertEqual(reset['id'], '')
+
+    def test_dispatch(self):
+        subscription = Subscription(self.loop)
+        self.broker.subscribe(subscription)
+        message = build_message()
+        self.broker.dispatch(message)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(drain(subscription), [message])
+
+    def test_should_publish(self):
+        self.broker.dispatch(build_message())
+        self.assertFalse(self.broker.should_publish())
+        # Clients resuming from the skipped messages must reload
+        self.assertFalse(self.broker.buffer)
+
+        self.broker.subscribe(Subscription(self.loop))
+        self.assertTrue(self.broker.should_publish())
+
+    def test_postgres_publish_opt_in(self):
+        backend = PostgresBackend(self.broker)
+        with override_settings(RIDES_STREAM_PUBLISH=False):
+            self.assertFalse(backend.has_subscribers())
+        with override_settings(RIDES_STREAM_PUBLISH=True):
+            self.assertTrue(backend.has_subscribers())
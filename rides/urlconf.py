@@ -1,9 +1,27 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from rides.api.drivers import DriverLocationView, NearestDriversView
+from rides.api.metrics import MetricsView
+from rides.api.reports import DriverMonthlyMetricsViewSet, HeatmapView
 from rides.api.ride import RideViewSet
+from rides.api.ride_async import AsyncRideView
+from rides.api.ride_event import RideEventBulkCreateView
+from rides.api.ride_stream import RideStreamView
 
 router = DefaultRouter()
 router.register(r'rides', RideViewSet)
+router.register(r'reports/driver-monthly', DriverMonthlyMetricsViewSet)
 
-urlpatterns = []
+urlpatterns = [
+    path('ride-events/bulk/', RideEventBulkCreateView.as_view(), name='rideevent-bulk'),
+    path('drivers/locations/', DriverLocationView.as_view(), name='driver-locations'),
+    path('drivers/nearest/', NearestDriversView.as_view(), name='driver-nearest'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('reports/heatmap/', HeatmapView.as_view(), name='report-heatmap'),
+    path('async/rides/', AsyncRideView.as_view(), name='ride-async-list'),
+    # Before the router, which would route it to RideViewSet.retrieve
+    path('rides/stream/', RideStreamView.as_view(), name='ride-stream'),
+    path('async/rides/<str:pk>/', AsyncRideView.as_view(), name='ride-async-detail'),
+]
 urlpatterns += router.urls
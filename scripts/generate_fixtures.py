@@ -1,148 +1,187 @@
 #!/usr/bin/env python3
 """
-Generate a Django fixtures.json file for the `rides` app.
-Creates Users, Rides, and RideEvents. Adjust counts below if you want more or fewer items.
+Generate a Django fixtures file for the `rides` app.
+Creates Users, Rides, and RideEvents, see `--help` for the counts and distributions that can be changed.
+
+Objects are written as they are generated (one per line, each ride followed by its events) so memory doesn't grow
+with the dataset size. The default JSON output is a regular fixture that `loaddata` accepts, `--format ndjson`
+writes one object per line without the enclosing array. Both can be bulk loaded with `manage.py load_fixtures`.
+The output only depends on the seed and the base date.
 """
 
+import argparse
 import json
 import random
-from datetime import datetime, timedelta, timezone
-
-OUT_PATH = '/home/wayat/dev/ridez/fixtures.json'
+import sys
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
 
-random.seed(0)
+DEFAULT_OUT_PATH = Path(__file__).resolve().parent.parent / 'fixtures.json'
 
-# Configuration: hundreds of items
-USERS_TOTAL = 150  # 100 riders, 40 drivers, 10 admins
-RIDERS_COUNT = 100
-DRIVERS_COUNT = 40
-ADMINS_COUNT = USERS_TOTAL - RIDERS_COUNT - DRIVERS_COUNT
+PASSWORD_HASH = 'pbkdf2_sha256$260000$fixedsalt$fixedhashedpassword'
+STATUSES = ['en-route', 'pickup', 'dropoff']
+
+
+def count_range(value: str) -> tuple[int, int]:
+    """Parses a `min-max` (or single `n`) count range."""
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid range: {value!r} (expected min-max)')
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f'invalid range: {value!r} (expected 0 <= min <= max)')
+    return low, high
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    # Make the base date close to the current time so API testing sees recent timestamps
+    default_base_date = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--out', type=Path, default=DEFAULT_OUT_PATH, help='Output path, `-` for stdout.')
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--riders', type=int, default=100)
+    parser.add_argument('--drivers', type=int, default=40)
+    parser.add_argument('--admins', type=int, default=10)
+    parser.add_argument('--rides', type=int, default=400)
+    parser.add_argument('--no-driver-ratio', type=float, default=0.1, help='Share of rides without a driver yet.')
+    parser.add_argument('--events', type=count_range, default=(1, 4), help='Events per ride (min-max).')
+    parser.add_argument(
+        '--heavy-ratio', type=float, default=0.015, help='Share of "chatty" rides getting --heavy-events events.'
+    )
+    parser.add_argument('--heavy-events', type=count_range, default=(10, 25), help='Events per chatty ride (min-max).')
+    parser.add_argument(
+        '--base-date',
+        type=datetime.fromisoformat,
+        default=default_base_date,
+        help='Pickup times are spread around this date (ISO 8601, default: 3 days ago at midnight UTC).',
+    )
+
+    args = parser.parse_args(argv)
+    if args.rides and args.riders < 1:
+        parser.error('at least one rider is required')
+    if args.base_date.tzinfo is None:
+        args.base_date = args.base_date.replace(tzinfo=UTC)
+    return args
+
+
+def to_iso(value: datetime) -> str:
+    return value.astimezone(UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def generate_users(args: argparse.Namespace) -> Iterator[dict]:
+    # Users: pk 1..riders+drivers+admins, riders first, then drivers, then admins
+    for i in range(1, args.riders + args.drivers + args.admins + 1):
+        if i <= args.riders:
+            role = 'rider'
+        elif i <= args.riders + args.drivers:
+            role = 'driver'
+        else:
+            role = 'admin'
+
+        yield {
+            'model': 'rides.user',
+            'pk': i,
+            'fields': {
+                'password': PASSWORD_HASH,
+                'last_login': None,
+                'is_superuser': role == 'admin',
+                'username': f'user{i}',
+                'first_name': f'User{i}',
+                'last_name': 'Test',
+                'email': f'user{i}@example.com',
+                'is_staff': role == 'admin',
+                'is_active': True,
+                'date_joined': '2023-01-01T00:00:00Z',
+                'role': role,
+                'phone_number': f'+1555000{str(i).zfill(5)}',
+            },
+        }
 
-RIDES_COUNT = 400  # number of rides (create one event per ride)
 
-PASSWORD_HASH = 'pbkdf2_sha256$260000$fixedsalt$fixedhashedpassword'
-# Make the base date close to the current time so API testing sees recent timestamps
-BASE_DATE = datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=3)
-
-objects = []
-
-# Users: pk 1..USERS_TOTAL
-for i in range(1, USERS_TOTAL + 1):
-    if i <= RIDERS_COUNT:
-        role = 'rider'
-        is_staff = False
-        is_superuser = False
-    elif i <= RIDERS_COUNT + DRIVERS_COUNT:
-        role = 'driver'
-        is_staff = False
-        is_superuser = False
-    else:
-        role = 'admin'
-        is_staff = True
-        is_superuser = True
-
-    obj = {
-        'model': 'rides.user',
-        'pk': i,
-        'fields': {
-            'password': PASSWORD_HASH,
-            'last_login': None,
-            'is_superuser': is_superuser,
-            'username': f'user{i}',
-            'first_name': f'User{i}',
-            'last_name': 'Test',
-            'email': f'user{i}@example.com',
-            'is_staff': is_staff,
-            'is_active': True,
-            'date_joined': '2023-01-01T00:00:00Z',
-            'role': role,
-            'phone_number': f'+1555000{str(i).zfill(5)}',
-        },
-    }
-    objects.append(obj)
-
-# Rides: pk 1..RIDES_COUNT
-statuses = ['en-route', 'pickup', 'dropoff']
-# store pickup datetimes so RideEvent can reuse and build around them
-pickup_times = {}
-
-for r in range(1, RIDES_COUNT + 1):
-    status = statuses[r % len(statuses)]
-    # pick rider and driver PKs
-    rider_pk = (r % RIDERS_COUNT) + 1
-    # 10% of rides have no driver yet
-    if random.random() < 0.1:
+def generate_rides(args: argparse.Namespace, rng: random.Random) -> Iterator[dict]:
+    event_pk = 1
+    for r in range(1, args.rides + 1):
+        # pick rider and driver PKs, drivers are after riders
+        rider_pk = (r % args.riders) + 1
         driver_pk = None
-    else:
-        driver_pk = RIDERS_COUNT + (r % DRIVERS_COUNT) + 1  # drivers are after riders
-
-    # deterministic coordinates around a city center (e.g., San Francisco-like)
-    lat_offset = (r % 100) * 0.0007
-    lon_offset = (r % 100) * 0.0009
-    pickup_lat = 37.7000 + lat_offset
-    pickup_lon = -122.4000 + lon_offset
-    dropoff_lat = 37.8000 + ((r * 3) % 100) * 0.0006
-    dropoff_lon = -122.5000 + ((r * 5) % 100) * 0.0008
-
-    # randomize pickup_time within a realistic window so ordering isn't by ID
-    # choose an offset between -7 days and +30 days (in minutes)
-    offset_minutes = random.randint(-7 * 24 * 60, 30 * 24 * 60)
-    # add a small r-dependent jitter so values aren't repeated too often
-    jitter = r % 60
-    # use timezone-aware datetimes relative to BASE_DATE
-    pickup_time = BASE_DATE + timedelta(minutes=offset_minutes + jitter)
-    pickup_times[r] = pickup_time
-    pickup_time_iso = pickup_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    ride_obj = {
-        'model': 'rides.ride',
-        'pk': r,
-        'fields': {
-            'status': status,
-            'id_rider': rider_pk,
-            'id_driver': driver_pk,
-            'pickup_latitude': round(pickup_lat, 6),
-            'pickup_longitude': round(pickup_lon, 6),
-            'dropoff_latitude': round(dropoff_lat, 6),
-            'dropoff_longitude': round(dropoff_lon, 6),
-            'pickup_time': pickup_time_iso,
-        },
-    }
-    objects.append(ride_obj)
-
-# RideEvents: now a ForeignKey relationship — generate multiple events per ride
-event_pk = 1
-# pick a few rides to be "chatty" and have many events
-heavy_rides = set(random.sample(range(1, RIDES_COUNT + 1), k=min(6, RIDES_COUNT)))
-for r in range(1, RIDES_COUNT + 1):
-    pickup_dt = pickup_times.get(r, BASE_DATE + timedelta(minutes=r))
-
-    # default number of events per ride: 1..4, but heavy_rides get many (10..25)
-    if r in heavy_rides:
-        events_count = random.randint(10, 25)
-    else:
-        events_count = random.randint(1, 4)
+        if args.drivers and rng.random() >= args.no_driver_ratio:
+            driver_pk = args.riders + (r % args.drivers) + 1
+
+        # deterministic coordinates around a city center (e.g., San Francisco-like)
+        lat_offset = (r % 100) * 0.0007
+        lon_offset = (r % 100) * 0.0009
 
-    for e_index in range(events_count):
-        # spread events around pickup_time: from -120 minutes to +720 minutes
-        offset = random.randint(-120, 720) + (e_index * 2)
-        created_at_dt = pickup_dt + timedelta(minutes=offset)
-        created_at = created_at_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        # randomize pickup_time within a realistic window (-7 days to +30 days) so ordering isn't by ID,
+        # plus a small r-dependent jitter so values aren't repeated too often
+        offset_minutes = rng.randint(-7 * 24 * 60, 30 * 24 * 60)
+        pickup_time = args.base_date + timedelta(minutes=offset_minutes + r % 60)
 
-        event_obj = {
-            'model': 'rides.rideevent',
-            'pk': event_pk,
+        yield {
+            'model': 'rides.ride',
+            'pk': r,
             'fields': {
-                'id_ride': r,
-                'description': f'Event {e_index + 1} for ride {r}',
-                'created_at': created_at,
+                'status': STATUSES[r % len(STATUSES)],
+                'id_rider': rider_pk,
+                'id_driver': driver_pk,
+                'pickup_latitude': round(37.7000 + lat_offset, 6),
+                'pickup_longitude': round(-122.4000 + lon_offset, 6),
+                'dropoff_latitude': round(37.8000 + ((r * 3) % 100) * 0.0006, 6),
+                'dropoff_longitude': round(-122.5000 + ((r * 5) % 100) * 0.0008, 6),
+                'pickup_time': to_iso(pickup_time),
             },
         }
-        objects.append(event_obj)
-        event_pk += 1
 
-# Write to file
-with open(OUT_PATH, 'w', encoding='utf-8') as f:
-    json.dump(objects, f, indent=2)
+        # most rides get a few events, a few "chatty" ones get many
+        events_range = args.heavy_events if rng.random() < args.heavy_ratio else args.events
+        for e_index in range(rng.randint(*events_range)):
+            # spread events around pickup_time: from -120 minutes to +720 minutes
+            offset = rng.randint(-120, 720) + (e_index * 2)
+            yield {
+                'model': 'rides.rideevent',
+                'pk': event_pk,
+                'fields': {
+                    'id_ride': r,
+                    'description': f'Event {e_index + 1} for ride {r}',
+                    'created_at': to_iso(pickup_time + timedelta(minutes=offset)),
+                },
+            }
+            event_pk += 1
+
+
+def write_objects(objects: Iterator[dict], out, output_format: str) -> int:
+    count = 0
+    if output_format == 'json':
+        out.write('[')
+    for obj in objects:
+        line = json.dumps(obj, separators=(',', ':'))
+        if output_format == 'json':
+            line = ('\n' if count == 0 else ',\n') + line
+        else:
+            line += '\n'
+        out.write(line)
+        count += 1
+    if output_format == 'json':
+        out.write('\n]\n')
+    return count
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    objects = (obj for generator in (generate_users(args), generate_rides(args, rng)) for obj in generator)
+    if str(args.out) == '-':
+        count = write_objects(objects, sys.stdout, args.format)
+    else:
+        with open(args.out, 'w', encoding='utf-8', buffering=1024 * 1024) as out:
+            count = write_objects(objects, out, args.format)
+
+    print(f'Wrote {count} fixture objects to {args.out}', file=sys.stderr)
+
 
-print(f'Wrote {len(objects)} fixture objects to {OUT_PATH}')
+if __name__ == '__main__':
+    main()
@@ -4,4 +4,8 @@ FIXTURE_FILE="fixtures.json"
 python manage.py migrate
 python manage.py collectstatic --noinput
 [ -f "$FIXTURE_FILE" ] && python manage.py loaddata fixtures.json
-python manage.py runserver 0.0.0.0:${PORT:-8000}
+if [ "$SERVER" = "asgi" ]; then
+    uvicorn ridez.asgi:application --host 0.0.0.0 --port ${PORT:-8000} --workers ${WORKERS:-1} --timeout-graceful-shutdown 5
+else
+    python manage.py runserver 0.0.0.0:${PORT:-8000}
+fi